@@ -1,69 +1,966 @@
 import numpy as np
+import os
+from concurrent.futures import ThreadPoolExecutor
 from math import log2, log10, floor, pow
 
-def overlapping_allan_deviation(omega, Fs, maxNumM=100):
+
+def max_cluster_size(L):
+    """Largest cluster size used for a series of `L` samples.
+
+    Args:
+        L (int): Number of samples in the series.
+
+    Returns:
+        float: The largest power of two that is no greater than `L/2`.
+    """
+    return pow(2, floor(log2(L/2)))
+
+
+def cluster_sizes(maxM, maxNumM=100):
+    """Log-spaced, unique cluster sizes between 1 and `maxM`.
+
+    Args:
+        maxM (int or float): The largest cluster size.
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+
+    Returns:
+        numpy array: Sorted array of unique cluster sizes (whole numbers stored as floats).
+    """
+
+    #array of all m values
+    m = np.logspace(log10(1), log10(maxM), maxNumM)
+    #small differences in m are unimportant
+    m = np.ceil(m)
+    #remove any duplicate values of m
+    m = np.unique(m)
+
+    return m
+
+
+def overlapping_allan_deviation(omega, Fs, maxNumM=100, workers=1, precision="float64"):
     """Calculate the overlapping Allan deviation.
     Preferred Allan deviation variant for large datasets.
 
+    Several channels (e.g. the axes of an IMU) can be passed as the columns of
+    an (N x channels) array. They share the cluster sizes and are evaluated
+    together in a single sweep over the cluster sizes.
+
+    With `workers` > 1 the cluster sizes are divided between a pool of threads
+    that share the integrated series. Every thread reduces block by block in
+    its own small scratch buffer (see `cluster_difference_sums`).
+
+    With `precision="float32"` the samples are kept as float32 (4 bytes per
+    sample instead of the 16 of a float64 series plus its float64 integral).
+    The integral is never stored. It is rebuilt in float64 one window at a
+    time (see `chunked_overlapping_allan_deviation`), so the only loss is the
+    rounding of the samples to float32. That rounding acts as added white
+    noise of at most 2**-24*max|omega|/sqrt(3), so the deviation changes by at
+    most 2**-24*max|omega|*sqrt(1/(3*Fs*tau)), added in quadrature. This
+    saves memory, not time: past a few million samples it takes about a
+    quarter longer than float64, so it is not the default anywhere.
+
     Args:
-        omega (numpy array):Instantaneous output rate (or angle) measured by the IMU.
+        omega (numpy array):Instantaneous output rate (or angle) measured by the IMU. Either (N,) or (N x channels).
         Fs (int): Sampling frequency in Hertz (Hz).
         maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+        precision (str, optional): "float64", or "float32" to store the samples in single precision. Defaults to "float64".
 
     Returns:
         (taus, oadev) (tuple): Tuple of values.
             taus (numpy array): Array of discrete time clusters (x-values of Allan Deviation plot).
-            oadev (numpy array): Array of overlapping Allan deviation estimations (y-values of Allan Deviation plot).
+            oadev (numpy array): Array of overlapping Allan deviation estimations (y-values of Allan Deviation plot). (M,) for a single series, (M x channels) otherwise.
+    """
+    if precision == "float32":
+        return chunked_overlapping_allan_deviation(np.asarray(omega, dtype=np.float32), Fs, maxNumM, chunk_size=2**18, workers=workers)
+    if precision != "float64":
+        raise ValueError(f"Unknown precision {precision!r}. Expected 'float64' or 'float32'")
+
+    return allan_deviations(omega, Fs, ("overlapping",), maxNumM, workers)["overlapping"]
+
+
+def modified_allan_deviation(omega, Fs, maxNumM=100, workers=1):
+    """Calculate the modified Allan deviation.
+    Separates white and flicker phase noise, e.g. quantization noise, which both
+    appear with slope -1 on an overlapping Allan deviation plot.
+
+    Args:
+        omega (numpy array): Instantaneous output rate (or angle) measured by the IMU. Either (N,) or (N x channels).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        (taus, mdev) (tuple): Tuple of values.
+            taus (numpy array): Array of discrete time clusters.
+            mdev (numpy array): Array of modified Allan deviation estimations.
     """
+    return allan_deviations(omega, Fs, ("modified",), maxNumM, workers)["modified"]
+
+
+def hadamard_deviation(omega, Fs, maxNumM=100, workers=1):
+    """Calculate the overlapping Hadamard deviation.
+    Insensitive to a constant rate ramp, so rate random walk stays visible on
+    series with drift.
+
+    Args:
+        omega (numpy array): Instantaneous output rate (or angle) measured by the IMU. Either (N,) or (N x channels).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        (taus, hdev) (tuple): Tuple of values.
+            taus (numpy array): Array of discrete time clusters.
+            hdev (numpy array): Array of overlapping Hadamard deviation estimations.
+    """
+    return allan_deviations(omega, Fs, ("hadamard",), maxNumM, workers)["hadamard"]
+
+
+def total_deviation(omega, Fs, maxNumM=100, workers=1):
+    """Calculate the total deviation.
+    Extends the integrated series by reflection at both ends, which improves
+    the confidence of the longest averaging times.
+
+    Args:
+        omega (numpy array): Instantaneous output rate (or angle) measured by the IMU. Either (N,) or (N x channels).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        (taus, totdev) (tuple): Tuple of values.
+            taus (numpy array): Array of discrete time clusters.
+            totdev (numpy array): Array of total deviation estimations.
+    """
+    return allan_deviations(omega, Fs, ("total",), maxNumM, workers)["total"]
+
+
+#estimator variants supported by `allan_deviations`
+VARIANTS = ("overlapping", "modified", "hadamard", "total")
+
+#weights of the differences used by the variants
+SECOND_DIFFERENCE = (1, -2, 1)
+THIRD_DIFFERENCE = (-1, 3, -3, 1)
+
+
+def allan_deviations(omega, Fs, variants=VARIANTS, maxNumM=100, workers=1):
+    """Calculate several Allan deviation variants of the same series.
+
+    The series is integrated once, and every variant is a sum of squared
+    differences of that integrated series (or of its own prefix sums, for the
+    modified deviation) evaluated with `cluster_difference_sums`. Each variant
+    therefore costs O(N) per cluster size, with no inner averaging loops.
+
+    All variants use the cluster sizes of `overlapping_allan_deviation`, minus
+    those too long for the variant (the modified and Hadamard deviations need
+    3 clusters instead of 2).
+
+    Args:
+        omega (numpy array): Instantaneous output rate (or angle) measured by the IMU. Either (N,) or (N x channels).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        variants (tuple of str, optional): Any of "overlapping", "modified", "hadamard" and "total". Defaults to all of them.
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        dict: (taus, deviations) tuple for every requested variant, keyed by variant name.
+    """
+    unknown = set(variants) - set(VARIANTS)
+    if unknown:
+        raise ValueError(f"Unknown Allan deviation variant(s) {sorted(unknown)}. Expected any of {VARIANTS}")
 
     #sampling period in seconds
     t0 = 1/Fs
 
     #integrate to find angles (or rate) measured by the imu
-    theta = np.cumsum(omega, 0)*t0
+    theta = blockwise_cumsum(omega)
+    theta *= t0
 
     #number of rows in theta vector
     L = theta.shape[0]
 
-    #the total number of cluster times
-    maxM = pow(2, floor(log2(L/2)))
+    #store each channel contiguously so the slices below are contiguous
+    theta = np.ascontiguousarray(np.moveaxis(theta, 0, -1))
 
     #array of all m values
-    m = np.logspace(log10(1), log10(maxM), maxNumM)
-    #small differences in m are unimportant
-    m = np.ceil(m)
-    #remove any duplicate values of m
-    m = np.unique(m)
-    #to use m as an index, it must be an integer
-    m_ints = m.copy().astype("int32")
+    m = cluster_sizes(max_cluster_size(L), maxNumM)
+
+    results = {}
+    for variant in variants:
+        if variant == "overlapping":
+            #theta[k+2m] - 2*theta[k+m] + theta[k]
+            series, weights = theta, SECOND_DIFFERENCE
+            usable = L - 2*m > 0
+        elif variant == "hadamard":
+            #theta[k+3m] - 3*theta[k+2m] + 3*theta[k+m] - theta[k]
+            series, weights = theta, THIRD_DIFFERENCE
+            usable = L - 3*m > 0
+        elif variant == "modified":
+            #every term averages m second differences, which is a third difference of the prefix sums of theta
+            series, weights = _prefix_sums(theta), THIRD_DIFFERENCE
+            usable = L - 3*m + 1 > 0
+        else:
+            #second differences centred on samples 1..L-2 of the reflected series
+            series, weights = _reflected(theta), SECOND_DIFFERENCE
+            usable = L - 2*m > 0
+
+        mv = m[usable]
+        #to use m as an index, it must be an integer
+        m_ints = mv.astype("int64")
+
+        #array of averaging times (x-axis values of the deviation plot)
+        tau = mv*t0
+
+        #sum of the squared differences between adjacent cluster averages for each cluster time,
+        #sweeping one channel at a time so its series stays in the cache across cluster sizes
+        sums = np.zeros((len(mv),) + theta.shape[:-1])
+        for channel in np.ndindex(theta.shape[:-1]):
+            if variant == "total":
+                #the centre runs over samples 1..L-2, which sit L-2 samples into the reflected series
+                function = lambda mi: cluster_difference_sums(series[channel][L-1-mi:2*L-3+mi], mi, weights=weights)
+            else:
+                function = lambda mi: cluster_difference_sums(series[channel], mi, weights=weights)
+
+            for i, cluster_sum in enumerate(map_cluster_sizes(function, m_ints, workers)):
+                sums[(i,) + channel] = cluster_sum
+
+        #calculate the coefficient of each finite sum
+        if variant == "overlapping":
+            denominator = 2*np.power(tau, 2.0)*(L - 2*mv)
+        elif variant == "hadamard":
+            denominator = 6*np.power(tau, 2.0)*(L - 3*mv)
+        elif variant == "modified":
+            denominator = 2*np.power(mv, 2.0)*np.power(tau, 2.0)*(L - 3*mv + 1)
+        else:
+            denominator = 2*np.power(tau, 2.0)*(L - 2)
+
+        #the deviation is the square root of the variance
+        deviation = np.sqrt(sums/_broadcast_over_channels(denominator, sums))
+
+        # Reshape returned arrays to be row vectors
+        tau = tau.reshape(-1,)
+        if np.ndim(omega) == 1:
+            deviation = deviation.reshape(-1,)
+
+        results[variant] = (tau, deviation)
+
+    return results
+
+
+def overlapping_allan_gram(series, Fs, maxNumM=100, workers=1):
+    """Overlapping Allan variance cross terms of several series of the same length.
+
+    For series x_1..x_S, gram[i] holds the overlapping Allan variance at
+    averaging time taus[i] of every pair, so the variance of any weighted sum
+    c_1*x_1 + ... + c_S*x_S is c @ gram[i] @ c (see
+    `allan_deviation_from_gram`). Once the cross terms are known, changing
+    the weights costs O(M*S**2) instead of another pass over the samples.
+
+    Args:
+        series (list of numpy array): The S series, each (N,).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        (taus, gram) (tuple): Tuple of values.
+            taus (numpy array): Array of discrete time clusters, the same as `overlapping_allan_deviation`.
+            gram (numpy array): (M x S x S) array of overlapping Allan variance cross terms.
+    """
+    #sampling period in seconds
+    t0 = 1/Fs
+
+    #integrate every series into its own contiguous row
+    theta = np.empty((len(series), len(series[0])))
+    for i, omega in enumerate(series):
+        theta[i] = blockwise_cumsum(omega)
+        theta[i] *= t0
+
+    return integrated_allan_gram(theta, Fs, maxNumM, workers)
+
+
+def integrated_allan_gram(theta, Fs, maxNumM=100, workers=1):
+    """Overlapping Allan variance cross terms of series that are already integrated.
+
+    Like `overlapping_allan_gram`, but taking the integrals theta = cumsum(x)/Fs
+    of the series. `theta` is only read in slices of a few thousand samples
+    per row, so it can be a `numpy.memmap` of series too long to hold in memory.
+
+    Args:
+        theta (array like): (S x N) integrated series, e.g. angles from rates.
+        Fs (int): Sampling frequency in Hertz (Hz).
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        (taus, gram) (tuple): Tuple of values, see `overlapping_allan_gram`.
+    """
+    #sampling period in seconds
+    t0 = 1/Fs
+    num_series, L = theta.shape
+
+    #cluster sizes of the overlapping Allan deviation
+    m = cluster_sizes(max_cluster_size(L), maxNumM)
+    m = m[L - 2*m > 0]
+    tau = m*t0
+
+    function = lambda mi: cluster_difference_gram(theta, mi)
+    gram = np.array(map_cluster_sizes(function, m.astype("int64"), workers)).reshape(len(m), num_series, num_series)
+
+    denominator = 2*np.power(tau, 2.0)*(L - 2*m)
+    return (tau, gram/denominator[:, None, None])
+
+
+def allan_deviation_from_gram(gram, weights):
+    """Allan deviation of a weighted sum of series from their cross terms.
+
+    Args:
+        gram (numpy array): (M x S x S) cross terms, see `overlapping_allan_gram`.
+        weights (numpy array): Weight of each of the S series.
+
+    Returns:
+        numpy array: (M,) Allan deviations.
+    """
+    weights = np.asarray(weights, dtype=float)
+    variance = np.einsum("i,mij,j->m", weights, gram, weights)
+    #rounding can leave a tiny negative variance when sources cancel
+    return np.sqrt(np.maximum(variance, 0))
+
+
+def blockwise_cumsum(x, block_size=2**12):
+    """Cumulative sum along the first axis in float64, with bounded rounding error.
+
+    np.cumsum adds every sample to one running total, so its rounding error
+    grows like sqrt(N) times the size of the total. Here each block of
+    `block_size` samples is summed on its own, and the block totals are
+    combined the same way recursively, with Kahan compensation once few block
+    totals remain. The error then stays close to that of a single block.
+    Float32 input is accumulated in float64 without a float64 copy first.
+
+    Args:
+        x (numpy array): Samples, with time along the first axis.
+        block_size (int, optional): Number of samples summed directly. Defaults to 2**12.
+
+    Returns:
+        numpy array: The float64 cumulative sum, with the shape of `x`.
+    """
+    x = np.asarray(x)
+    L = x.shape[0]
+    sums = np.empty(x.shape, dtype=float)
+    if L <= block_size:
+        np.cumsum(x, 0, dtype=float, out=sums)
+        return sums
+
+    #local sums of the whole blocks, one block per row
+    num_whole = L//block_size
+    whole = num_whole*block_size
+    local = sums[:whole].reshape((num_whole, block_size) + x.shape[1:])
+    np.cumsum(x[:whole].reshape(local.shape), 1, dtype=float, out=local)
+    if whole < L:
+        np.cumsum(x[whole:], 0, dtype=float, out=sums[whole:])
+
+    #totals of every block before each block, summed the same way until few enough to compensate
+    ends = sums[block_size-1:whole:block_size]
+    offsets = _kahan_cumsum(ends) if num_whole <= block_size else blockwise_cumsum(ends, block_size)
+    local[1:] += offsets[:-1, None]
+    if whole < L:
+        sums[whole:] += offsets[-1]
+
+    return sums
+
+
+def _kahan_cumsum(x):
+    """Cumulative sum along the first axis with Kahan compensation, one row at a time"""
+    sums = np.empty(x.shape)
+    total = np.zeros(x.shape[1:])
+    compensation = np.zeros(x.shape[1:])
+    for i in range(x.shape[0]):
+        term = x[i] - compensation
+        updated = total + term
+        compensation = (updated - total) - term
+        total = updated
+        sums[i] = total
+    return sums
+
+
+def _detrended(theta):
+    """Remove the least squares straight line from every channel of `theta`.
+
+    Differences of order two and higher are unchanged, but the values that
+    get subtracted from each other become much smaller.
+    """
+    L = theta.shape[-1]
+    k = np.arange(L) - (L-1)/2
+    detrended = theta - np.mean(theta, -1, keepdims=True)
+    if L > 1:
+        detrended -= np.multiply.outer(np.sum(detrended*k, -1)/np.sum(k*k), k)
+    return detrended
+
+
+def _prefix_sums(theta):
+    """Prefix sums of `theta` along its last axis, starting with 0.
+
+    The third differences taken of them are unchanged by detrending `theta`
+    first, which keeps the sums small.
+    """
+    sums = np.zeros(theta.shape[:-1] + (theta.shape[-1]+1,))
+    np.cumsum(_detrended(theta), -1, out=sums[..., 1:])
+    return sums
+
+
+def _reflected(theta):
+    """Extend `theta` by L-2 samples reflected about each of its end points"""
+    inner = theta[..., 1:-1][..., ::-1]
+    before = 2*theta[..., :1] - inner
+    after = 2*theta[..., -1:] - inner
+    return np.concatenate((before, theta, after), -1)
+
+
+def cluster_difference_sums(theta, m, block_size=2**16, weights=(1, -2, 1)):
+    """Sum of the squared differences of `theta` at cluster size `m`.
+
+    Evaluates sum_k (weights[0]*theta[k] + weights[1]*theta[k+m] + ...)**2 along
+    the last axis of `theta`, one block of k at a time, so every channel is
+    handled in the same pass and the temporaries stay `block_size` elements
+    long. The default weights give the second difference of the overlapping
+    Allan variance.
+
+    Args:
+        theta (numpy array): Integrated samples, with time along the last axis.
+        m (int): Cluster size.
+        block_size (int, optional): Number of elements processed at a time, shared between channels. Defaults to 2**16.
+        weights (tuple, optional): Weight of theta at offsets 0, m, 2m, ... Defaults to (1, -2, 1).
+
+    Returns:
+        numpy array: The sums, with the shape of `theta` minus its last axis.
+    """
+    total = np.zeros(theta.shape[:-1])
+    for arg in _difference_blocks(theta, m, block_size, weights):
+        total += np.einsum("...i,...i->...", arg, arg)
+
+    return total
+
+
+def cluster_difference_gram(theta, m, block_size=2**16, weights=(1, -2, 1)):
+    """Sums of the products of the differences of every pair of rows of `theta` at cluster size `m`.
+
+    The diagonal equals `cluster_difference_sums` of every row. Since the
+    differences are linear in `theta`, the sum of squared differences of any
+    weighted sum of the rows c @ theta is c @ gram @ c.
+
+    Args:
+        theta (numpy array): Integrated samples of S series, (S x L).
+        m (int): Cluster size.
+        block_size (int, optional): Number of elements processed at a time, shared between rows. Defaults to 2**16.
+        weights (tuple, optional): Weight of theta at offsets 0, m, 2m, ... Defaults to (1, -2, 1).
+
+    Returns:
+        numpy array: The (S x S) sums.
+    """
+    total = np.zeros((theta.shape[0], theta.shape[0]))
+    for arg in _difference_blocks(theta, m, block_size, weights):
+        total += arg @ arg.T
+
+    return total
+
+
+def _difference_blocks(theta, m, block_size, weights):
+    """Consecutive blocks of the weighted differences of `theta` at cluster size `m`, in one reused buffer"""
+    m = int(m)
+    num_differences = theta.shape[-1] - (len(weights)-1)*m
+    channels = theta.shape[:-1]
+
+    #keep the scratch buffers about `block_size` elements regardless of the channel count
+    block = max(1, block_size//max(1, int(np.prod(channels))))
+    block = min(block, max(num_differences, 1))
+
+    scratch = np.empty(channels + (block,))
+    term = np.empty(channels + (block,))
+    for start in range(0, num_differences, block):
+        stop = min(start+block, num_differences)
+        arg = scratch[..., :stop-start]
+        #difference between adjacent cluster averages, built in place
+        np.multiply(theta[..., start:stop], weights[0], out=arg)
+        for j, weight in enumerate(weights[1:], 1):
+            window = theta[..., start+j*m:stop+j*m]
+            if weight == 1:
+                arg += window
+            elif weight == -1:
+                arg -= window
+            else:
+                np.multiply(window, weight, out=term[..., :stop-start])
+                arg += term[..., :stop-start]
+        yield arg
+
+
+def map_cluster_sizes(function, m, workers=1):
+    """Apply `function` to every cluster size, optionally in a pool of threads.
+
+    NumPy releases the GIL inside the array operations doing the work, so
+    threads run in parallel while sharing the integrated series without copies.
+
+    Args:
+        function (callable): Called with one cluster size.
+        m (numpy array): Cluster sizes.
+        workers (int, optional): Number of threads, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        list: The results, in the order of `m`.
+    """
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(m) < 2:
+        return [function(mi) for mi in m]
+
+    #pool.map hands out tasks in order, so with ascending cluster sizes the
+    #longest sums start first and the short ones fill in at the end
+    with ThreadPoolExecutor(max_workers=min(workers, len(m))) as pool:
+        return list(pool.map(function, m))
+
+
+def _broadcast_over_channels(values, like):
+    """Reshape a per-cluster-size vector so it broadcasts against `like`"""
+    return values.reshape((-1,) + (1,)*(np.ndim(like)-1))
+
+
+class OnlineAllanDeviation:
+    """Overlapping Allan deviation that is updated one chunk of samples at a time.
+
+    The integrated angle (or rate) is carried between chunks together with the
+    last `2*maxM` integrated samples and one running sum of squared cluster
+    differences per cluster size. Adding a chunk therefore costs O(chunk*M) and
+    reading the current estimate costs O(M), independently of how many samples
+    have been seen so far.
+
+    For a series of `L` samples the result matches `overlapping_allan_deviation`
+    when `maxM` equals `max_cluster_size(L)`.
+
+    Args:
+        Fs (int or float): Sampling frequency in Hertz (Hz).
+        maxM (int): The largest cluster size that will be tracked.
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+    """
+
+    def __init__(self, Fs, maxM, maxNumM=100):
+
+        #sampling period in seconds
+        self.t0 = 1/Fs
+
+        #fixed grid of cluster sizes and the matching averaging times
+        self.m = cluster_sizes(maxM, maxNumM)
+        self.m_ints = self.m.copy().astype("int64")
+        self.tau = self.m*self.t0
+
+        #running sums of the squared cluster differences for each m
+        self.sums = np.zeros(len(self.m))
+
+        #number of samples seen so far
+        self.L = 0
+
+        #running (unscaled) integral of every sample seen so far, with its Kahan compensation
+        self._total = 0.0
+        self._compensation = 0.0
+
+        #the most recent integrated samples, enough to reach back 2*maxM samples
+        self._history = np.zeros(0)
+        self._history_length = int(2*self.m_ints[-1])
+
+    def update(self, omega):
+        """Add a chunk of samples to the estimate.
+
+        Args:
+            omega (numpy array): Instantaneous output rate (or angle) measured by the IMU.
+        """
+        omega = np.asarray(omega, dtype=float).reshape(-1,)
+        if omega.size == 0:
+            return
+
+        #integrate the new chunk, continuing from the previous chunks
+        running = blockwise_cumsum(omega)
+        chunk_total = running[-1] - self._compensation
+        running += self._total
+        updated = self._total + chunk_total
+        self._compensation = (updated - self._total) - chunk_total
+        self._total = updated
+        theta = running*self.t0
+
+        #new integrated samples appended to the stored ones
+        buffer = np.concatenate((self._history, theta))
+        #index in `buffer` of the first new sample
+        start = len(self._history)
+        N = len(buffer)
+
+        for i in range(0, len(self.m)):
+            mi = self.m_ints[i]
+            #only differences that end on a new sample have not been counted yet
+            lo = max(start, 2*mi)
+            if lo >= N:
+                continue
+            arg = buffer[lo:N] - np.multiply(2, buffer[lo-mi:N-mi]) + buffer[lo-2*mi:N-2*mi]
+            self.sums[i] += np.sum(np.power(arg, 2))
+
+        self.L += len(omega)
+        self._history = buffer[-self._history_length:].copy()
+
+    def allan_deviation(self):
+        """Current overlapping Allan deviation of every sample seen so far.
+
+        Only cluster sizes with at least one full cluster difference are returned.
+
+        Returns:
+            (taus, oadev) (tuple): Tuple of values.
+                taus (numpy array): Array of discrete time clusters (x-values of Allan Deviation plot).
+                oadev (numpy array): Array of overlapping Allan deviation estimations (y-values of Allan Deviation plot).
+        """
+        valid = self.L - 2*self.m > 0
+        m = self.m[valid]
+        tau = self.tau[valid]
+
+        #calculate the coefficient of the finite sum
+        denominator = np.multiply(np.multiply(2, np.power(tau, 2.0)), (self.L-np.multiply(2, m)))
+
+        adev = np.sqrt(self.sums[valid]/denominator)
+
+        return (tau, adev)
+
+
+#samples between the stored integrals of `chunked_overlapping_allan_deviation`
+CHECKPOINT_SPACING = 2**12
+
+
+def chunked_overlapping_allan_deviation(omega, Fs, maxNumM=100, scale=1.0, chunk_size=2**20, workers=1):
+    """Calculate the overlapping Allan deviation without holding the series in memory.
+
+    `omega` only needs to support slicing, so it can be a `numpy.memmap` of raw
+    ADC counts. Samples are read `chunk_size` at a time, converted to float64
+    and multiplied by `scale`. A first pass stores the running integral every
+    `CHECKPOINT_SPACING` samples (a few kB per million samples). Every cluster
+    difference is then computed from float64 integrated windows rebuilt from
+    those checkpoints, so memory use is a few `chunk_size` arrays regardless of
+    the length of the series. Cluster sizes spanning more than a window
+    accumulate the second difference of the samples from the exact cluster
+    difference at the start of every chunk, one pass over the samples each. Like
+    `overlapping_allan_deviation`, an (N x channels) input gives one column of
+    deviations per channel.
+
+    Args:
+        omega (array like): Instantaneous output rate (or angle) measured by the IMU. Either (N,) or (N x channels).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        scale (float, optional): Factor converting raw samples to physical units. Defaults to 1.0.
+        chunk_size (int, optional): Number of samples read at a time. Defaults to 2**20.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        (taus, oadev) (tuple): Tuple of values.
+            taus (numpy array): Array of discrete time clusters (x-values of Allan Deviation plot).
+            oadev (numpy array): Array of overlapping Allan deviation estimations (y-values of Allan Deviation plot).
+    """
+
+    #sampling period in seconds
+    t0 = 1/Fs
+
+    #number of samples in the series
+    L = omega.shape[0]
+
+    #integrated samples at every CHECKPOINT_SPACING samples, so windows can start anywhere
+    spacing = CHECKPOINT_SPACING
+    num_checkpoints = -(-L//spacing)
+    totals = np.zeros((num_checkpoints,) + omega.shape[1:])
+    read_size = max(chunk_size//spacing, 1)*spacing
+    for start in range(0, L, read_size):
+        samples = np.asarray(omega[start:start+read_size], dtype=float)
+        #totals of the spacing-long segments of this chunk
+        segment_starts = np.arange(0, samples.shape[0], spacing)
+        totals[start//spacing:start//spacing+len(segment_starts)] = np.add.reduceat(samples, segment_starts, 0)
+    checkpoints = np.zeros(totals.shape)
+    checkpoints[1:] = blockwise_cumsum(totals[:-1])
+    checkpoints *= scale*t0
+
+    def integrated(start, stop):
+        #theta[start:stop] rebuilt from the nearest preceding checkpoint
+        first = start//spacing
+        running = blockwise_cumsum(omega[first*spacing:stop])
+        running *= scale*t0
+        running += checkpoints[first]
+        return running[start-first*spacing:]
+
+    #array of all m values with at least one full cluster difference
+    m = cluster_sizes(max_cluster_size(L), maxNumM)
+    m = m[L - 2*m > 0]
+    m_ints = m.copy().astype("int64")
 
     #array of averaging times (x-axis values of OADEV plot)
     tau = m*t0
 
-    #column vector of overlapping allan variance estimations (y-values of OADEV plot, but squared)
-    avar = np.zeros((len(m), 1))
-    
-    for i in range(0, len(m)):
-        #iterate over the cluster times
-        mi = m_ints[i]
-        #calculate the difference between adjacent cluster averages
-        arg = theta[int(2*mi):L] - np.multiply(2, theta[mi:int(L-mi)]) + theta[0:int(L-2*mi)]
-        #square the result
-        arg_squared = np.power(arg, 2)
-        #save the result in an array
-        avar[i] = np.sum(arg_squared, 0)
+    avar = np.zeros((len(m),) + omega.shape[1:])
+
+    #cluster sizes whose three boundaries fit in one window share its integration
+    short = np.flatnonzero(2*m_ints <= chunk_size)
+    longest = 2*m_ints[short].max() if len(short) else 0
+    num_differences = L - 2*m_ints[short].min() if len(short) else 0
+    for start in range(0, num_differences, chunk_size):
+        stop = min(start+chunk_size, L)
+        window = np.moveaxis(integrated(start, min(stop+longest, L)), 0, -1)
+
+        def window_sum(i):
+            num_differences = min(stop, L-2*m_ints[i]) - start
+            if num_differences <= 0:
+                return 0.0
+            return cluster_difference_sums(window[..., :num_differences+2*m_ints[i]], m_ints[i])
+
+        for i, total in zip(short, map_cluster_sizes(window_sum, short, workers)):
+            avar[i] += total
+
+    #longer cluster sizes accumulate the second difference of the samples
+    #instead, from the exact cluster difference at the start of every chunk
+    spanning = np.flatnonzero(2*m_ints > chunk_size)
+    num_differences = L - 2*m_ints[spanning].min() if len(spanning) else 0
+    for start in range(0, num_differences, chunk_size):
+        stop = min(start+chunk_size, num_differences)
+
+        def spanning_sum(i):
+            m_int = m_ints[i]
+            num_differences = min(stop, L-2*m_int) - start
+            if num_differences <= 0:
+                return 0.0
+            arg = np.empty((num_differences,) + omega.shape[1:])
+            arg[0] = integrated(start, start+1)[0] - 2*integrated(start+m_int, start+m_int+1)[0] + integrated(start+2*m_int, start+2*m_int+1)[0]
+            increments = arg[1:]
+            np.multiply(omega[start+m_int+1:start+m_int+num_differences], -2, out=increments, dtype=float)
+            increments += omega[start+1:start+num_differences]
+            increments += omega[start+2*m_int+1:start+2*m_int+num_differences]
+            increments *= scale*t0
+            arg = blockwise_cumsum(arg)
+            return np.einsum("i...,i...->...", arg, arg)
+
+        for i, total in zip(spanning, map_cluster_sizes(spanning_sum, spanning, workers)):
+            avar[i] += total
 
     #calculate the coefficient of the finite sum
-    denominator = np.multiply(np.multiply(2, np.power(tau, 2.0)), (L-np.multiply(2, m))).reshape(-1, 1)
+    denominator = _broadcast_over_channels(np.multiply(np.multiply(2, np.power(tau, 2.0)), (L-np.multiply(2, m))), avar)
+
+    adev = np.sqrt(avar/denominator)
+
+    return (tau, adev)
+
+
+
+def dense_overlapping_allan_deviation(omega, Fs, rtol=1e-6):
+    """Calculate the overlapping Allan deviation at every integer cluster size.
+
+    For a cluster size m, the sum of squared second differences of `theta` expands into
+    sums of theta**2 over index ranges (taken from one prefix sum), the autocorrelation
+    of theta at lags m and 2m (taken from one FFT), and two edge corrections over the
+    first and last m samples. The edge corrections are cross-correlations of dyadic
+    blocks of theta, done level by level with batched FFTs. All cluster sizes together
+    cost O(N log^2 N) instead of O(N^2).
+
+    The expansion subtracts large, nearly equal terms. Theta is detrended first, which
+    leaves the second differences unchanged. Cluster sizes whose rounding error
+    bound still exceeds `rtol` (e.g. at small m on rate random walk dominated data)
+    are recomputed directly with `cluster_difference_sums`.
+
+    Args:
+        omega (numpy array): Instantaneous output rate (or angle) measured by the IMU. Either (N,) or (N x channels).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        rtol (float, optional): Largest accepted relative rounding error of the allan variance. Defaults to 1e-6.
+
+    Returns:
+        (taus, oadev) (tuple): Tuple of values.
+            taus (numpy array): Averaging times for m = 1, 2, ..., (N-1)//2 (x-values of Allan Deviation plot).
+            oadev (numpy array): Array of overlapping Allan deviation estimations (y-values of Allan Deviation plot). (M,) for a single series, (M x channels) otherwise.
+    """
 
-    #calculate the final allan variance
-    avar = avar/denominator
+    #sampling period in seconds
+    t0 = 1/Fs
+
+    #integrate to find angles (or rate) measured by the imu, time along the last axis
+    theta = blockwise_cumsum(omega)
+    theta *= t0
+    theta = np.ascontiguousarray(np.moveaxis(theta, 0, -1))
+    L = theta.shape[-1]
+
+    #every cluster size with at least one full cluster difference
+    m = np.arange(1, (L-1)//2 + 1)
+    tau = m*t0
+
+    #second differences are unchanged by removing a straight line
+    theta = _detrended(theta)
+
+    #prefix sums of theta**2
+    squares = np.zeros(theta.shape[:-1] + (L+1,))
+    np.cumsum(theta*theta, -1, out=squares[..., 1:])
+
+    #autocorrelation of theta at every lag
+    size = 1 << (2*L - 1).bit_length()
+    spectrum = np.fft.rfft(theta, size)
+    autocorrelation = np.fft.irfft(spectrum*np.conj(spectrum), size)[..., :L]
+
+    #sum_(j<m) theta[j]*theta[j+m], and the same at the end of the series
+    head = _leading_lag_products(theta, len(m))
+    tail = _leading_lag_products(theta[..., ::-1], len(m))
+
+    #sum over c in [m, L-m) of (theta[c+m] - 2*theta[c] + theta[c-m])**2
+    sums = (squares[..., L, None] - squares[..., 2*m]) \
+        + 4*(squares[..., L-m] - squares[..., m]) \
+        + squares[..., L-2*m] \
+        - 4*(2*autocorrelation[..., m] - head - tail) \
+        + 2*autocorrelation[..., 2*m]
+
+    #rounding error bound relative to the size of the terms that cancel
+    total = squares[..., L, None]
+    error = 64*np.finfo(float).eps*np.log2(size)*total
+    inexact = np.any(error > rtol*np.abs(sums), axis=tuple(range(sums.ndim-1)))
+    for i in np.flatnonzero(inexact):
+        sums[..., i] = cluster_difference_sums(theta, m[i])
+
+    #calculate the final allan variance, one row per cluster size
+    avar = np.moveaxis(sums, -1, 0)/_broadcast_over_channels(np.multiply(np.multiply(2, np.power(tau, 2.0)), (L-np.multiply(2, m))), sums)
 
-    #the allan deviation is the square root of the allan variance
     adev = np.sqrt(avar)
 
-    # Reshape returned arrays to be row vectors
-    tau = tau.reshape(-1,)
-    adev = adev.reshape(-1,)
-    
-    return (tau, adev)
\ No newline at end of file
+    return (tau, adev)
+
+
+def _leading_lag_products(theta, max_lag):
+    """sum_(j<m) theta[j]*theta[j+m] for m = 1..max_lag, along the last axis.
+
+    The indices j < m are split into dyadic blocks: the block [P, P+b) with P a
+    multiple of 2b covers the cluster sizes m in [P+b, P+2b). For a fixed block
+    size the contributions of all blocks are one batched FFT cross-correlation.
+    """
+    L = theta.shape[-1]
+    products = np.zeros(theta.shape[:-1] + (max_lag+1,))
+
+    #room for the windows reaching past the end
+    padded = np.zeros(theta.shape[:-1] + (L + 4*max_lag + 4,))
+    padded[..., :L] = theta
+
+    b = 1
+    while b <= max_lag:
+        #start of every block that contributes to some m <= max_lag
+        starts = np.arange(0, max_lag - b + 1, 2*b)
+        i = np.arange(b)
+        d = np.arange(2*b - 1)
+
+        #block theta[P:P+b] against theta[2P+b : 2P+3b-1]
+        blocks = padded[..., starts[:, None] + i]
+        windows = padded[..., (2*starts + b)[:, None] + d]
+
+        size = 4*b
+        correlation = np.fft.irfft(np.conj(np.fft.rfft(blocks, size))*np.fft.rfft(windows, size), size)[..., :b]
+
+        #block at P serves m = P+b+d for d in [0, b)
+        lags = (starts + b)[:, None] + i
+        valid = lags <= max_lag
+        products[..., lags[valid]] += correlation[..., valid]
+
+        b *= 2
+
+    return products[..., 1:]
+
+
+def dynamic_allan_deviation(omega, Fs, window, step, maxNumM=100, workers=1, block_size=2**20):
+    """Calculate the overlapping Allan deviation over sliding windows of a series.
+
+    For every cluster size m, the squared second differences of `theta` are
+    computed once for the whole series, block by block. Their running sum is
+    read off at the first and last difference of every window, so the sum of
+    a window is the difference of two prefix sums and every window costs O(1)
+    per cluster size instead of a pass over its samples. The whole surface
+    costs about as much as one `overlapping_allan_deviation` of the series.
+
+    All windows share the cluster sizes of a series `window` samples long, and
+    each result matches `overlapping_allan_deviation` of the window's samples.
+
+    Args:
+        omega (numpy array): Instantaneous output rate (or angle) measured by the IMU, (N,).
+        Fs (int): Sampling frequency in Hertz (Hz).
+        window (int): Number of samples in every window.
+        step (int): Number of samples between the starts of consecutive windows.
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+        block_size (int, optional): Number of differences squared and summed at a time. Defaults to 2**20.
+
+    Returns:
+        (times, taus, adev) (tuple): Tuple of values.
+            times (numpy array): Time of the center of every window in seconds.
+            taus (numpy array): Array of discrete time clusters, shared by all windows.
+            adev (numpy array): (windows x M) overlapping Allan deviations.
+    """
+    window, step = int(window), int(step)
+
+    #sampling period in seconds
+    t0 = 1/Fs
+
+    #number of samples in the series
+    L = len(omega)
+    if window > L or window < 4 or step < 1:
+        raise ValueError(f"Expected 4 <= window <= {L} samples and step >= 1, got window={window} and step={step}")
+
+    #integrate samples over time to obtain output angle θ once for all windows
+    theta = blockwise_cumsum(omega)*t0
+
+    #first sample of every window
+    starts = np.arange(0, L - window + 1, step)
+
+    #cluster sizes of one window, leaving at least one difference per window
+    m = cluster_sizes(max_cluster_size(window), maxNumM)
+    m = m[window - 2*m > 0]
+    m_ints = m.copy().astype("int64")
+
+    #array of averaging times (x-axis values of OADEV plot)
+    tau = m*t0
+
+    def window_sums(mi):
+        #prefix sums of the squared differences are needed at these indices
+        num_differences = L - 2*mi
+        first, last = starts, starts + window - 2*mi
+        positions, inverse = np.unique(np.concatenate((first, last)), return_inverse=True)
+
+        prefix = np.empty(len(positions))
+        carry = 0.0
+        compensation = 0.0
+        scratch = np.empty(min(block_size, num_differences))
+        j = 0
+        for start in range(0, num_differences, block_size):
+            stop = min(start+block_size, num_differences)
+            #squared second differences of this block, prefix-summed in place
+            arg = scratch[:stop-start]
+            np.multiply(theta[start+mi:stop+mi], -2, out=arg)
+            arg += theta[start:stop]
+            arg += theta[start+2*mi:stop+2*mi]
+            np.square(arg, out=arg)
+            np.cumsum(arg, out=arg)
+
+            #prefix sum at every position in this block, i.e. the sum of the differences before it
+            while j < len(positions) and positions[j] <= stop:
+                index = positions[j] - start
+                prefix[j] = carry + (arg[index-1] if index > 0 else 0.0)
+                j += 1
+
+            #running total of the finished blocks, with Kahan compensation
+            term = arg[-1] - compensation
+            updated = carry + term
+            compensation = (updated - carry) - term
+            carry = updated
+
+        #positions past the last difference only occur for a window ending at the series end
+        prefix[j:] = carry
+
+        ends = prefix[inverse]
+        return ends[len(starts):] - ends[:len(starts)]
+
+    sums = np.stack(map_cluster_sizes(window_sums, m_ints, workers), axis=1)
+
+    #calculate the coefficient of the finite sum
+    denominator = np.multiply(np.multiply(2, np.power(tau, 2.0)), (window-np.multiply(2, m)))
+
+    adev = np.sqrt(sums/denominator)
+
+    #time of the center of every window
+    times = (starts + window/2)*t0
+
+    return (times, tau, adev)
@@ -1,12 +1,23 @@
 import streamlit as st
-from plotting import get_x_axis, plot_time_series, plot_allan_deviation
-from allan_variance import overlapping_allan_deviation as oadev
-from noise_synthesis import make_angle_random_walk_series, make_rate_random_walk_series, simulate_flicker_noise, simulate_quantization_noise, simulate_rate_ramp, make_bias_instability_series
+import time
+import numpy as np
+from plotting import get_x_axis, plot_time_series, plot_allan_deviation, plot_allan_deviation_bands
+from simulation_cache import cached_noise_model, cached_allan_deviation, source_key, ALLAN_DEVIATION_CACHE
+import instrumentation
+import defaults
+from demo import load_demo
+
+# The Monte Carlo and live stream sections import their modules when first shown
 
 # TODO:  Implement checks for minimum number of noise samples (AOTC streaming data)
 
 # Sidebar 
 
+# Precomputed simulation of the default parameters, shown while every parameter is still at its default
+demo = load_demo()
+demo_requested = st.sidebar.checkbox("Demo Mode", value=demo is not None) and demo is not None
+demo_note = st.sidebar.empty()
+
 # Initialize simulation parameters
 st.sidebar.title("Simulation Parameters")
 
@@ -15,38 +26,70 @@ verbose= st.sidebar.radio("Plot Fitting Lines", (True, False))
 sim_time = st.sidebar.number_input(
     label="Simulation Time (sec)",
     min_value=1.0,
-    value=3_000.0,
+    value=defaults.SIMULATION["sim_time"],
     format="%.2f"
 )
 
 fs = st.sidebar.number_input(
     label="Sampling Rate (Hz)",
     min_value=1.0,
-    value=20.0,
+    value=defaults.SIMULATION["fs"],
     format="%.2f"
 )
 
 st.sidebar.markdown("Generating {} data points".format(int(float(sim_time)*float(fs))))
 
+seed = st.sidebar.number_input(
+    label="Random Seed",
+    min_value=0,
+    value=defaults.SIMULATION["seed"]
+)
+
+
+# Monte Carlo ensemble of the same noise model
+run_monte_carlo = st.sidebar.checkbox("Monte Carlo Confidence Bands", value=False)
+num_realizations = st.sidebar.number_input(
+    label="Number of Realizations",
+    min_value=2,
+    value=100
+)
+
+
+# Live stream of frames from hardware or `python ingestion.py replay`
+live_mode = st.sidebar.checkbox("Live Stream", value=False)
+live_address = st.sidebar.text_input("UDP Address (host:port)", value="0.0.0.0:9000")
+live_fs = st.sidebar.number_input(label="Stream Sampling Rate (Hz)", min_value=1.0, value=1000.0, format="%.2f")
+live_channels = st.sidebar.number_input(label="Channels per Frame", min_value=1, value=1)
+live_dtype = st.sidebar.selectbox("Sample Type", ("<f4", "<f8", "<i2", "<i4"))
+live_scale = st.sidebar.number_input(label="Sample Scale", value=1.0, format="%g")
+live_window = st.sidebar.number_input(label="Plotted Window (sec)", min_value=1.0, value=10.0)
+live_refresh = st.sidebar.number_input(label="Refresh Period (sec)", min_value=0.1, value=1.0)
+
+
+# Per-stage timings of this run, shown at the bottom of the sidebar
+show_performance = st.sidebar.checkbox("Show Performance", value=False)
+trace_memory = st.sidebar.checkbox("Trace Peak Memory (slower)", value=False)
+performance = instrumentation.RecordCollector()
+
 
 # Initialize error coefficients
 st.sidebar.title("Error Coefficients")
 
 # Angle random walk
-incl_arw = st.sidebar.checkbox("Angle Random Walk (ARW)", value=True)
+incl_arw = st.sidebar.checkbox("Angle Random Walk (ARW)", value=defaults.INCLUDED["arw"])
 arw_coeff = st.sidebar.number_input(
     label="ARW Coefficient (\u00B0/\u221Asec)",
     min_value=0.000_000_001,
-    value=0.025,
+    value=defaults.SOURCES["arw"]["coeff"],
     format="%f"
 )
 
 # First Order Markov Model of Bias Instability
-use_first_order_markov = st.sidebar.checkbox("Bias Instability (BI) - First Order Markov Model", value=True) # For simplicity, omit this noise source by default
+use_first_order_markov = st.sidebar.checkbox("Bias Instability (BI) - First Order Markov Model", value=defaults.INCLUDED["markov_bi"]) # For simplicity, omit this noise source by default
 first_order_markov_bi_coeff = st.sidebar.number_input(
     label="BI Coefficient (\u00B0/sec)",
     min_value=0.000_000_001,
-    value=0.005,
+    value=defaults.SOURCES["markov_bi"]["coeff"],
     format="%f",
     key="first order markov model coefficient"
 )
@@ -54,17 +97,17 @@ first_order_markov_bi_coeff = st.sidebar.number_input(
 corr_time = st.sidebar.number_input(
     label="Correlation Time (sec)",
     min_value=0.0,
-    value=10.0,
+    value=defaults.SOURCES["markov_bi"]["corr_time"],
     format="%f"
 )
 
 
 # Filter Model of Bias instability
-use_filter_model = st.sidebar.checkbox("Bias Instability (BI) - Filter Model", value=False) # For simplicity, omit this noise source by default
+use_filter_model = st.sidebar.checkbox("Bias Instability (BI) - Filter Model", value=defaults.INCLUDED["filter_bi"]) # For simplicity, omit this noise source by default
 filter_model_bi_coeff = st.sidebar.number_input(
     label="BI Coefficient (\u00B0/sec)",
     min_value=0.000_000_001,
-    value=0.005,
+    value=defaults.SOURCES["filter_bi"]["coeff"],
     format="%f",
     key="filter model coefficient"
 )
@@ -72,34 +115,34 @@ filter_model_bi_coeff = st.sidebar.number_input(
 trunc_limit = st.sidebar.number_input(
     label="Number of IIR Filter Coefficients",
     min_value=1,
-    value=500
+    value=defaults.SOURCES["filter_bi"]["trunc_limit"]
 )
 
 
 # Rate random walk
-incl_rrw = st.sidebar.checkbox("Rate Random Walk (RRW)", value=True)
+incl_rrw = st.sidebar.checkbox("Rate Random Walk (RRW)", value=defaults.INCLUDED["rrw"])
 rrw_coeff = st.sidebar.number_input(
     label="RRW Coefficient (units/sec\u2022\u221Asec)",
     min_value=0.000_000_001,
-    value=0.001,
+    value=defaults.SOURCES["rrw"]["coeff"],
     format="%f"
 )
 
 # Quantization noise
-incl_qn = st.sidebar.checkbox("Quantization Noise (QN)", value=False) # For simplicity, omit this noise source by default
+incl_qn = st.sidebar.checkbox("Quantization Noise (QN)", value=defaults.INCLUDED["qn"]) # For simplicity, omit this noise source by default
 qn_coeff = st.sidebar.number_input(
     label="QN Coefficient (\u00B0)",
     min_value = 0.000_000_001,
-    value=0.0025,
+    value=defaults.SOURCES["qn"]["K"],
     format="%f"
 )
 
 # Rate ramp
-incl_rr = st.sidebar.checkbox("Rate Ramp (RR)", value=False) # For simplicity, omit this noise source by default
+incl_rr = st.sidebar.checkbox("Rate Ramp (RR)", value=defaults.INCLUDED["rr"]) # For simplicity, omit this noise source by default
 rr_coeff = st.sidebar.number_input(
     label="Rate Ramp (\u00B0/sec\u00b2)",
     min_value=0.000_000_001,
-    value=1e-8,
+    value=defaults.SOURCES["rr"]["coeff"],
     format="%f"
 )
 
@@ -122,78 +165,193 @@ After setting all of the parameters, a simulated signal of a single axis gyrosco
 """)
 
 
-# Containerize the remaining sections of the app
-gyro_time_series = st.beta_container()
-allan_deviation = st.beta_container()
+# Stages of the sections below are recorded only while the performance panel is shown, and recording
+# stops with the script, also when Streamlit interrupts it to rerun
+with instrumentation.recording(performance if show_performance else None, memory=trace_memory):
 
-# Simulated gyro signal section
-with gyro_time_series:
+    # Containerize the remaining sections of the app
+    gyro_time_series = st.beta_container()
+    allan_deviation = st.beta_container()
 
-    st.title("Single Stationary Gyroscope Signal")
+    # Simulated gyro signal section
+    with gyro_time_series:
 
-    st.write("""
-    The following plot is a simulation of stationary gyroscope data captured by the on-board computer of the IMU.
+        st.title("Single Stationary Gyroscope Signal")
 
-    Although the virtual device is completely stationary, this plot shows that sources of noise in the system are introducing error to the measurement. 
+        st.write("""
+        The following plot is a simulation of stationary gyroscope data captured by the on-board computer of the IMU.
 
-    The plot is interactive so users can probe and investigate their results. Plots can also be saved as a png.
-    """)
+        Although the virtual device is completely stationary, this plot shows that sources of noise in the system are introducing error to the measurement. 
 
+        The plot is interactive so users can probe and investigate their results. Plots can also be saved as a png.
+        Long signals are thinned to the extremes of each small stretch of samples; narrow the time window to see every sample.
+        """)
 
-    # Convert input parameters str -> float
-    num_samples = int(sim_time*fs)
 
+        # Convert input parameters str -> float
+        num_samples = int(sim_time*fs)
 
-    # Boolean array indicating which noise sources to include
-    noise_model = [incl_arw, use_first_order_markov, use_filter_model, incl_rrw, incl_qn, incl_rr]
-    
-    # If user is trying to use both Filter model and First Order Markov model simultaneously...
-    if (use_filter_model==True) and (use_first_order_markov==True):
-        # Use only the First Order Markov model for Bias instability
-        noise_model = [incl_arw, True, False, incl_rrw, incl_qn, incl_rr]
-        st.header("""Only one Bias Instability model can be used at a time. Using First Order Markov Model.""")
 
-    # All possible noise sources [ARW, 1st order BI, filter BI, RRW, QN, RR]
-    noise_sources = [
-        make_angle_random_walk_series(arw_coeff, fs, sim_time),
-        make_bias_instability_series(first_order_markov_bi_coeff, corr_time, fs, sim_time),
-        simulate_flicker_noise(filter_model_bi_coeff, fs, sim_time, trunc_limit),
-        make_rate_random_walk_series(rrw_coeff, fs, sim_time),
-        simulate_quantization_noise(qn_coeff, fs, sim_time),
-        simulate_rate_ramp(rr_coeff, fs, sim_time)
-    ]
+        # Boolean array indicating which noise sources to include
+        noise_model = [incl_arw, use_first_order_markov, use_filter_model, incl_rrw, incl_qn, incl_rr]
 
-    # Calculate the time stamps (x-axis values)
-    timestamps = get_x_axis(sim_time, fs)
+        # If user is trying to use both Filter model and First Order Markov model simultaneously...
+        if (use_filter_model==True) and (use_first_order_markov==True):
+            # Use only the First Order Markov model for Bias instability
+            noise_model = [incl_arw, True, False, incl_rrw, incl_qn, incl_rr]
+            st.header("""Only one Bias Instability model can be used at a time. Using First Order Markov Model.""")
 
-    # Add noise source series together according to the noise model
-    combined_noise = sum([noise*include for noise, include in zip(noise_sources, noise_model)])
+        # All possible noise sources [ARW, 1st order BI, filter BI, RRW, QN, RR] with their parameters
+        noise_sources = [
+            ("arw", {"coeff": arw_coeff}),
+            ("markov_bi", {"coeff": first_order_markov_bi_coeff, "corr_time": corr_time}),
+            ("filter_bi", {"coeff": filter_model_bi_coeff, "trunc_limit": int(trunc_limit)}),
+            ("rrw", {"coeff": rrw_coeff}),
+            ("qn", {"K": qn_coeff}),
+            ("rr", {"coeff": rr_coeff})
+        ]
 
-    # Create a figure for the time series
-    combined_noise_plot = plot_time_series(timestamps, combined_noise)
-    
-    # Plot the combined noise time series
-    st.plotly_chart(combined_noise_plot)
-    
+        # Only the sources in the noise model are simulated
+        enabled_sources = [source for source, include in zip(noise_sources, noise_model) if include]
 
+        # Any parameter changed from its default leaves demo mode, so the sidebar is never ignored
+        demo_mode = demo_requested and ([sim_time, fs, seed, noise_model, [[name, params] for name, params in enabled_sources]]
+                                        == [demo["settings"][key] for key in ("sim_time", "fs", "seed", "noise_model", "sources")])
+        if demo_mode:
+            demo_note.markdown("Showing a precomputed simulation of the default parameters. Changing any parameter below simulates it live.")
+        elif demo_requested:
+            demo_note.markdown("Parameters differ from the defaults, so they are simulated live.")
 
-# Allan deviation section 
-with allan_deviation:
+        if demo_mode:
+            # Same series as a live simulation of the defaults, read from disk
+            timestamps = get_x_axis(sim_time, fs)
+            combined_noise = demo["series"]
+        else:
+            # Calculate the time stamps (x-axis values)
+            timestamps = get_x_axis(sim_time, fs)
 
-    st.title("The Allan Deviation")
-    st.write("""
-    The following plot is shows the Allan deviation that corresponds to the above gyroscope signal.
+            # Add noise source series together according to the noise model, reusing earlier simulations
+            combined_noise = cached_noise_model(enabled_sources, fs, sim_time, seed)
+
+        # Time window to plot, the visible part is re-decimated at full point budget
+        time_window = st.slider(
+            label="Time Window (sec)",
+            min_value=0.0,
+            max_value=float(timestamps[-1]) if num_samples else 0.0,
+            value=(0.0, float(timestamps[-1]) if num_samples else 0.0)
+        )
+
+        # Create a figure for the time series
+        combined_noise_plot = plot_time_series(timestamps, combined_noise, x_range=time_window)
+
+        # Plot the combined noise time series
+        with instrumentation.stage("render", figure="time series"):
+            st.plotly_chart(combined_noise_plot)
+
+
+
+    # Allan deviation section 
+    with allan_deviation:
+
+        st.title("The Allan Deviation")
+        st.write("""
+        The following plot is shows the Allan deviation that corresponds to the above gyroscope signal.
+
+        The Allan deviation is a clever mathematical tool that is used to identify the noise sources polluting a time series. 
+        The Allan deviation has further uses in quantifying the impact of those same noise sources.
+        """)
 
-    The Allan deviation is a clever mathematical tool that is used to identify the noise sources polluting a time series. 
-    The Allan deviation has further uses in quantifying the impact of those same noise sources.
+        if demo_mode:
+            # Precomputed deviation and fitted lines
+            allan_plot = plot_allan_deviation(demo["tau"], demo["adev"], noise_model, verbose, fits=demo["fits"])
+        else:
+            # Compute the Allan deviation of the combined noise series, unless it is already cached
+            taus, allan_values = cached_allan_deviation(enabled_sources, fs, sim_time, seed)
+
+            # Create a figure for the Allan deviation
+            allan_plot = plot_allan_deviation(taus, allan_values, noise_model, verbose)
+
+        # Plot the Allan deviation
+        with instrumentation.stage("render", figure="allan deviation"):
+            st.plotly_chart(allan_plot)
+
+
+    # Monte Carlo section
+    if run_monte_carlo:
+
+        from ensemble import run_ensemble
+
+        st.title("Monte Carlo Confidence Bands")
+        st.write("""
+        The following plot shows the spread of the Allan deviation over many independent simulations of the same noise model.
+
+        The shaded band holds 90% of the realizations at every averaging time, which is a useful guide when setting acceptance thresholds.
+        """)
+
+        # Reduce the realizations to statistics in worker processes, reusing earlier runs
+        ensemble_key = ("ensemble", int(num_realizations)) + tuple(source_key(name, params, fs, sim_time, seed) for name, params in enabled_sources)
+        with instrumentation.stage("ensemble", num_realizations=int(num_realizations)):
+            ensemble = ALLAN_DEVIATION_CACHE.get(ensemble_key, lambda: run_ensemble(enabled_sources, fs, sim_time, int(num_realizations), seed=seed))
+
+        ensemble_plot = plot_allan_deviation_bands(ensemble["tau"], ensemble["mean"], ensemble["percentiles"][5], ensemble["percentiles"][95], "5th-95th Percentile")
+
+        with instrumentation.stage("render", figure="confidence bands"):
+            st.plotly_chart(ensemble_plot)
+
+
+# Performance panel
+if show_performance:
+    st.sidebar.title("Performance")
+    st.sidebar.markdown("Stages recomputed in this run; cached results take no time and are not listed.")
+    rows = performance.summary()
+    st.sidebar.table([{"Stage": row["stage"],
+                       "Calls": row["calls"],
+                       "Time (ms)": round(row["wall_time"]*1e3, 1),
+                       "Peak (MiB)": round(row["peak_bytes"]/2**20, 1) if trace_memory else "-"} for row in rows])
+
+
+# Live stream section, refreshed at a fixed cadence until the page reruns
+if live_mode:
+
+    st.title("Live Stream")
+    st.write("""
+    Frames received on the UDP address are decoded into a ring buffer holding the last ten minutes of samples.
+    The plot shows the latest window, and the Allan deviation covers every sample of the first channel received since the stream was opened
+    (or since the sample rate was changed), apart from samples overwritten before a refresh could read them.
+    Dropped frames are counted from gaps in the frame sequence numbers.
     """)
 
-    # Compute the Allan deviation of the combined noise series
-    taus, allan_values = oadev(combined_noise, fs)
+    from ingestion import shared_ingestor
+
+    # Ten minutes of samples, reused across reruns together with the running estimate
+    capacity = int(live_fs*600)
+    ingestor = shared_ingestor(udp=live_address, sample_dtype=live_dtype, num_channels=int(live_channels), capacity=capacity, scale=live_scale)
+    estimate = ingestor.allan_deviation_estimate(live_fs)
+
+    stats_box = st.empty()
+    series_box = st.empty()
+    adev_box = st.empty()
+
+    while True:
+        next_refresh = time.monotonic() + live_refresh
+
+        # Only samples arrived since the last refresh are added to the estimate
+        live_taus, live_adev = estimate.update()
+
+        # Samples and their position from one read, so the time axis matches them
+        window, position = ingestor.ring.snapshot(int(live_window*live_fs))
+        window = window[:, 0]
+        times = (position - len(window) + np.arange(len(window)))/live_fs
+        if len(window):
+            series_box.plotly_chart(plot_time_series(times, window))
+
+        if len(live_taus) > 1:
+            adev_box.plotly_chart(plot_allan_deviation(live_taus, live_adev, noise_model, False))
 
-    # Create a figure for the Allan deviation
-    allan_plot = plot_allan_deviation(taus, allan_values, noise_model, verbose)
+        stats = ingestor.stats()
+        stats_box.markdown(f"**{stats['frames']}** frames at **{stats['rate']:.0f}** Hz, "
+                           f"**{stats['dropped']}** dropped, **{stats['out_of_order']}** out of order"
+                           + (f", **{estimate.lost}** samples skipped by a slow refresh" if estimate.lost else "")
+                           + (f"  \nStream error: {stats['error']}" if stats["error"] else ""))
 
-    # Plot the Allan deviation
-    st.plotly_chart(allan_plot)
-     
\ No newline at end of file
+        time.sleep(max(next_refresh - time.monotonic(), 0))
\ No newline at end of file
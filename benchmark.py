@@ -0,0 +1,495 @@
+"""Benchmarks of the synthesis, Allan deviation, fitting and plotting hot paths.
+
+Every benchmark is run for each combination of its swept parameters. The
+fastest of `--repeat` runs is recorded as the wall time, and one untimed run
+under `tracemalloc` beforehand gives the peak memory allocated by the call
+(NumPy reports its array buffers to tracemalloc). Results are appended as JSON lines keyed by
+the git commit, so runs from different commits can be compared:
+
+    python benchmark.py --sizes 1e3 1e4 1e5 1e6
+    python benchmark.py --filter adev --sizes 1e7 1e8 --repeat 1
+    python benchmark.py --compare 73ab12c 526e83f
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import allan_variance
+import coefficient_fitting
+import noise_synthesis
+
+
+# Sampling rate of every benchmark input in Hz
+FS = 100
+
+# Default values of the swept parameters
+SWEEPS = {
+    "num_samples": (1e3, 1e4, 1e5, 1e6),
+    "trunc_limit": (100, 1000),
+    "maxNumM": (25, 100),
+}
+
+# Default location of the results
+RESULTS_PATH = "benchmark_results.jsonl"
+
+# Directory of this checkout, where the app benchmarks' subprocesses find the modules
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Benchmarks by name, as (setup, swept parameters)
+#   setup(**params) prepares the inputs outside of the timed region and
+#   returns the zero-argument callable that is timed
+BENCHMARKS = {}
+
+
+def benchmark(name, sweep=("num_samples",)):
+    """Register the decorated setup function in `BENCHMARKS`"""
+    def register(setup):
+        BENCHMARKS[name] = (setup, sweep)
+        return setup
+    return register
+
+
+def _white_noise(num_samples):
+    """Reproducible angle random walk input"""
+    return np.random.default_rng(0).standard_normal(int(num_samples))*0.1
+
+
+def _synthetic_allan_deviation(num_samples, maxNumM):
+    """ARW + BI + RRW Allan deviation curve on the cluster grid of `num_samples` samples"""
+    m = allan_variance.cluster_sizes(allan_variance.max_cluster_size(int(num_samples)), maxNumM)
+    tau = m/FS
+    adev = np.sqrt(0.025**2/tau + 0.005**2 + 0.001**2*tau/3)
+    return (tau, adev)
+
+
+# Noise synthesis
+
+def _noise_source_setup(name, params):
+    """Setup of one entry of `noise_synthesis.NOISE_SOURCES`"""
+    def setup(num_samples):
+        sim_time = int(num_samples)/FS
+        return lambda: noise_synthesis.simulate_noise_source(name, params, FS, sim_time, rng=0)
+    return setup
+
+
+def _noise_source_iterator_setup(name, params):
+    """Setup of one entry of `noise_synthesis.NOISE_SOURCE_ITERATORS`, consuming every block"""
+    def setup(num_samples):
+        sim_time = int(num_samples)/FS
+        def run():
+            for _ in noise_synthesis.iter_noise_source(name, params, FS, sim_time, rng=0):
+                pass
+        return run
+    return setup
+
+
+# Parameters of every noise source other than the flicker filter length
+_NOISE_SOURCE_PARAMS = {
+    "arw": {"coeff": 0.025},
+    "markov_bi": {"coeff": 0.005, "corr_time": 100},
+    "rrw": {"coeff": 0.001},
+    "qn": {"K": 0.01},
+    "rr": {"coeff": 0.0001},
+}
+
+for _name, _params in _NOISE_SOURCE_PARAMS.items():
+    benchmark(f"synthesis.{_name}")(_noise_source_setup(_name, _params))
+    benchmark(f"synthesis.iter_{_name}")(_noise_source_iterator_setup(_name, _params))
+
+
+@benchmark("synthesis.filter_bi", sweep=("num_samples", "trunc_limit"))
+def _flicker_noise(num_samples, trunc_limit):
+    return _noise_source_setup("filter_bi", {"coeff": 0.005, "trunc_limit": trunc_limit})(num_samples)
+
+
+@benchmark("synthesis.iter_filter_bi", sweep=("num_samples", "trunc_limit"))
+def _flicker_noise_blocks(num_samples, trunc_limit):
+    return _noise_source_iterator_setup("filter_bi", {"coeff": 0.005, "trunc_limit": trunc_limit})(num_samples)
+
+
+@benchmark("synthesis.first_order_recursion")
+def _first_order_recursion(num_samples):
+    x = _white_noise(num_samples)
+    return lambda: noise_synthesis.first_order_recursion(x, 0.99)
+
+
+@benchmark("synthesis.float32", sweep=("num_samples", "trunc_limit"))
+def _float32_synthesis(num_samples, trunc_limit):
+    sim_time = int(num_samples)/FS
+    params = {"coeff": 0.005, "trunc_limit": trunc_limit}
+    return lambda: noise_synthesis.simulate_noise_source("filter_bi", params, FS, sim_time, rng=0, dtype="float32")
+
+
+@benchmark("synthesis.model", sweep=("num_samples", "trunc_limit"))
+def _noise_model(num_samples, trunc_limit):
+    sim_time = int(num_samples)/FS
+    sources = [(name, params) for name, params in _NOISE_SOURCE_PARAMS.items()]
+    sources.append(("filter_bi", {"coeff": 0.005, "trunc_limit": trunc_limit}))
+    out = np.empty(int(num_samples))
+    return lambda: noise_synthesis.simulate_noise_model(sources, FS, sim_time, rng=0, out=out)
+
+
+# Allan deviation
+
+@benchmark("adev.overlapping", sweep=("num_samples", "maxNumM"))
+def _overlapping(num_samples, maxNumM):
+    omega = _white_noise(num_samples)
+    return lambda: allan_variance.overlapping_allan_deviation(omega, FS, maxNumM)
+
+
+@benchmark("adev.overlapping_float32", sweep=("num_samples", "maxNumM"))
+def _overlapping_float32(num_samples, maxNumM):
+    omega = _white_noise(num_samples).astype(np.float32)
+    return lambda: allan_variance.overlapping_allan_deviation(omega, FS, maxNumM, precision="float32")
+
+
+@benchmark("adev.all_variants", sweep=("num_samples", "maxNumM"))
+def _all_variants(num_samples, maxNumM):
+    omega = _white_noise(num_samples)
+    return lambda: allan_variance.allan_deviations(omega, FS, maxNumM=maxNumM)
+
+
+for _variant, _function in (("modified", allan_variance.modified_allan_deviation),
+                            ("hadamard", allan_variance.hadamard_deviation),
+                            ("total", allan_variance.total_deviation)):
+    @benchmark(f"adev.{_variant}", sweep=("num_samples", "maxNumM"))
+    def _single_variant(num_samples, maxNumM, function=_function):
+        omega = _white_noise(num_samples)
+        return lambda: function(omega, FS, maxNumM)
+
+
+@benchmark("adev.chunked", sweep=("num_samples", "maxNumM"))
+def _chunked(num_samples, maxNumM):
+    omega = _white_noise(num_samples)
+    return lambda: allan_variance.chunked_overlapping_allan_deviation(omega, FS, maxNumM, chunk_size=2**16)
+
+
+@benchmark("adev.online", sweep=("num_samples", "maxNumM"))
+def _online(num_samples, maxNumM):
+    omega = _white_noise(num_samples)
+    maxM = allan_variance.max_cluster_size(len(omega))
+    def run():
+        estimator = allan_variance.OnlineAllanDeviation(FS, maxM, maxNumM)
+        for start in range(0, len(omega), 2**16):
+            estimator.update(omega[start:start+2**16])
+        return estimator.allan_deviation()
+    return run
+
+
+@benchmark("adev.dense")
+def _dense(num_samples):
+    omega = _white_noise(num_samples)
+    return lambda: allan_variance.dense_overlapping_allan_deviation(omega, FS)
+
+
+@benchmark("adev.gram", sweep=("num_samples", "maxNumM"))
+def _gram(num_samples, maxNumM):
+    series = [np.random.default_rng(i).standard_normal(int(num_samples)) for i in range(3)]
+    return lambda: allan_variance.overlapping_allan_gram(series, FS, maxNumM)
+
+
+@benchmark("adev.gram_rescale", sweep=("num_samples", "maxNumM"))
+def _gram_rescale(num_samples, maxNumM):
+    series = [np.random.default_rng(i).standard_normal(int(num_samples)) for i in range(3)]
+    _, gram = allan_variance.overlapping_allan_gram(series, FS, maxNumM)
+    return lambda: allan_variance.allan_deviation_from_gram(gram, [0.025, 0.005, 0.001])
+
+
+@benchmark("adev.dynamic", sweep=("num_samples", "maxNumM"))
+def _dynamic(num_samples, maxNumM):
+    omega = _white_noise(num_samples)
+    # Windows of a tenth of the series, overlapping by 90 %
+    window = max(len(omega)//10, 4)
+    return lambda: allan_variance.dynamic_allan_deviation(omega, FS, window, max(window//10, 1), maxNumM)
+
+
+@benchmark("adev.blockwise_cumsum")
+def _blockwise_cumsum(num_samples):
+    omega = _white_noise(num_samples)
+    return lambda: allan_variance.blockwise_cumsum(omega)
+
+
+# Coefficient fitting
+
+for _line in ("fit_random_walk_line", "fit_rate_random_walk_line", "fit_bias_instability_line"):
+    @benchmark(f"fitting.{_line}", sweep=("num_samples", "maxNumM"))
+    def _fit(num_samples, maxNumM, function=getattr(coefficient_fitting, _line)):
+        tau, adev = _synthetic_allan_deviation(num_samples, maxNumM)
+        return lambda: function(tau, adev)
+
+
+def _synthetic_allan_deviations(num_samples, maxNumM, num_curves=100):
+    """(M x curves) matrix of the synthetic curve with a different scale per curve, e.g. the channels of many logs"""
+    tau, adev = _synthetic_allan_deviation(num_samples, maxNumM)
+    return (tau, np.outer(adev, np.linspace(0.5, 2, num_curves)))
+
+
+@benchmark("fitting.fit_lines_batch", sweep=("num_samples", "maxNumM"))
+def _fit_lines_batch(num_samples, maxNumM):
+    tau, curves = _synthetic_allan_deviations(num_samples, maxNumM)
+    return lambda: coefficient_fitting.fit_lines_batch(tau, curves)
+
+
+@benchmark("fitting.fit_allan_variance_model", sweep=("num_samples", "maxNumM"))
+def _fit_allan_variance_model(num_samples, maxNumM):
+    tau, curves = _synthetic_allan_deviations(num_samples, maxNumM)
+    return lambda: coefficient_fitting.fit_allan_variance_model(tau, curves, duration=int(num_samples)/FS)
+
+
+# Figure builders
+
+@benchmark("plotting.time_series")
+def _time_series(num_samples):
+    import plotting
+    y = _white_noise(num_samples)
+    time_axis = plotting.get_x_axis(int(num_samples)/FS, FS)[:len(y)]
+    return lambda: plotting.plot_time_series(time_axis, y)
+
+
+@benchmark("plotting.allan_deviation", sweep=("num_samples", "maxNumM"))
+def _allan_deviation_figure(num_samples, maxNumM):
+    import plotting
+    tau, adev = _synthetic_allan_deviation(num_samples, maxNumM)
+    return lambda: plotting.plot_allan_deviation(tau, adev, [True, True, False, True], True)
+
+
+@benchmark("plotting.allan_deviation_bands", sweep=("num_samples", "maxNumM"))
+def _allan_deviation_bands_figure(num_samples, maxNumM):
+    import plotting
+    tau, adev = _synthetic_allan_deviation(num_samples, maxNumM)
+    return lambda: plotting.plot_allan_deviation_bands(tau, adev, 0.9*adev, 1.1*adev, "5th-95th Percentile")
+
+
+@benchmark("plotting.dynamic_allan_deviation", sweep=("num_samples", "maxNumM"))
+def _dynamic_allan_deviation_figure(num_samples, maxNumM):
+    import plotting
+    # One window every 100 samples, more than the figure shows for long series
+    tau, adev = _synthetic_allan_deviation(num_samples, maxNumM)
+    num_windows = max(int(num_samples)//100, 1)
+    times = (np.arange(num_windows) + 0.5)*100/FS
+    surface = np.outer(np.linspace(0.5, 2, num_windows), adev)
+    return lambda: plotting.plot_dynamic_allan_deviation(times, tau, surface)
+
+
+# Parameter sweeps
+
+@benchmark("sweep.arw_bi_rrw", sweep=("num_samples", "maxNumM"))
+def _sweep_grid(num_samples, maxNumM):
+    import sweep
+    axes = {"arw.coeff": np.logspace(-3, -1, 20), "markov_bi.coeff": np.logspace(-4, -2, 20), "rrw.coeff": np.logspace(-5, -3, 10)}
+    sources = [("markov_bi", {"corr_time": 100})]
+    return lambda: sweep.sweep_allan_deviation(sources, axes, FS, int(num_samples)/FS, maxNumM=maxNumM)
+
+
+# App start-up, each run in a fresh interpreter so imports are cold
+
+# First render of the app's default view without Streamlit: the app's imports,
+# then the time series and Allan deviation figures of a simulation or of demo
+# artifacts, serialized as they would be sent to the browser
+_FIRST_RENDER = """
+import sys
+from plotting import get_x_axis, plot_time_series, plot_allan_deviation
+from simulation_cache import cached_noise_model, cached_allan_deviation
+import instrumentation
+from demo import DEMO_SETTINGS, load_demo
+
+if sys.argv[1] == "demo":
+    demo = load_demo(sys.argv[2])
+    settings = demo["settings"]
+    plot_time_series(get_x_axis(settings["sim_time"], settings["fs"]), demo["series"]).to_json()
+    plot_allan_deviation(demo["tau"], demo["adev"], settings["noise_model"], True, fits=demo["fits"]).to_json()
+else:
+    settings = dict(DEMO_SETTINGS, sim_time=float(sys.argv[2])/DEMO_SETTINGS["fs"])
+    sources = [(name, params) for name, params in settings["sources"]]
+    series = cached_noise_model(sources, settings["fs"], settings["sim_time"], settings["seed"])
+    plot_time_series(get_x_axis(settings["sim_time"], settings["fs"]), series).to_json()
+    tau, adev = cached_allan_deviation(sources, settings["fs"], settings["sim_time"], settings["seed"])
+    plot_allan_deviation(tau, adev, settings["noise_model"], True).to_json()
+"""
+
+
+def _first_render_run(*args):
+    """Run `_FIRST_RENDER` in a fresh interpreter, without the on-disk result store"""
+    environment = dict(os.environ, ALLAN_ONLINE_STORE="")
+    return lambda: subprocess.run([sys.executable, "-c", _FIRST_RENDER] + [str(arg) for arg in args], env=environment, cwd=REPO_DIR, check=True)
+
+
+# Scratch directory of the benchmarks' files, removed when the process exits
+_scratch = None
+
+
+def _scratch_path(name):
+    global _scratch
+    if _scratch is None:
+        _scratch = tempfile.TemporaryDirectory(prefix="allan-benchmark-")
+    return os.path.join(_scratch.name, name)
+
+
+@benchmark("app.import")
+def _app_import(num_samples):
+    code = "import plotting, simulation_cache, instrumentation, demo"
+    return lambda: subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True)
+
+
+@benchmark("app.first_render")
+def _app_first_render(num_samples):
+    return _first_render_run("simulate", int(num_samples))
+
+
+@benchmark("app.demo_first_render")
+def _app_demo_first_render(num_samples):
+    import demo
+    #every size replaces the previous demo in the scratch directory
+    path = _scratch_path("demo")
+    demo.build_demo(path, dict(demo.DEMO_SETTINGS, sim_time=int(num_samples)/demo.DEMO_SETTINGS["fs"]))
+    return _first_render_run("demo", path)
+
+
+def git_commit():
+    """(commit hash, whether the working tree has uncommitted changes), or (None, None) outside a git checkout"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=REPO_DIR, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, cwd=REPO_DIR, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return (None, None)
+    return (commit, bool(status.strip()))
+
+
+def measure(run, repeat=3):
+    """Time `run` and measure its peak allocation.
+
+    Args:
+        run (callable): Zero-argument function to measure
+        repeat (int, optional): Number of timed runs. Defaults to 3.
+
+    Returns:
+        dict: "wall_time" (fastest run, s), "mean_time" (s) and "peak_bytes"
+    """
+    #untimed run, also warming up imports and caches; tracemalloc slows
+    #allocation-heavy code down so it is kept out of the timed runs
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    return {"wall_time": min(times), "mean_time": sum(times)/len(times), "peak_bytes": peak}
+
+
+def run_benchmarks(names, sweeps, repeat=3, max_seconds=math.inf):
+    """Run benchmarks over every combination of their swept parameters.
+
+    Args:
+        names (list): Keys of `BENCHMARKS` to run
+        sweeps (dict): Values of every swept parameter, see `SWEEPS`
+        repeat (int, optional): Number of timed runs per case. Defaults to 3.
+        max_seconds (float, optional): Skip larger sample counts of a benchmark once one run takes longer than this. Defaults to no limit.
+
+    Yields:
+        dict: One record per case, ready to be written as a JSON line
+    """
+    commit, dirty = git_commit()
+    environment = {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine()}
+
+    for name in names:
+        setup, sweep = BENCHMARKS[name]
+        too_slow = math.inf
+        for values in itertools.product(*(sweeps[key] for key in sweep)):
+            params = dict(zip(sweep, values))
+            params["num_samples"] = int(params["num_samples"])
+            if params["num_samples"] > too_slow:
+                continue
+            result = measure(setup(**params), repeat)
+            if result["wall_time"] > max_seconds:
+                too_slow = min(too_slow, params["num_samples"])
+            yield {"commit": commit, "dirty": dirty, "timestamp": time.time(), "benchmark": name,
+                   "params": params, "repeat": repeat, **result, **environment}
+
+
+def load_results(path, commit):
+    """Latest record of every (benchmark, params) for the commit starting with `commit`"""
+    results = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            if record["commit"] and record["commit"].startswith(commit):
+                results[(record["benchmark"], json.dumps(record["params"], sort_keys=True))] = record
+    return results
+
+
+def compare(path, base, head, threshold=1.1):
+    """Print the time and memory ratios of `head` over `base` for the cases both have run.
+
+    Returns:
+        int: Number of cases slower or larger than `threshold` times the base
+    """
+    base_results = load_results(path, base)
+    head_results = load_results(path, head)
+
+    regressions = 0
+    print(f"{'benchmark':40} {'params':45} {'time':>8} {'memory':>8}")
+    for key in sorted(base_results.keys() & head_results.keys()):
+        old, new = base_results[key], head_results[key]
+        time_ratio = new["wall_time"]/old["wall_time"]
+        memory_ratio = (new["peak_bytes"] + 1)/(old["peak_bytes"] + 1)
+        flag = ""
+        if max(time_ratio, memory_ratio) > threshold:
+            flag = "  <-- regression"
+            regressions += 1
+        print(f"{key[0]:40} {key[1]:45} {time_ratio:8.2f} {memory_ratio:8.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--sizes", type=float, nargs="+", default=SWEEPS["num_samples"], help="sample counts to sweep")
+    parser.add_argument("--trunc-limits", type=int, nargs="+", default=SWEEPS["trunc_limit"], help="flicker filter lengths to sweep")
+    parser.add_argument("--max-num-m", type=int, nargs="+", default=SWEEPS["maxNumM"], help="cluster size counts to sweep")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per case")
+    parser.add_argument("--max-seconds", type=float, default=math.inf, help="stop growing a benchmark once a run takes longer than this")
+    parser.add_argument("--output", default=RESULTS_PATH, help="JSON lines file the results are appended to")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="compare the stored results of two commits instead of running")
+    parser.add_argument("--threshold", type=float, default=1.1, help="ratio reported as a regression by --compare")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for name, (_, sweep) in BENCHMARKS.items():
+            print(f"{name:40} {', '.join(sweep)}")
+        return 0
+
+    if args.compare:
+        return 1 if compare(args.output, *args.compare, threshold=args.threshold) else 0
+
+    sweeps = {"num_samples": args.sizes, "trunc_limit": args.trunc_limits, "maxNumM": args.max_num_m}
+    names = [name for name in BENCHMARKS if args.filter in name]
+
+    with open(args.output, "a") as f:
+        for record in run_benchmarks(names, sweeps, args.repeat, args.max_seconds):
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            print(f"{record['benchmark']:40} {json.dumps(record['params']):60} "
+                  f"{record['wall_time']*1e3:10.2f} ms {record['peak_bytes']/2**20:9.2f} MiB", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,294 @@
+"""Characterize a directory of IMU logs without the app.
+
+Every log is processed in its own worker process: the samples are memory-mapped,
+the overlapping Allan deviation of every channel is computed in bounded-size
+chunks, and the noise coefficients are fitted. Each file's result is saved on
+its own as soon as it is done, so an interrupted run picks up where it stopped,
+and all results are then merged into one columnar file:
+
+    python characterize.py "logs/*.bin" --fs 200 --channels 3 --scale 0.00875 --output fleet.npz
+    python characterize.py logs/ --fs 200 --output fleet.csv
+
+Raw binary logs are read with `imu_log.open_imu_log`; .npy files are
+memory-mapped and .csv/.txt files are loaded as (samples x channels) columns.
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from allan_variance import chunked_overlapping_allan_deviation
+from coefficient_fitting import LINE_FITS, fit_lines_batch, fit_allan_variance_model
+from imu_log import open_imu_log
+
+
+def find_logs(patterns, exclude=()):
+    """Sorted paths of the files matched by directories or glob patterns.
+
+    Args:
+        patterns (list): Directories or glob patterns
+        exclude (list, optional): Files and directories never taken as logs, e.g. this tool's own output. Defaults to ().
+
+    Returns:
+        list: Paths of the log files
+    """
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(os.path.join(pattern, name) for name in os.listdir(pattern))
+        else:
+            paths.update(glob.glob(pattern))
+    return sorted(path for path in paths if os.path.isfile(path) and not any(_is_within(path, other) for other in exclude))
+
+
+def _is_within(path, other):
+    """Whether `path` is the file `other` or inside the directory `other`"""
+    path, other = os.path.realpath(path), os.path.realpath(other)
+    return path == other or path.startswith(other.rstrip(os.sep) + os.sep)
+
+
+def output_files(output, parts_dir):
+    """Files and directories written by a run, kept out of the logs of the next one"""
+    return [output, f"{output}.tmp.npz", parts_dir]
+
+
+def load_log(path, dtype="int16", num_channels=1, header_bytes=0):
+    """Samples of one log as an (N,) or (N x channels) array like, without reading raw or .npy files"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return np.load(path, mmap_mode="r")
+    if extension in (".csv", ".txt"):
+        return np.loadtxt(path, delimiter="," if extension == ".csv" else None, ndmin=1)
+    return open_imu_log(path, dtype, num_channels, header_bytes=header_bytes)
+
+
+def characterize_log(path, settings):
+    """Allan deviation and noise coefficients of every channel of one log.
+
+    Args:
+        path (str): Path of the log file
+        settings (dict): Keyword arguments of `load_log` plus "fs", "scale", "maxNumM", "chunk_size" and "model_fit"
+
+    Returns:
+        dict: "tau" (M,), "adev" (M x channels) and one (channels,) array per coefficient
+    """
+    samples = load_log(path, settings["dtype"], settings["num_channels"], settings["header_bytes"])
+
+    tau, adev = chunked_overlapping_allan_deviation(samples, settings["fs"], settings["maxNumM"], settings["scale"], settings["chunk_size"])
+    adev = adev.reshape(len(tau), -1)
+
+    result = {"tau": tau, "adev": adev}
+
+    # Points without a positive, finite deviation in every channel (e.g. a stuck
+    # channel) have no logarithm and would turn every fitted coefficient into NaN
+    usable = np.all(np.isfinite(adev) & (adev > 0), axis=1)
+    if np.count_nonzero(usable) < 2:
+        fits = {noise_type: np.full(adev.shape[1], np.nan) for noise_type in LINE_FITS}
+        model = fits
+    else:
+        fits = fit_lines_batch(tau[usable], adev[usable])
+        if settings["model_fit"]:
+            duration = samples.shape[0]/settings["fs"]
+            model = fit_allan_variance_model(tau[usable], adev[usable], duration=duration)
+
+    for noise_type, coeffs in fits.items():
+        result[noise_type] = coeffs
+    if settings["model_fit"]:
+        for noise_type in LINE_FITS:
+            result[f"model_{noise_type}"] = model[noise_type]
+
+    return result
+
+
+def result_path(parts_dir, path, settings):
+    """File holding the result of one log, named after the log's identity and the settings"""
+    stat = os.stat(path)
+    identity = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, settings], sort_keys=True)
+    digest = hashlib.sha1(identity.encode()).hexdigest()[:16]
+    return os.path.join(parts_dir, f"{os.path.basename(path)}.{digest}.npz")
+
+
+def _characterize_task(task):
+    """Compute and save the result of one log, run inside a worker process"""
+    path, settings, destination = task
+    start = time.perf_counter()
+    result = characterize_log(path, settings)
+
+    # Write next to the destination first, so a killed worker never leaves a partial result
+    temporary = f"{destination}.{os.getpid()}.tmp.npz"
+    np.savez(temporary, **result)
+    os.replace(temporary, destination)
+
+    return (path, time.perf_counter() - start)
+
+
+def characterize_logs(paths, settings, parts_dir, workers=0, progress=sys.stderr):
+    """Characterize every log not already done, in parallel.
+
+    Args:
+        paths (list): Paths of the logs
+        settings (dict): See `characterize_log`
+        parts_dir (str): Directory holding one result file per log
+        workers (int, optional): Number of worker processes, 0 for one per CPU. Defaults to 0.
+        progress (file, optional): Stream progress lines are written to, None for silence. Defaults to sys.stderr.
+
+    Returns:
+        dict: Result file of every log, in the order of `paths`
+    """
+    os.makedirs(parts_dir, exist_ok=True)
+    #results of earlier runs are never logs themselves
+    paths = [path for path in paths if not _is_within(path, parts_dir)]
+    destinations = {path: result_path(parts_dir, path, settings) for path in paths}
+    pending = [path for path in paths if not os.path.exists(destinations[path])]
+
+    def report(message):
+        if progress is not None:
+            print(message, file=progress, flush=True)
+
+    report(f"{len(paths)} logs, {len(paths)-len(pending)} already done")
+
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    tasks = [(path, settings, destinations[path]) for path in pending]
+
+    done = 0
+    failures = 0
+    if workers == 1 or len(tasks) < 2:
+        results = (_run_task(task) for task in tasks)
+        for path, elapsed, error in results:
+            done += 1
+            failures += error is not None
+            report(_progress_line(done, len(tasks), path, elapsed, error))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            futures = {pool.submit(_characterize_task, task): task[0] for task in tasks}
+            for future in as_completed(futures):
+                done += 1
+                try:
+                    path, elapsed = future.result()
+                    error = None
+                except Exception as exc:
+                    path, elapsed, error = futures[future], 0.0, exc
+                    failures += 1
+                report(_progress_line(done, len(tasks), path, elapsed, error))
+
+    if failures:
+        report(f"{failures} logs failed, rerun to retry them")
+
+    return {path: destinations[path] for path in paths if os.path.exists(destinations[path])}
+
+
+def _run_task(task):
+    """`_characterize_task` in this process, catching errors like the pool does"""
+    try:
+        path, elapsed = _characterize_task(task)
+        return (path, elapsed, None)
+    except Exception as exc:
+        return (task[0], 0.0, exc)
+
+
+def _progress_line(done, total, path, elapsed, error):
+    if error is not None:
+        return f"[{done}/{total}] {path} failed: {error!r}"
+    return f"[{done}/{total}] {path} ({elapsed:.2f} s)"
+
+
+def merge_results(result_files, output):
+    """Merge per-log results into one columnar file, one row per channel (.npz) or per (channel, tau) (.csv).
+
+    In the .npz file, "tau" and "adev" are (rows x longest M) matrices padded
+    with NaN, next to the "path" and "channel" columns and one column per
+    coefficient.
+
+    Args:
+        result_files (dict): Result file of every log, see `characterize_logs`
+        output (str): Path of the merged .npz or .csv file
+    """
+    rows = []
+    for path, result_file in result_files.items():
+        with np.load(result_file) as result:
+            result = dict(result)
+        coefficients = [key for key in result if key not in ("tau", "adev")]
+        for channel in range(result["adev"].shape[1]):
+            row = {"path": path, "channel": channel, "tau": result["tau"], "adev": result["adev"][:, channel]}
+            row.update({key: result[key][channel] for key in coefficients})
+            rows.append(row)
+
+    coefficients = [key for key in (rows[0] if rows else {}) if key not in ("path", "channel", "tau", "adev")]
+
+    if output.lower().endswith(".csv"):
+        with open(output, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["path", "channel", "tau", "adev"] + coefficients)
+            for row in rows:
+                for tau, adev in zip(row["tau"], row["adev"]):
+                    writer.writerow([row["path"], row["channel"], repr(float(tau)), repr(float(adev))] + [repr(float(row[key])) for key in coefficients])
+        return
+
+    longest = max((len(row["tau"]) for row in rows), default=0)
+    columns = {
+        "path": np.array([row["path"] for row in rows], dtype=str),
+        "channel": np.array([row["channel"] for row in rows], dtype=int),
+        "tau": np.full((len(rows), longest), np.nan),
+        "adev": np.full((len(rows), longest), np.nan),
+    }
+    for i, row in enumerate(rows):
+        columns["tau"][i, :len(row["tau"])] = row["tau"]
+        columns["adev"][i, :len(row["adev"])] = row["adev"]
+    for key in coefficients:
+        columns[key] = np.array([row[key] for row in rows], dtype=float)
+
+    temporary = f"{output}.tmp.npz"
+    np.savez(temporary, **columns)
+    os.replace(temporary, output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="+", help="directories or glob patterns of log files")
+    parser.add_argument("--fs", type=float, required=True, help="sampling rate in Hz")
+    parser.add_argument("--dtype", default="int16", help="type of one stored sample in raw logs")
+    parser.add_argument("--channels", type=int, default=1, help="number of interleaved channels in raw logs")
+    parser.add_argument("--header-bytes", type=int, default=0, help="bytes to skip at the start of raw logs")
+    parser.add_argument("--scale", type=float, default=1.0, help="factor converting samples to physical units")
+    parser.add_argument("--max-num-m", type=int, default=100, help="number of discrete time clusters")
+    parser.add_argument("--chunk-size", type=int, default=2**20, help="samples read at a time")
+    parser.add_argument("--model-fit", action="store_true", help="also fit the full Allan variance model to every curve")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes, 0 for one per CPU")
+    parser.add_argument("--output", default="characterization.npz", help="merged .npz or .csv file")
+    parser.add_argument("--parts", default=None, help="directory of per-log results, defaults to <output>.parts")
+    args = parser.parse_args(argv)
+
+    settings = {
+        "fs": args.fs,
+        "dtype": args.dtype,
+        "num_channels": args.channels,
+        "header_bytes": args.header_bytes,
+        "scale": args.scale,
+        "maxNumM": args.max_num_m,
+        "chunk_size": args.chunk_size,
+        "model_fit": args.model_fit,
+    }
+
+    parts_dir = args.parts or f"{args.output}.parts"
+    paths = find_logs(args.logs, exclude=output_files(args.output, parts_dir))
+    if not paths:
+        print("no log files found", file=sys.stderr)
+        return 1
+
+    result_files = characterize_logs(paths, settings, parts_dir, args.workers)
+    merge_results(result_files, args.output)
+    print(f"wrote {len(result_files)} of {len(paths)} logs to {args.output}", file=sys.stderr)
+
+    return 0 if len(result_files) == len(paths) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
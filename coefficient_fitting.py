@@ -102,4 +102,147 @@ def fit_bias_instability_line(tau_array, allan_array):
     # Horizontal line 
     t = np.ones(len(tau_array))
 
-    return (computed_coeff * (2*np.log(2)/np.pi)**0.5 * t, computed_coeff)
\ No newline at end of file
+    return (computed_coeff * (2*np.log(2)/np.pi)**0.5 * t, computed_coeff)
+
+# Batch fitting of many Allan deviation curves
+#   Curves share the averaging times and are stored column by column in an
+#   (M x curves) matrix, like the output of `allan_variance.allan_deviations`
+#   for (N x channels) input.
+
+# Slope on the Allan deviation plot and averaging time at which each coefficient is read
+LINE_FITS = {
+    "qn": (-1, 3**0.5),
+    "arw": (-0.5, 1),
+    "bi": (0, None),
+    "rrw": (0.5, 3),
+    "rr": (1, 2**0.5),
+}
+
+def fit_lines_batch(tau_array, allan_matrix, noise_types=tuple(LINE_FITS)):
+    """Single-slope coefficient fits of every curve in one vectorized pass.
+
+    For every noise type, the point where each curve's log-log slope is closest
+    to the noise type's slope is found, and the coefficient is read off the line
+    of that slope through the point, exactly like `fit_random_walk_line` and
+    friends do for a single curve.
+
+    Args:
+        tau_array (numpy.array): Averaging times shared by all curves, (M,)
+        allan_matrix (numpy.array): Allan deviations, (M,) or (M x curves)
+        noise_types (tuple, optional): Keys of `LINE_FITS` to fit. Defaults to all of them.
+
+    Returns:
+        dict: Coefficients of every noise type, (curves,) or scalar for a single curve
+    """
+    allan_matrix = np.asarray(allan_matrix, dtype=float)
+    single = allan_matrix.ndim == 1
+    if single:
+        allan_matrix = allan_matrix[:, np.newaxis]
+
+    # Transform into log space once for every fit
+    logx = np.log10(tau_array)
+    logy = np.log10(allan_matrix)
+    dlogy = np.divide(np.diff(logy, axis=0), np.diff(logx)[:, np.newaxis])
+    curves = np.arange(logy.shape[1])
+
+    coefficients = {}
+    for noise_type in noise_types:
+        slope, tau_star = LINE_FITS[noise_type]
+
+        # Index of the closest slope and the intercept through it, for every curve
+        target_index = np.abs(dlogy-slope).argmin(axis=0)
+        intercept = logy[target_index, curves] - slope*logx[target_index]
+
+        if tau_star is None:
+            coeff = calculate_coeff_with_slope_zero(intercept)
+        else:
+            coeff = calculate_coeff_from_slope(slope, tau_star, intercept)
+
+        coefficients[noise_type] = coeff[0] if single else coeff
+
+    return coefficients
+
+def allan_variance_model_terms(tau_array):
+    """Terms of the Allan variance for unit coefficients, (M x 5) in `LINE_FITS` order.
+
+    avar = 3Q^2/tau^2 + N^2/tau + B^2*(2ln2/pi) + K^2*tau/3 + R^2*tau^2/2
+    """
+    tau_array = np.asarray(tau_array, dtype=float)
+    return np.stack([3/tau_array**2,
+                     1/tau_array,
+                     np.full(tau_array.shape, 2*np.log(2)/np.pi),
+                     tau_array/3,
+                     tau_array**2/2], axis=1)
+
+def fit_allan_variance_model(tau_array, allan_matrix, noise_types=tuple(LINE_FITS), duration=None):
+    """Weighted least-squares fit of the full Allan variance model to every curve.
+
+    The Allan variance is linear in the squared coefficients, so the model
+    avar = 3Q^2/tau^2 + N^2/tau + B^2*(2ln2/pi) + K^2*tau/3 + R^2*tau^2/2
+    is fitted to every point of each curve with relative residuals, i.e. each
+    point is weighted by 1/avar. With `duration`, points are also weighted by
+    the square root of their number of independent clusters, duration/tau, so
+    the noisy long averaging times count less. The squared coefficients are kept
+    nonnegative: with at most five terms, every subset of the terms is solved
+    for all curves at once and each curve keeps the best nonnegative solution,
+    which is the exact nonnegative least-squares fit.
+
+    Args:
+        tau_array (numpy.array): Averaging times shared by all curves, (M,)
+        allan_matrix (numpy.array): Allan deviations, (M,) or (M x curves)
+        noise_types (tuple, optional): Keys of `LINE_FITS` included in the model. Defaults to all of them.
+        duration (float, optional): Length in seconds of the series the curves were computed from. Defaults to None which weights only by 1/avar.
+
+    Returns:
+        dict: Coefficients of every noise type, (curves,) or scalar for a single curve, and
+            "fit" (numpy.array): Allan deviation of the fitted model, shaped like `allan_matrix`
+    """
+    allan_matrix = np.asarray(allan_matrix, dtype=float)
+    single = allan_matrix.ndim == 1
+    if single:
+        allan_matrix = allan_matrix[:, np.newaxis]
+
+    columns = [list(LINE_FITS).index(noise_type) for noise_type in noise_types]
+    terms = allan_variance_model_terms(tau_array)[:, columns]
+
+    # Relative residuals, optionally scaled by the confidence of every point
+    avar = allan_matrix**2
+    weights = 1/avar
+    if duration is not None:
+        clusters = np.maximum(duration/np.asarray(tau_array, dtype=float), 1)
+        weights = weights*np.sqrt(clusters)[:, np.newaxis]
+
+    # Weighted design matrix of every curve with unit-norm columns, (curves x M x terms)
+    design = weights.T[:, :, np.newaxis]*terms[np.newaxis, :, :]
+    norms = np.linalg.norm(design, axis=1, keepdims=True)
+    design = design/norms
+    target = (weights*avar).T
+
+    gram = np.einsum("cmi,cmj->cij", design, design)
+    rhs = np.einsum("cmi,cm->ci", design, target)
+
+    num_curves, num_terms = rhs.shape
+    best = np.zeros((num_curves, num_terms))
+    best_residual = np.sum(target**2, axis=1)
+
+    # Unconstrained solution on every support, kept where nonnegative and better
+    for support in range(1, 2**num_terms):
+        active = [i for i in range(num_terms) if support >> i & 1]
+        sub_gram = gram[:, active][:, :, active] + 1e-12*np.eye(len(active))
+        solution = np.zeros((num_curves, num_terms))
+        solution[:, active] = np.linalg.solve(sub_gram, rhs[:, active, np.newaxis])[..., 0]
+        residual = np.sum((np.einsum("cmi,ci->cm", design, solution) - target)**2, axis=1)
+        better = np.all(solution >= 0, axis=1) & (residual < best_residual)
+        best[better] = solution[better]
+        best_residual[better] = residual[better]
+
+    # Undo the column scaling to get the squared coefficients
+    squared = best/norms[:, 0, :]
+    coeffs = np.sqrt(squared)
+
+    fit = np.sqrt(terms @ squared.T)
+
+    coefficients = {noise_type: (coeffs[0, i] if single else coeffs[:, i]) for i, noise_type in enumerate(noise_types)}
+    coefficients["fit"] = fit[:, 0] if single else fit
+
+    return coefficients
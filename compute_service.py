@@ -0,0 +1,532 @@
+"""HTTP service running noise simulations and Allan deviations as background jobs.
+
+The event loop only reads requests and hands the work to a bounded process
+pool, so it never blocks on a computation. Uploaded samples are decoded and
+hashed on a thread, and request sizes are capped, so large uploads do not
+stall the loop either. Submitting a job returns its ID
+right away, to be polled until the result is ready. A job's ID is the hash of
+its request, so identical requests share one job, whether it is still running
+or already finished. Results are also kept in the on-disk result store (see
+`result_store`), so other service processes and later runs answer identical
+requests without recomputing. Only the standard library is used on top of
+the repo's own modules.
+
+    python compute_service.py serve --port 8000 --workers 4
+    python compute_service.py loadtest --url http://127.0.0.1:8000 --requests 200 --concurrency 20
+
+Endpoints:
+    POST /jobs/simulate   JSON {"sources": [["arw", {"coeff": 0.025}], ...], "fs": 100, "sim_time": 600,
+                                "seed": 0, "maxNumM": 100, "include_series": false}
+    POST /jobs/adev       JSON {"samples": [...], "fs": 100, "maxNumM": 100}, or raw samples with
+                          Content-Type application/octet-stream and ?fs=100&dtype=float32&channels=1&scale=1
+    GET  /jobs/<id>       {"job_id", "status": "queued" | "running" | "done" | "failed", "result" | "error"}
+    GET  /health          {"status": "ok", "jobs": ..., "pending": ...}
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from allan_variance import overlapping_allan_deviation
+from coefficient_fitting import fit_lines_batch
+from noise_synthesis import NOISE_SOURCES, simulate_noise_model
+from result_store import array_digest, result_key, shared_store
+from simulation_cache import source_rng
+
+
+# Largest accepted request body, and JSON body (larger uploads are sent as raw binary samples)
+MAX_BODY_BYTES = 256*2**20
+MAX_JSON_BYTES = 16*2**20
+
+# Most samples simulated or uploaded in one job, and returned with "include_series"
+MAX_SAMPLES = 2**25
+MAX_SERIES_SAMPLES = 2**20
+
+
+class HTTPError(Exception):
+    """Error answered with an HTTP status code"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Jobs, run inside the worker processes
+
+def simulate_job(spec):
+    """Simulate a noise model and compute its Allan deviation and coefficients.
+
+    Args:
+        spec (dict): "sources" [(name, params), ...], "fs", "sim_time", "seed", "maxNumM" and "include_series"
+
+    Returns:
+        dict: "tau", "adev", "coefficients" and, when requested, "series" as an array
+    """
+    fs, sim_time, seed = spec["fs"], spec["sim_time"], spec["seed"]
+
+    def simulate():
+        # Same per-source streams as the app, so results match for the same seed
+        rngs = [source_rng(name, seed) for name, _ in spec["sources"]]
+        return simulate_noise_model(spec["sources"], fs, sim_time, rngs)
+
+    if spec["include_series"]:
+        combined = simulate()
+        result = _json_result(_allan_deviation_arrays(combined, fs, spec["maxNumM"]))
+        result["series"] = combined
+        return result
+
+    # Without the series, the result of an identical earlier spec is as good
+    key = result_key("simulation_fit", sources=[[name, params] for name, params in spec["sources"]], fs=fs, sim_time=sim_time,
+                     seed=seed, maxNumM=spec["maxNumM"], variant="overlapping")
+    return _json_result(_stored(key, lambda: _allan_deviation_arrays(simulate(), fs, spec["maxNumM"])))
+
+
+def adev_job(spec, samples, digest=None):
+    """Allan deviation and coefficients of uploaded samples, (N,) or (N x channels), `digest` their `array_digest` when known"""
+    digest = array_digest(samples) if digest is None else digest
+    key = result_key("adev_fit", data=digest, Fs=spec["fs"], maxNumM=spec["maxNumM"], variant="overlapping")
+    return _json_result(_stored(key, lambda: _allan_deviation_arrays(samples, spec["fs"], spec["maxNumM"])))
+
+
+def _allan_deviation_arrays(samples, fs, maxNumM):
+    """"tau", "adev" and the fitted coefficients of every noise type"""
+    tau, adev = overlapping_allan_deviation(samples, fs, maxNumM)
+    arrays = {"tau": tau, "adev": adev}
+    arrays.update(fit_lines_batch(tau, adev))
+    return arrays
+
+
+def _stored(key, compute):
+    """compute(), or the same result from the on-disk store shared with the other workers and processes"""
+    store = shared_store()
+    return compute() if store is None else store.get_or_compute(key, compute)
+
+
+def _json_result(arrays):
+    return {
+        "tau": arrays["tau"].tolist(),
+        "adev": arrays["adev"].tolist(),
+        "coefficients": {noise_type: np.asarray(coeff).tolist() for noise_type, coeff in arrays.items() if noise_type not in ("tau", "adev")},
+    }
+
+
+# Request validation
+
+def parse_simulation_spec(body):
+    """Validated simulation spec of a POST /jobs/simulate body"""
+    spec = _json_body(body)
+    try:
+        parsed = {
+            "sources": [(str(name), dict(params)) for name, params in spec["sources"]],
+            "fs": float(spec["fs"]),
+            "sim_time": float(spec["sim_time"]),
+            "seed": int(spec.get("seed", 0)),
+            "maxNumM": int(spec.get("maxNumM", 100)),
+            "include_series": bool(spec.get("include_series", False)),
+        }
+    except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+        raise HTTPError(400, 'expected "sources", "fs" and "sim_time", and optionally integer "seed" and "maxNumM"')
+    for name, _ in parsed["sources"]:
+        if name not in NOISE_SOURCES:
+            raise HTTPError(400, f"unknown noise source {name!r}, expected one of {sorted(NOISE_SOURCES)}")
+    if not parsed["fs"] > 0 or not parsed["sim_time"] > 0:
+        raise HTTPError(400, '"fs" and "sim_time" must be positive')
+    if parsed["maxNumM"] < 1:
+        raise HTTPError(400, '"maxNumM" must be at least 1')
+
+    num_samples = parsed["fs"]*parsed["sim_time"]
+    if num_samples > MAX_SAMPLES:
+        raise HTTPError(413, f"simulations are limited to {MAX_SAMPLES} samples, fs*sim_time is {num_samples:.0f}")
+    if parsed["include_series"] and num_samples > MAX_SERIES_SAMPLES:
+        raise HTTPError(413, f'"include_series" is limited to {MAX_SERIES_SAMPLES} samples, fs*sim_time is {num_samples:.0f}')
+    return parsed
+
+
+def parse_adev_upload(body, content_type, query):
+    """(spec, samples) of a POST /jobs/adev request, from JSON or raw binary samples"""
+    if content_type.startswith("application/octet-stream"):
+        try:
+            spec = {"fs": float(query["fs"]), "maxNumM": int(query.get("maxNumM", 100))}
+            dtype = np.dtype(query.get("dtype", "float32"))
+            channels = int(query.get("channels", 1))
+            scale = float(query.get("scale", 1.0))
+        except (KeyError, TypeError, ValueError):
+            raise HTTPError(400, 'expected "fs" and optionally "dtype", "channels", "scale" and "maxNumM" in the query')
+        #only plain integer and floating point samples can be read from raw bytes
+        if dtype.kind not in "iuf":
+            raise HTTPError(400, f'"dtype" must be an integer or floating point type, not {dtype}')
+        if channels < 1:
+            raise HTTPError(400, '"channels" must be at least 1')
+        frames = len(body)//(dtype.itemsize*channels)
+        if frames*channels > MAX_SAMPLES:
+            raise HTTPError(413, f"uploads are limited to {MAX_SAMPLES} samples")
+        samples = np.frombuffer(body, dtype=dtype, count=frames*channels).reshape(frames, channels)
+        samples = samples[:, 0] if channels == 1 else samples
+        samples = samples*scale if scale != 1.0 else samples.astype(float)
+    else:
+        if len(body) > MAX_JSON_BYTES:
+            raise HTTPError(413, f"JSON bodies are limited to {MAX_JSON_BYTES} bytes, send larger uploads as application/octet-stream")
+        payload = _json_body(body)
+        try:
+            spec = {"fs": float(payload["fs"]), "maxNumM": int(payload.get("maxNumM", 100))}
+            samples = np.asarray(payload["samples"], dtype=float)
+        except (AttributeError, KeyError, TypeError, ValueError, OverflowError):
+            raise HTTPError(400, 'expected "samples" and "fs"')
+
+    if not spec["fs"] > 0:
+        raise HTTPError(400, '"fs" must be positive')
+    if spec["maxNumM"] < 1:
+        raise HTTPError(400, '"maxNumM" must be at least 1')
+    if samples.ndim not in (1, 2) or samples.shape[0] < 4:
+        raise HTTPError(400, "expected at least 4 samples, (N,) or (N x channels)")
+    if samples.size > MAX_SAMPLES:
+        raise HTTPError(413, f"uploads are limited to {MAX_SAMPLES} samples")
+    return (spec, samples)
+
+
+def prepare_adev_upload(body, content_type, query):
+    """(spec, samples, digest) of a POST /jobs/adev request, decoded and hashed on an executor thread"""
+    spec, samples = parse_adev_upload(body, content_type, query)
+    samples = np.ascontiguousarray(samples)
+    return (spec, samples, array_digest(samples))
+
+
+def _json_body(body):
+    try:
+        return json.loads(body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "body is not valid JSON")
+
+
+def job_id(kind, spec, data=b""):
+    """ID of a job, the same for identical requests"""
+    digest = hashlib.sha256(kind.encode())
+    digest.update(json.dumps(spec, sort_keys=True).encode())
+    digest.update(data)
+    return digest.hexdigest()[:32]
+
+
+# Service
+
+class ComputeService:
+    """Job table and process pool behind the HTTP handlers.
+
+    Args:
+        workers (int, optional): Number of worker processes, 0 for one per CPU. Defaults to 0.
+        max_pending (int, optional): Most jobs queued or running at once, further submissions are answered 503. Defaults to 64.
+        max_jobs (int, optional): Most jobs kept, the oldest finished ones are forgotten first. Defaults to 1024.
+        max_series_bytes (int, optional): Most bytes of simulated series kept with finished jobs, the oldest ones are forgotten first. Defaults to 256 MiB.
+    """
+
+    def __init__(self, workers=0, max_pending=64, max_jobs=1024, max_series_bytes=256*2**20):
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.max_pending = max_pending
+        self.max_jobs = max_jobs
+        self.max_series_bytes = max_series_bytes
+        self.jobs = OrderedDict()
+        self.pending = 0
+        self.pool = None
+
+    def start(self):
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+
+    def submit(self, key, function, *args):
+        """ID of the job computing function(*args), reusing an identical queued, running or finished job"""
+        job = self.jobs.get(key)
+        if job is not None and job["status"] != "failed":
+            self.jobs.move_to_end(key)
+            return key
+        if self.pending >= self.max_pending:
+            raise HTTPError(503, "too many pending jobs, retry later")
+
+        self.jobs[key] = {"job_id": key, "status": "queued", "submitted": time.time()}
+        self.pending += 1
+        asyncio.get_running_loop().create_task(self._run(key, function, args))
+        self._evict()
+        return key
+
+    async def _run(self, key, function, args):
+        job = self.jobs[key]
+        job["status"] = "running"
+        try:
+            job["result"] = await asyncio.get_running_loop().run_in_executor(self.pool, function, *args)
+            job["status"] = "done"
+        except Exception as exc:
+            job["status"] = "failed"
+            job["error"] = repr(exc)
+        finally:
+            job["finished"] = time.time()
+            self.pending -= 1
+            self._evict()
+
+    def _evict(self):
+        #forget the oldest finished jobs first, pending ones are never dropped
+        for key in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[key]["status"] in ("done", "failed"):
+                del self.jobs[key]
+
+        #series are large, so jobs holding them are also forgotten once they outgrow their budget
+        series_bytes = sum(_series_bytes(job) for job in self.jobs.values())
+        for key in list(self.jobs):
+            if series_bytes <= self.max_series_bytes:
+                break
+            if _series_bytes(self.jobs[key]):
+                series_bytes -= _series_bytes(self.jobs.pop(key))
+
+    async def handle(self, method, path, query, headers, body):
+        """(status, JSON-serializable response) of one request"""
+        if method == "GET" and path == "/health":
+            return (200, {"status": "ok", "jobs": len(self.jobs), "pending": self.pending, "workers": self.workers})
+
+        if method == "GET" and path.startswith("/jobs/"):
+            job = self.jobs.get(path[len("/jobs/"):])
+            if job is None:
+                raise HTTPError(404, "unknown job")
+            if _series_bytes(job):
+                #a series of up to MAX_SERIES_SAMPLES is encoded off the loop
+                return (200, await asyncio.get_running_loop().run_in_executor(None, _encode_job, job))
+            return (200, job)
+
+        if method == "POST" and path == "/jobs/simulate":
+            spec = await asyncio.get_running_loop().run_in_executor(None, parse_simulation_spec, body)
+            key = self.submit(job_id("simulate", spec), simulate_job, spec)
+            return (202, {"job_id": key, "status": self.jobs[key]["status"]})
+
+        if method == "POST" and path == "/jobs/adev":
+            spec, samples, digest = await asyncio.get_running_loop().run_in_executor(
+                None, prepare_adev_upload, body, headers.get("content-type", ""), query)
+            key = self.submit(job_id("adev", spec, digest.encode()), adev_job, spec, samples, digest)
+            return (202, {"job_id": key, "status": self.jobs[key]["status"]})
+
+        raise HTTPError(404, f"no route for {method} {path}")
+
+    async def serve_connection(self, reader, writer):
+        """Answer the requests of one connection, keeping it alive while the client asks to"""
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                url = urlsplit(target)
+                try:
+                    status, response = await self.handle(method, url.path, dict(parse_qsl(url.query)), headers, body)
+                except HTTPError as exc:
+                    status, response = exc.status, {"error": str(exc)}
+                except Exception as exc:
+                    #a bug in a handler answers 500 instead of dropping the connection
+                    traceback.print_exc(file=sys.stderr)
+                    status, response = 500, {"error": f"internal error: {exc!r}"}
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await write_response(writer, status, response, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as exc:
+            await write_response(writer, exc.status, {"error": str(exc)}, keep_alive=False)
+        except Exception as exc:
+            traceback.print_exc(file=sys.stderr)
+            try:
+                await write_response(writer, 500, {"error": f"internal error: {exc!r}"}, keep_alive=False)
+            except (ConnectionError, RuntimeError):
+                pass
+        finally:
+            writer.close()
+
+
+def _series_bytes(job):
+    """Size of the simulated series a finished job holds, 0 without one"""
+    series = job.get("result", {}).get("series")
+    return series.nbytes if series is not None else 0
+
+
+def _encode_job(job):
+    """JSON body of a job holding a series array"""
+    result = dict(job["result"], series=job["result"]["series"].tolist())
+    return json.dumps(dict(job, result=result)).encode()
+
+
+# Minimal HTTP/1.1
+
+_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+async def read_request(reader):
+    """(method, target, headers, body) of the next request, None when the client closed the connection"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = content_length(headers)
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+
+    return (method.upper(), target, headers, body)
+
+
+def content_length(headers):
+    """Body length announced by the Content-Length header, 0 when it is missing"""
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "malformed Content-Length header")
+    if length < 0:
+        raise HTTPError(400, "negative Content-Length header")
+    return length
+
+
+async def write_response(writer, status, response, keep_alive=True):
+    """Send a response, `response` either JSON-serializable or an already encoded JSON body"""
+    body = response if isinstance(response, bytes) else json.dumps(response).encode()
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(host="127.0.0.1", port=8000, workers=0, max_pending=64):
+    service = ComputeService(workers, max_pending)
+    service.start()
+    server = await asyncio.start_server(service.serve_connection, host, port)
+    print(f"serving on http://{host}:{port} with {service.workers} workers", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.shutdown()
+
+
+# Local load test client
+
+async def request(host, port, method, path, payload=None):
+    """(status, decoded JSON) of one request on a fresh connection"""
+    reader, writer = await asyncio.open_connection(host, port)
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                  f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    data = await reader.readexactly(content_length(headers))
+    writer.close()
+
+    return (int(status_line.split()[1]), json.loads(data))
+
+
+async def load_test(url, num_requests=100, concurrency=10, distinct=10, sim_time=600.0, fs=100.0, poll_interval=0.05):
+    """Submit simulation jobs and poll them to completion, reporting latencies.
+
+    `distinct` different seeds are cycled through, so the other requests
+    exercise the deduplication of identical jobs.
+
+    Returns:
+        dict: Request counts, wall time, throughput and latency percentiles in seconds
+    """
+    target = urlsplit(url)
+    host, port = target.hostname, target.port or 80
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(i):
+        spec = {"sources": [["arw", {"coeff": 0.025}], ["markov_bi", {"coeff": 0.005, "corr_time": 10}], ["rrw", {"coeff": 0.001}]],
+                "fs": fs, "sim_time": sim_time, "seed": i % distinct}
+        async with semaphore:
+            start = time.perf_counter()
+            status, response = await request(host, port, "POST", "/jobs/simulate", spec)
+            while status == 503:
+                await asyncio.sleep(poll_interval)
+                status, response = await request(host, port, "POST", "/jobs/simulate", spec)
+            while status == 202 or response.get("status") in ("queued", "running"):
+                await asyncio.sleep(poll_interval)
+                status, response = await request(host, port, "GET", f"/jobs/{response['job_id']}")
+            latencies.append(time.perf_counter() - start)
+            statuses[response.get("status")] = statuses.get(response.get("status"), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(num_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array(latencies)
+    return {
+        "requests": num_requests,
+        "statuses": statuses,
+        "wall_time": elapsed,
+        "requests_per_second": num_requests/elapsed,
+        "latency": {f"p{p}": float(np.percentile(latencies, p)) for p in (50, 90, 99)},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the service")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--workers", type=int, default=0, help="worker processes, 0 for one per CPU")
+    serve_parser.add_argument("--max-pending", type=int, default=64, help="jobs queued or running before submissions get 503")
+
+    load_parser = commands.add_parser("loadtest", help="load test a running service")
+    load_parser.add_argument("--url", default="http://127.0.0.1:8000")
+    load_parser.add_argument("--requests", type=int, default=100)
+    load_parser.add_argument("--concurrency", type=int, default=10)
+    load_parser.add_argument("--distinct", type=int, default=10, help="number of different simulations among the requests")
+    load_parser.add_argument("--sim-time", type=float, default=600.0)
+    load_parser.add_argument("--fs", type=float, default=100.0)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        try:
+            asyncio.run(serve(args.host, args.port, args.workers, args.max_pending))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    report = asyncio.run(load_test(args.url, args.requests, args.concurrency, args.distinct, args.sim_time, args.fs))
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
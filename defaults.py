@@ -0,0 +1,43 @@
+"""Default parameters of the app's simulation.
+
+The sidebar starts from these values and the demo is built from them, so the
+precomputed demo always shows what the app would simulate on its first run.
+"""
+
+# Length, sampling rate, seed and number of cluster sizes of the simulation
+SIMULATION = {
+    "sim_time": 3000.0,
+    "fs": 20.0,
+    "seed": 0,
+    "maxNumM": 100,
+}
+
+# Parameters of every noise source, in the app's order [ARW, 1st order BI, filter BI, RRW, QN, RR]
+SOURCES = {
+    "arw": {"coeff": 0.025},
+    "markov_bi": {"coeff": 0.005, "corr_time": 10.0},
+    "filter_bi": {"coeff": 0.005, "trunc_limit": 500},
+    "rrw": {"coeff": 0.001},
+    "qn": {"K": 0.0025},
+    "rr": {"coeff": 1e-8},
+}
+
+# Whether every noise source is simulated by default
+INCLUDED = {
+    "arw": True,
+    "markov_bi": True,
+    "filter_bi": False,
+    "rrw": True,
+    "qn": False,
+    "rr": False,
+}
+
+
+def noise_model():
+    """Default inclusion flags in the app's order, [ARW, 1st order BI, filter BI, RRW, QN, RR]"""
+    return [INCLUDED[name] for name in SOURCES]
+
+
+def enabled_sources():
+    """(name, params) of every noise source simulated by default"""
+    return [(name, dict(params)) for name, params in SOURCES.items() if INCLUDED[name]]
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""Precomputed demo of the app's default simulation.
+
+The build step simulates the default noise model once and saves the series,
+its Allan deviation and the fitted lines as .npy files. In demo mode the app
+memory-maps them instead of simulating, so the first page renders without
+running (or importing) the synthesis and fitting code.
+
+    python demo.py build
+    python demo.py build --output demo_artifacts --sim-time 3000 --fs 20
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+
+import numpy as np
+
+import defaults
+
+
+# Where the app looks for the artifacts
+DEMO_PATH = os.environ.get("ALLAN_ONLINE_DEMO", "demo_artifacts")
+
+# The app's default simulation, taken from the same place as the sidebar's defaults
+DEMO_SETTINGS = dict(
+    defaults.SIMULATION,
+    # Whether [ARW, 1st order BI, filter BI, RRW, QN, RR] are included, as in the app
+    noise_model=defaults.noise_model(),
+    sources=[[name, params] for name, params in defaults.enabled_sources()],
+)
+
+# Names of the fitted lines, as keys of `plotting.fit_lines` and parts of the file names
+FIT_FILES = {"random walk": "fit_rw", "rate random walk": "fit_rrw", "bias instability": "fit_bi"}
+
+
+def build_demo(output=DEMO_PATH, settings=DEMO_SETTINGS):
+    """Simulate the demo and save its artifacts.
+
+    The files are written to a temporary directory that then replaces
+    `output`, so a running app never sees a half-built demo.
+
+    Args:
+        output (str, optional): Directory of the artifacts. Defaults to `DEMO_PATH`.
+        settings (dict, optional): Simulation settings, see `DEMO_SETTINGS`. Defaults to `DEMO_SETTINGS`.
+    """
+    from allan_variance import overlapping_allan_deviation
+    from noise_synthesis import simulate_noise_model
+    from plotting import fit_lines
+    from simulation_cache import source_rng
+
+    fs, sim_time, seed = settings["fs"], settings["sim_time"], settings["seed"]
+    sources = [(name, params) for name, params in settings["sources"]]
+
+    # Same per-source streams as the app, so the demo matches a live simulation with the same seed
+    series = simulate_noise_model(sources, fs, sim_time, [source_rng(name, seed) for name, _ in sources])
+    tau, adev = overlapping_allan_deviation(series, fs, settings["maxNumM"])
+    fits = fit_lines(tau, adev, settings["noise_model"])
+
+    temporary = f"{output.rstrip(os.sep)}.{os.getpid()}.tmp"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    np.save(os.path.join(temporary, "series.npy"), series)
+    np.save(os.path.join(temporary, "tau.npy"), tau)
+    np.save(os.path.join(temporary, "adev.npy"), adev)
+    coefficients = {}
+    for name, (line, coeff) in fits.items():
+        np.save(os.path.join(temporary, f"{FIT_FILES[name]}.npy"), line)
+        coefficients[name] = float(coeff)
+    with open(os.path.join(temporary, "demo.json"), "w") as f:
+        json.dump({"settings": settings, "coefficients": coefficients}, f, indent=2)
+
+    # Swap the new directory in, then drop the old one
+    previous = f"{output.rstrip(os.sep)}.{os.getpid()}.old"
+    if os.path.isdir(output):
+        os.replace(output, previous)
+    os.replace(temporary, output)
+    shutil.rmtree(previous, ignore_errors=True)
+
+
+def load_demo(path=DEMO_PATH):
+    """Memory-mapped demo artifacts, or None when they have not been built.
+
+    Args:
+        path (str, optional): Directory of the artifacts. Defaults to `DEMO_PATH`.
+
+    Returns:
+        dict: "settings", "series", "tau", "adev" and "fits" {name: (line, coefficient)}, or None
+    """
+    try:
+        with open(os.path.join(path, "demo.json")) as f:
+            description = json.load(f)
+        demo = {"settings": description["settings"]}
+        for name in ("series", "tau", "adev"):
+            demo[name] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+        demo["fits"] = {name: (np.load(os.path.join(path, f"{FIT_FILES[name]}.npy"), mmap_mode="r"), coeff)
+                        for name, coeff in description["coefficients"].items()}
+    except (OSError, ValueError, KeyError):
+        return None
+    return demo
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="simulate the demo and save its artifacts")
+    build.add_argument("--output", default=DEMO_PATH, help="directory of the artifacts")
+    build.add_argument("--sim-time", type=float, default=DEMO_SETTINGS["sim_time"], help="length of the simulation in seconds")
+    build.add_argument("--fs", type=float, default=DEMO_SETTINGS["fs"], help="sampling rate in Hz")
+    build.add_argument("--seed", type=int, default=DEMO_SETTINGS["seed"], help="seed of the simulation")
+    args = parser.parse_args(argv)
+
+    settings = dict(DEMO_SETTINGS, sim_time=args.sim_time, fs=args.fs, seed=args.seed)
+    build_demo(args.output, settings)
+    print(f"wrote the demo to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,77 @@
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from noise_synthesis import simulate_noise_model
+from allan_variance import overlapping_allan_deviation
+
+
+def run_ensemble(sources, fs, sim_time, num_realizations, seed=0, workers=0, percentiles=(5, 50, 95), maxNumM=100):
+    """Monte Carlo ensemble of one noise model, reduced to Allan deviation statistics.
+
+    Every realization draws from its own random stream spawned from `seed`, so
+    the result is reproducible and does not depend on how the realizations are
+    divided between processes. Each worker process simulates its share of the
+    realizations and returns only their Allan deviations, never the series.
+
+    Args:
+        sources (list): (name, params) of every noise source in the model, see `noise_synthesis.NOISE_SOURCES`
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of each simulation in seconds
+        num_realizations (int): Number of independent realizations
+        seed (int, optional): Seed of the ensemble. Defaults to 0.
+        workers (int, optional): Number of worker processes, 0 for one per CPU and 1 to run in this process. Defaults to 0.
+        percentiles (tuple, optional): Percentiles of the Allan deviation to report for every averaging time. Defaults to (5, 50, 95).
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+
+    Returns:
+        dict: Statistics for every averaging time
+            "tau" (numpy.array): Averaging times
+            "mean" (numpy.array): Mean Allan deviation
+            "std" (numpy.array): Standard deviation of the Allan deviation
+            "percentiles" (dict): Allan deviation at each requested percentile
+            "num_realizations" (int): Number of realizations
+    """
+    if workers < 1:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, num_realizations))
+
+    # One independent stream per realization
+    streams = np.random.SeedSequence(seed).spawn(num_realizations)
+
+    # Contiguous batches, one task per worker
+    batches = [list(batch) for batch in np.array_split(np.arange(num_realizations), workers) if len(batch)]
+    tasks = [(sources, fs, sim_time, [streams[i] for i in batch], maxNumM) for batch in batches]
+
+    if workers == 1:
+        results = [_simulate_batch(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_batch, tasks))
+
+    tau = results[0][0]
+    adevs = np.concatenate([adev for _, adev in results], axis=0)
+
+    return {
+        "tau": tau,
+        "mean": np.mean(adevs, axis=0),
+        "std": np.std(adevs, axis=0),
+        "percentiles": {p: np.percentile(adevs, p, axis=0) for p in percentiles},
+        "num_realizations": num_realizations,
+    }
+
+
+def _simulate_batch(task):
+    """Allan deviations of a batch of realizations, run inside a worker process"""
+    sources, fs, sim_time, streams, maxNumM = task
+
+    # One buffer reused by every realization of the batch
+    combined = np.empty(int(sim_time*fs))
+
+    adevs = []
+    for stream in streams:
+        rng = np.random.default_rng(stream)
+        simulate_noise_model(sources, fs, sim_time, rng, out=combined)
+        tau, adev = overlapping_allan_deviation(combined, fs, maxNumM)
+        adevs.append(adev)
+
+    return (tau, np.array(adevs))
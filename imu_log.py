@@ -0,0 +1,63 @@
+import numpy as np
+from allan_variance import chunked_overlapping_allan_deviation
+
+
+def open_imu_log(path, dtype="int16", num_channels=1, channel=None, header_bytes=0):
+    """Memory-map a raw binary IMU log without reading it.
+
+    Samples are assumed to be stored frame by frame, i.e. interleaved across
+    channels as [ch0, ch1, ..., ch0, ch1, ...].
+
+    Args:
+        path (str): Path of the log file
+        dtype (str or numpy.dtype, optional): Type of one stored sample, e.g. "int16", "<i4" or "float32". Defaults to "int16".
+        num_channels (int, optional): Number of interleaved channels. Defaults to 1.
+        channel (int, optional): Channel to return. Defaults to None which returns every channel.
+        header_bytes (int, optional): Number of bytes to skip at the start of the file. Defaults to 0.
+
+    Returns:
+        numpy.memmap: Read-only view of shape (samples,) when `channel` is given or the log has a single channel, (samples, channels) otherwise
+    """
+    dtype = np.dtype(dtype)
+    frame_bytes = dtype.itemsize*num_channels
+
+    # Ignore a trailing partial frame
+    num_bytes = np.memmap(path, dtype=np.uint8, mode="r").shape[0] - header_bytes
+    num_frames = num_bytes//frame_bytes
+
+    samples = np.memmap(path, dtype=dtype, mode="r", offset=header_bytes, shape=(num_frames, num_channels))
+
+    if channel is not None:
+        return samples[:, channel]
+    if num_channels == 1:
+        return samples[:, 0]
+    return samples
+
+
+def log_allan_deviation(path, Fs, dtype="int16", num_channels=1, channel=0, scale=1.0, header_bytes=0, maxNumM=100, chunk_size=2**20, workers=1):
+    """Calculate the overlapping Allan deviation of one channel of a raw binary IMU log.
+
+    The file is memory-mapped and processed in bounded-size chunks (see
+    `chunked_overlapping_allan_deviation`), so logs much larger than memory
+    can be analyzed.
+
+    Args:
+        path (str): Path of the log file
+        Fs (int or float): Sampling frequency in Hertz (Hz).
+        dtype (str or numpy.dtype, optional): Type of one stored sample. Defaults to "int16".
+        num_channels (int, optional): Number of interleaved channels. Defaults to 1.
+        channel (int, optional): Channel to analyze. Defaults to 0.
+        scale (float, optional): Factor converting raw counts to physical units. Defaults to 1.0.
+        header_bytes (int, optional): Number of bytes to skip at the start of the file. Defaults to 0.
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        chunk_size (int, optional): Number of samples read at a time. Defaults to 2**20.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        (taus, oadev) (tuple): Tuple of values.
+            taus (numpy array): Array of discrete time clusters (x-values of Allan Deviation plot).
+            oadev (numpy array): Array of overlapping Allan deviation estimations (y-values of Allan Deviation plot).
+    """
+    samples = open_imu_log(path, dtype, num_channels, channel, header_bytes)
+
+    return chunked_overlapping_allan_deviation(samples, Fs, maxNumM, scale, chunk_size, workers)
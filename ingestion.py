@@ -0,0 +1,537 @@
+"""Live ingestion of binary IMU sample frames into a preallocated ring buffer.
+
+Every frame on the wire is a little-endian uint32 sequence number followed by
+one sample per channel:
+
+    | sequence (<u4) | channel 0 | channel 1 | ... |
+
+UDP datagrams carry one or more whole frames, while serial devices and named
+pipes are byte streams that may split frames anywhere. Bytes are read straight
+into a reusable buffer and decoded with `np.frombuffer` as a structured array,
+so no Python object is created per sample. Gaps in the sequence numbers count
+as dropped frames.
+
+The replay tool stands in for hardware by sending a log, or a simulated noise
+model, at its real sampling rate:
+
+    python ingestion.py replay --udp 127.0.0.1:9000 --fs 1000 --channels 3
+    python ingestion.py replay --path /tmp/imu.fifo --fs 1000 --log flight.bin --dtype int16 --channels 3
+    python ingestion.py listen --udp 127.0.0.1:9000 --fs 1000 --channels 3
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+
+import numpy as np
+
+from allan_variance import OnlineAllanDeviation, max_cluster_size
+
+
+def frame_dtype(sample_dtype="<f4", num_channels=1):
+    """Structured dtype of one frame: a uint32 sequence number and one sample per channel"""
+    return np.dtype([("sequence", "<u4"), ("samples", np.dtype(sample_dtype), (num_channels,))])
+
+
+class RingBuffer:
+    """Preallocated circular buffer of the latest samples of every channel.
+
+    Every sample is stored twice, `capacity` rows apart, so the latest `count`
+    samples are always one contiguous slice and `latest` returns a view
+    instead of copying. Writers never block: once full, the oldest samples
+    are overwritten.
+
+    Args:
+        capacity (int): Number of samples kept per channel
+        num_channels (int, optional): Number of channels. Defaults to 1.
+        dtype (str or numpy.dtype, optional): Type of the stored samples. Defaults to float64.
+    """
+
+    def __init__(self, capacity, num_channels=1, dtype=float):
+        self.capacity = int(capacity)
+        self.num_channels = num_channels
+        self._data = np.zeros((2*self.capacity, num_channels), dtype=dtype)
+        self._lock = threading.Lock()
+        self.written = 0
+
+    def write(self, samples):
+        """Append (n,) or (n x channels) samples, converting them to the buffer's type in place"""
+        samples = np.asarray(samples).reshape(-1, self.num_channels)
+        total = len(samples)
+        #only the last `capacity` samples can survive this write
+        samples = samples[-self.capacity:]
+        n = len(samples)
+        if n == 0:
+            return
+
+        with self._lock:
+            head = (self.written + total - n) % self.capacity
+            first = min(n, self.capacity - head)
+            for offset in (0, self.capacity):
+                self._data[offset+head:offset+head+first] = samples[:first]
+                self._data[offset:offset+n-first] = samples[first:]
+            self.written += total
+
+    def latest(self, count=None):
+        """View of the latest `count` samples, oldest first, (count x channels).
+
+        The view is only valid until the writer wraps around onto it; copy it
+        to keep it longer.
+        """
+        with self._lock:
+            available = min(self.written, self.capacity)
+            count = available if count is None else min(count, available)
+            end = self.written % self.capacity + self.capacity
+            return self._data[end-count:end]
+
+    def snapshot(self, count=None):
+        """Copy of the latest `count` samples, together with the value of `written` just after the last of them.
+
+        Unlike `latest` followed by reading `written`, both come from the same
+        instant, so sample times derived from the position match the samples.
+
+        Returns:
+            (samples, position) (tuple): The samples, oldest first, and the number of samples written up to the last of them
+        """
+        with self._lock:
+            available = min(self.written, self.capacity)
+            count = available if count is None else min(count, available)
+            end = self.written % self.capacity + self.capacity
+            return (self._data[end-count:end].copy(), self.written)
+
+    def read_since(self, position):
+        """Samples written after `position`, copied so a writer wrapping around cannot change them.
+
+        Args:
+            position (int): Value of `written` at the previous read
+
+        Returns:
+            (samples, position, lost) (tuple): The new samples, the position to pass next time and the number of samples overwritten before they could be read
+        """
+        with self._lock:
+            #count, slice and position all from the same `written`, a write in between would shift the window
+            written = self.written
+            count = min(written - position, self.capacity)
+            end = written % self.capacity + self.capacity
+            samples = self._data[end-count:end].copy()
+        return (samples, written, written - position - count)
+
+
+class FrameDecoder:
+    """Turns bytes into frames and keeps track of dropped and reordered frames.
+
+    Args:
+        sample_dtype (str or numpy.dtype, optional): Type of one sample on the wire. Defaults to "<f4".
+        num_channels (int, optional): Number of channels per frame. Defaults to 1.
+    """
+
+    def __init__(self, sample_dtype="<f4", num_channels=1):
+        self.dtype = frame_dtype(sample_dtype, num_channels)
+        self.frame_bytes = self.dtype.itemsize
+        self.frames = 0
+        self.dropped = 0
+        self.out_of_order = 0
+        self._next_sequence = None
+        self._span = 0
+
+    def decode(self, data):
+        """(frames, leftover bytes) of a buffer holding whole frames followed by at most one partial frame.
+
+        Args:
+            data (bytes like): Received bytes, e.g. a memoryview of the receive buffer
+
+        Returns:
+            (frames, leftover) (tuple): Structured array viewing `data`, and the number of trailing bytes of an incomplete frame
+        """
+        count = len(data)//self.frame_bytes
+        frames = np.frombuffer(data, dtype=self.dtype, count=count)
+        self._account(frames["sequence"])
+        return (frames, len(data) - count*self.frame_bytes)
+
+    def _account(self, sequence):
+        if len(sequence) == 0:
+            return
+        self.frames += len(sequence)
+        if self._next_sequence is None:
+            self._next_sequence = int(sequence[0])
+
+        #position of every frame relative to the next expected one, modulo 2**32
+        position = (sequence.astype(np.int64) - self._next_sequence) % 2**32
+        position[position >= 2**31] -= 2**32
+
+        #frames at or before the furthest position seen so far arrived late
+        furthest = np.maximum.accumulate(np.concatenate(([-1], position)))[:-1]
+        self.out_of_order += int(np.count_nonzero(position <= furthest))
+
+        #every sequence number up to the furthest one was sent, those never received were dropped
+        advance = max(int(position.max()) + 1, 0)
+        self._span += advance
+        self._next_sequence = (self._next_sequence + advance) % 2**32
+        self.dropped = max(self._span - self.frames, 0)
+
+
+# Sources, all reading into a caller's buffer with readinto
+
+class UDPSource:
+    """Datagrams received on a UDP port.
+
+    Args:
+        host (str): Address to bind, e.g. "0.0.0.0"
+        port (int): Port to bind
+        receive_buffer (int, optional): Kernel receive buffer size requested, absorbing bursts while the reader is busy. Defaults to 8 MiB.
+    """
+
+    def __init__(self, host, port, receive_buffer=8*2**20):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.2)
+
+    def readinto(self, buffer):
+        try:
+            return self.socket.recv_into(buffer)
+        except socket.timeout:
+            return 0
+
+    def close(self):
+        self.socket.close()
+
+
+class StreamSource:
+    """Byte stream from a named pipe, device file or regular file.
+
+    Args:
+        path (str): Path of the pipe or device
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb", buffering=0)
+
+    def readinto(self, buffer):
+        return self.file.readinto(buffer) or 0
+
+    def close(self):
+        self.file.close()
+
+
+class SerialSource(StreamSource):
+    """Byte stream from a serial port, using pyserial.
+
+    Args:
+        port (str): Serial device, e.g. "/dev/ttyUSB0"
+        baudrate (int, optional): Line rate. Defaults to 921600.
+    """
+
+    def __init__(self, port, baudrate=921600):
+        try:
+            import serial
+        except ImportError:
+            raise ImportError("SerialSource needs pyserial (pip install pyserial); a device already configured with stty can be read with StreamSource")
+        self.file = serial.Serial(port, baudrate, timeout=0.2)
+
+
+class Ingestor:
+    """Background thread moving frames from a source into a ring buffer.
+
+    Reads go straight into one preallocated byte buffer. Whole frames are
+    decoded in place and copied once, into the ring buffer; the bytes of a
+    trailing partial frame are moved to the front of the buffer to be
+    completed by the next read. The ring buffer overwrites its oldest samples
+    when readers fall behind, so the source is always drained and the kernel
+    never has to drop data because of a slow consumer.
+
+    Args:
+        source: Object with readinto(buffer) and close(), e.g. `UDPSource`
+        decoder (FrameDecoder): Frame layout of the source
+        ring (RingBuffer): Destination of the samples
+        scale (float, optional): Factor converting raw samples to physical units. Defaults to 1.0.
+        read_size (int, optional): Largest number of bytes read at once. Defaults to 64 kiB.
+    """
+
+    def __init__(self, source, decoder, ring, scale=1.0, read_size=2**16):
+        self.source = source
+        self.decoder = decoder
+        self.ring = ring
+        self.scale = scale
+        self._buffer = bytearray(max(read_size, 2*decoder.frame_bytes))
+        self._stop = threading.Event()
+        self._thread = None
+        self.bytes = 0
+        self.started = None
+        self.error = None
+        self._estimate = None
+        self._estimate_lock = threading.Lock()
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="ingestor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+        self.source.close()
+
+    def _run(self):
+        view = memoryview(self._buffer)
+        pending = 0
+        try:
+            while not self._stop.is_set():
+                n = self.source.readinto(view[pending:])
+                if n == 0:
+                    #UDP timeout or a stream with no writer yet
+                    if isinstance(self.source, StreamSource):
+                        time.sleep(0.01)
+                    continue
+                self.bytes += n
+
+                frames, leftover = self.decoder.decode(view[:pending+n])
+                samples = frames["samples"]
+                self.ring.write(samples*self.scale if self.scale != 1.0 else samples)
+
+                #keep the partial frame for the next read
+                if leftover:
+                    view[:leftover] = view[pending+n-leftover:pending+n]
+                pending = leftover
+        except Exception as exc:
+            self.error = exc
+
+    def stats(self):
+        """Frames received and dropped, and the received sample rate since the start"""
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            "frames": self.decoder.frames,
+            "dropped": self.decoder.dropped,
+            "out_of_order": self.decoder.out_of_order,
+            "bytes": self.bytes,
+            "rate": self.decoder.frames/elapsed if elapsed > 0 else 0.0,
+            "error": repr(self.error) if self.error else None,
+        }
+
+    def allan_deviation_estimate(self, fs):
+        """Running Allan deviation of the first channel, shared by every caller of this ingestor.
+
+        A different sampling rate starts a new estimate from the samples the
+        ring buffer holds at that moment.
+
+        Args:
+            fs (int or float): Sampling rate in Hz
+
+        Returns:
+            LiveAllanDeviation: The estimate, call its `update` to add new samples
+        """
+        with self._estimate_lock:
+            if self._estimate is None or self._estimate.fs != fs:
+                self._estimate = LiveAllanDeviation(self.ring, fs)
+            return self._estimate
+
+
+class LiveAllanDeviation:
+    """Overlapping Allan deviation of one channel of every sample a ring buffer receives.
+
+    Every update adds the samples written since the previous one (see
+    `RingBuffer.read_since`) to an `allan_variance.OnlineAllanDeviation`, so
+    the estimate covers the whole stream from the samples the ring buffer
+    holds when it is created, rather than the ring buffer's window. Samples
+    overwritten before an update reached them are left out and counted in
+    `lost`. Cluster sizes go up to those of a full ring buffer.
+
+    Args:
+        ring (RingBuffer): Buffer the samples are read from
+        fs (int or float): Sampling rate in Hz
+        channel (int, optional): Channel the deviation is computed for. Defaults to 0.
+    """
+
+    def __init__(self, ring, fs, channel=0):
+        self.ring = ring
+        self.fs = fs
+        self.channel = channel
+        self.estimator = OnlineAllanDeviation(fs, max_cluster_size(ring.capacity))
+        #start from the oldest sample still in the ring buffer
+        self.position = max(ring.written - ring.capacity, 0)
+        self.lost = 0
+        self._lock = threading.Lock()
+
+    def update(self):
+        """Add the samples written since the last update and return the current estimate.
+
+        Returns:
+            (taus, oadev) (tuple): See `allan_variance.OnlineAllanDeviation.allan_deviation`
+        """
+        with self._lock:
+            samples, self.position, lost = self.ring.read_since(self.position)
+            self.lost += lost
+            self.estimator.update(samples[:, self.channel])
+            return self.estimator.allan_deviation()
+
+
+def open_source(udp=None, path=None, serial=None, baudrate=921600):
+    """Source given by "host:port", a pipe or device path, or a serial port"""
+    if udp:
+        host, _, port = udp.rpartition(":")
+        return UDPSource(host or "0.0.0.0", int(port))
+    if serial:
+        return SerialSource(serial, baudrate)
+    if path:
+        return StreamSource(path)
+    raise ValueError("expected a UDP address, a path or a serial port")
+
+
+# Ingestors kept alive across reruns of the app, by source
+_SHARED_INGESTORS = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_ingestor(udp=None, path=None, sample_dtype="<f4", num_channels=1, capacity=2**20, scale=1.0):
+    """Running ingestor of a source, started on first use and reused afterwards.
+
+    Asking for the same source with a different layout stops the old
+    ingestor and starts a new one with an empty ring buffer.
+
+    Returns:
+        Ingestor: The ingestor, its ring buffer is `ingestor.ring`
+    """
+    source_key = (udp, path)
+    layout = (str(np.dtype(sample_dtype)), num_channels, capacity, scale)
+    with _SHARED_LOCK:
+        current = _SHARED_INGESTORS.get(source_key)
+        if current is not None and current[0] == layout and current[1].error is None:
+            return current[1]
+        if current is not None:
+            current[1].stop()
+
+        ingestor = Ingestor(open_source(udp, path), FrameDecoder(sample_dtype, num_channels), RingBuffer(capacity, num_channels), scale).start()
+        _SHARED_INGESTORS[source_key] = (layout, ingestor)
+        return ingestor
+
+
+# Replay tool
+
+def simulated_samples(fs, num_channels, block_size, seed=0):
+    """Endless blocks of ARW + Markov BI + RRW noise, (block_size x channels)"""
+    from noise_synthesis import iter_noise_source
+
+    # Practically endless, the iterators only ever hold one block
+    sim_time = 2**40/fs
+    sources = [("arw", {"coeff": 0.025}), ("markov_bi", {"coeff": 0.005, "corr_time": 10}), ("rrw", {"coeff": 0.001})]
+    streams = [[iter_noise_source(name, params, fs, sim_time, block_size, np.random.default_rng([seed, channel, i]))
+                for i, (name, params) in enumerate(sources)] for channel in range(num_channels)]
+    while True:
+        yield np.stack([sum(next(stream) for stream in channel) for channel in streams], axis=1)
+
+
+def log_samples(path, sample_dtype, num_channels, block_size, header_bytes=0, loop=True):
+    """Blocks of a raw log, (block_size x channels), optionally repeated forever"""
+    from imu_log import open_imu_log
+
+    samples = open_imu_log(path, sample_dtype, num_channels, header_bytes=header_bytes).reshape(-1, num_channels)
+    while True:
+        for start in range(0, len(samples), block_size):
+            yield samples[start:start+block_size]
+        if not loop:
+            return
+
+
+def replay(blocks, fs, num_channels, sample_dtype="<f4", udp=None, path=None, frames_per_packet=32, drop_probability=0.0, duration=None):
+    """Send sample blocks as frames at `fs` frames per second.
+
+    Args:
+        blocks (iterable): (n x channels) sample blocks, e.g. `simulated_samples` or `log_samples`
+        fs (float): Frames per second
+        num_channels (int): Number of channels per frame
+        sample_dtype (str or numpy.dtype, optional): Type of one sample on the wire. Defaults to "<f4".
+        udp (str, optional): "host:port" to send datagrams to
+        path (str, optional): Pipe or file to write to instead
+        frames_per_packet (int, optional): Frames per datagram or write. Defaults to 32.
+        drop_probability (float, optional): Fraction of packets skipped on purpose, to exercise loss accounting. Defaults to 0.
+        duration (float, optional): Seconds to send for. Defaults to None which sends every block.
+
+    Returns:
+        int: Number of frames generated, including dropped ones
+    """
+    dtype = frame_dtype(sample_dtype, num_channels)
+    rng = np.random.default_rng()
+    if udp:
+        host, _, port = udp.rpartition(":")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        send = lambda payload: sock.sendto(payload, (host, int(port)))
+    else:
+        sink = open(path, "wb", buffering=0)
+        send = sink.write
+
+    sequence = 0
+    start = time.monotonic()
+    try:
+        for block in blocks:
+            frames = np.empty(len(block), dtype=dtype)
+            frames["sequence"] = (sequence + np.arange(len(block))) % 2**32
+            frames["samples"] = block
+            for first in range(0, len(frames), frames_per_packet):
+                packet = frames[first:first+frames_per_packet]
+                #pace on the timestamp of the packet's last frame
+                due = start + (sequence + first + len(packet))/fs
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                if drop_probability == 0 or rng.random() >= drop_probability:
+                    send(packet.tobytes())
+            sequence += len(frames)
+            if duration is not None and time.monotonic() - start >= duration:
+                break
+    finally:
+        if not udp:
+            sink.close()
+
+    return sequence
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("replay", "listen"):
+        command = commands.add_parser(name)
+        command.add_argument("--udp", help="host:port of the stream")
+        command.add_argument("--path", help="named pipe or device of the stream")
+        command.add_argument("--fs", type=float, required=True, help="frames per second")
+        command.add_argument("--channels", type=int, default=1)
+        command.add_argument("--dtype", default="<f4", help="type of one sample on the wire")
+        command.add_argument("--duration", type=float, default=None, help="seconds to run for")
+    replay_parser = commands.choices["replay"]
+    replay_parser.add_argument("--log", help="raw log to replay instead of simulated noise")
+    replay_parser.add_argument("--header-bytes", type=int, default=0)
+    replay_parser.add_argument("--frames-per-packet", type=int, default=32)
+    replay_parser.add_argument("--drop", type=float, default=0.0, help="fraction of packets dropped on purpose")
+    listen_parser = commands.choices["listen"]
+    listen_parser.add_argument("--serial", help="serial port of the stream")
+    listen_parser.add_argument("--baudrate", type=int, default=921600)
+    args = parser.parse_args(argv)
+
+    if args.command == "replay":
+        block_size = max(int(args.fs), 1)
+        if args.log:
+            blocks = log_samples(args.log, args.dtype, args.channels, block_size, args.header_bytes)
+        else:
+            blocks = simulated_samples(args.fs, args.channels, block_size)
+        sent = replay(blocks, args.fs, args.channels, args.dtype, args.udp, args.path, args.frames_per_packet, args.drop, args.duration)
+        print(f"sent {sent} frames", file=sys.stderr)
+        return 0
+
+    ring = RingBuffer(int(args.fs*60), args.channels)
+    ingestor = Ingestor(open_source(args.udp, args.path, args.serial, args.baudrate), FrameDecoder(args.dtype, args.channels), ring).start()
+    start = time.monotonic()
+    try:
+        while args.duration is None or time.monotonic() - start < args.duration:
+            time.sleep(1.0)
+            print(ingestor.stats(), file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingestor.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
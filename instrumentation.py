@@ -0,0 +1,264 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+
+# Instrumentation is off unless `enable` is called, or the ALLAN_ONLINE_PROFILE
+# environment variable names a JSON lines file to write records to
+_enabled = False
+_trace_memory = False
+_sinks = []
+_sinks_lock = threading.Lock()
+
+# Whether `enable` was called, and the number of open `recording` blocks (of
+# which tracing memory), so concurrent sessions only turn recording off once
+# the last of them is done
+_persistent = False
+_persistent_memory = False
+_recordings = 0
+_memory_recordings = 0
+_started_tracing = False
+_state_lock = threading.Lock()
+
+# Stack of open stages of every thread, so records know their parent
+_local = threading.local()
+
+
+def enable(memory=False, sinks=()):
+    """Start recording stages.
+
+    Args:
+        memory (bool, optional): Also record the peak memory allocated in every stage with `tracemalloc`, which slows allocation-heavy code down. Defaults to False.
+        sinks (iterable, optional): Callables to add with `add_sink`. Defaults to ().
+    """
+    global _persistent, _persistent_memory
+    for sink in sinks:
+        add_sink(sink)
+    with _state_lock:
+        _persistent = True
+        _persistent_memory = memory
+        _update_state()
+
+
+def disable():
+    """Stop recording stages and memory tracing, unless a `recording` block is still open. Sinks stay registered."""
+    global _persistent, _persistent_memory
+    with _state_lock:
+        _persistent = False
+        _persistent_memory = False
+        _update_state()
+
+
+@contextmanager
+def recording(sink, memory=False):
+    """Record the stages of the enclosed block into `sink`.
+
+    Recording and memory tracing are turned back off when the last open block
+    exits, also when it exits with an exception, e.g. Streamlit stopping a
+    script to rerun it.
+
+    Args:
+        sink (callable): Sink added for the block, e.g. a `RecordCollector`; None records nothing
+        memory (bool, optional): Also record the peak memory of every stage, see `enable`. Defaults to False.
+    """
+    global _recordings, _memory_recordings
+    if sink is None:
+        yield
+        return
+
+    add_sink(sink)
+    with _state_lock:
+        _recordings += 1
+        _memory_recordings += bool(memory)
+        _update_state()
+    try:
+        yield
+    finally:
+        with _state_lock:
+            _recordings -= 1
+            _memory_recordings -= bool(memory)
+            _update_state()
+        remove_sink(sink)
+
+
+def _update_state():
+    """Recording and memory tracing flags of `enable` and the open `recording` blocks, called holding `_state_lock`"""
+    global _enabled, _trace_memory, _started_tracing
+    trace = _persistent_memory or _memory_recordings > 0
+    if trace and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    elif not trace and _started_tracing:
+        #only stop tracing started here, not someone else's
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _started_tracing = False
+    _trace_memory = trace
+    _enabled = _persistent or _recordings > 0
+
+
+def is_enabled():
+    """Whether stages are being recorded"""
+    return _enabled
+
+
+def add_sink(sink):
+    """Send every finished stage record to `sink`, a callable taking the record dict"""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    """Stop sending records to `sink`"""
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def stage(name, **fields):
+    """Context manager timing the enclosed block as one stage.
+
+    When instrumentation is disabled this returns a shared no-op context, so
+    leaving stages in library code costs one function call.
+
+    Args:
+        name (str): Name of the stage, e.g. "synthesis" or "oadev"
+        **fields: Extra JSON-serializable values stored in the record, e.g. num_samples=60000
+
+    Returns:
+        context manager: Emits one record to every sink when the block exits
+    """
+    if not _enabled:
+        return _DISABLED
+    return _stage(name, fields)
+
+
+class _DisabledStage:
+    """Reusable no-op context manager"""
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_DISABLED = _DisabledStage()
+
+
+@contextmanager
+def _stage(name, fields):
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    parent = stack[-1] if stack else None
+    frame = {"name": name, "peak": 0}
+    tracing = _trace_memory and tracemalloc.is_tracing()
+    if tracing:
+        current, peak = tracemalloc.get_traced_memory()
+        if parent is not None:
+            #the parent's peak so far, before this stage resets it
+            parent["peak"] = max(parent["peak"], peak)
+        frame["start_bytes"] = current
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        wall_time = time.perf_counter() - start
+        stack.pop()
+
+        record = {"stage": name, "parent": parent["name"] if parent else None, "depth": len(stack),
+                  "timestamp": time.time(), "wall_time": wall_time}
+        if tracing and tracemalloc.is_tracing():
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            record["peak_bytes"] = max(peak - frame["start_bytes"], 0)
+            if parent is not None:
+                parent["peak"] = max(parent["peak"], peak)
+        record.update(fields)
+
+        with _sinks_lock:
+            sinks = list(_sinks)
+        for sink in sinks:
+            sink(record)
+
+
+def timed(name=None):
+    """Decorator recording every call of the function as a stage.
+
+    Args:
+        name (str, optional): Name of the stage. Defaults to the qualified name of the function.
+    """
+    def decorate(function):
+        stage_name = name or f"{function.__module__}.{function.__qualname__}"
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _stage(stage_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+    return decorate
+
+
+class JsonLinesSink:
+    """Sink appending every record as one line of JSON, for offline aggregation.
+
+    Args:
+        path (str): File the records are appended to
+        **fields: Values added to every record, e.g. host or session identifiers
+    """
+
+    def __init__(self, path, **fields):
+        self.path = path
+        self.fields = fields
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps({**self.fields, **record}, default=str)
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+class RecordCollector:
+    """Sink keeping the records in memory, e.g. for one run of the app.
+
+    Records of other threads are ignored when `thread_only` is set, so
+    concurrent sessions sharing the process do not mix their stages.
+
+    Args:
+        thread_only (bool, optional): Only keep records of the thread that created the collector. Defaults to True.
+    """
+
+    def __init__(self, thread_only=True):
+        self.records = []
+        self._thread = threading.get_ident() if thread_only else None
+
+    def __call__(self, record):
+        if self._thread is None or threading.get_ident() == self._thread:
+            self.records.append(record)
+
+    def summary(self):
+        """Total wall time, largest peak and number of calls of every stage, in first-seen order"""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"stage": record["stage"], "calls": 0, "wall_time": 0.0, "peak_bytes": 0})
+            total["calls"] += 1
+            total["wall_time"] += record["wall_time"]
+            total["peak_bytes"] = max(total["peak_bytes"], record.get("peak_bytes", 0))
+        return list(totals.values())
+
+
+if os.environ.get("ALLAN_ONLINE_PROFILE"):
+    enable(memory=bool(os.environ.get("ALLAN_ONLINE_PROFILE_MEMORY")), sinks=[JsonLinesSink(os.environ["ALLAN_ONLINE_PROFILE"], pid=os.getpid())])
\ No newline at end of file
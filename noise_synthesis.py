@@ -2,14 +2,60 @@ import numpy as np
 import math
 
 
+def random_state(rng=None):
+    """Source of random numbers used by the noise generators.
+
+    Args:
+        rng (numpy.random.Generator or int, optional): Generator to use, or a seed for a new one. Defaults to None which uses the global `np.random` state.
+
+    Returns:
+        numpy.random.Generator or module: Object providing `standard_normal`
+    """
+    if rng is None:
+        return np.random
+    if isinstance(rng, np.random.Generator):
+        return rng
+    return np.random.default_rng(rng)
+
+
+def output_buffer(out, num_samples):
+    """Array the generators write their series into.
+
+    Args:
+        out (numpy.array or None): Caller-provided array of `num_samples` samples, or None for a new one
+        num_samples (int): Length of the series
+
+    Returns:
+        numpy.array: `out`, or a new uninitialized float64 array
+    """
+    if out is None:
+        return np.empty(num_samples)
+    if out.shape != (num_samples,):
+        raise ValueError(f"out has shape {out.shape}, expected ({num_samples},)")
+    return out
+
+
+def fill_standard_normal(state, out, block_size=2**16):
+    """Fill `out` with standard normal samples, drawn in the same order as `state.standard_normal(len(out))`"""
+    if isinstance(state, np.random.Generator) and out.dtype == np.float64 and out.flags.c_contiguous:
+        state.standard_normal(out=out)
+        return out
+    # The global state cannot write in place, bound its temporaries instead
+    for start, stop in _blocks(len(out), block_size):
+        out[start:stop] = state.standard_normal(stop-start)
+    return out
+
+
 # Simulate angle random walk from given parameters
-def make_angle_random_walk_series(coeff, fs, sim_time):
+def make_angle_random_walk_series(coeff, fs, sim_time, rng=None, out=None):
     """Generate an angle random walk noise series
 
     Args:
         coeff (float): Angle random walk coefficient found on a data sheet
         fs (int or float): Sampling rate in Hz
         sim_time (int or float): Length of the simulation in seconds
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+        out (numpy.array, optional): Array the series is written into. Defaults to None which allocates one.
 
     Returns:
         numpy.array: Array of samples making an angle random walk noise time series
@@ -18,13 +64,14 @@ def make_angle_random_walk_series(coeff, fs, sim_time):
 
     arw_psd = coeff**2
     sigma_arw = math.sqrt(arw_psd*fs)
-    arw_series = sigma_arw*np.random.randn(num_samples)
+    arw_series = fill_standard_normal(random_state(rng), output_buffer(out, num_samples))
+    arw_series *= sigma_arw
 
     return arw_series
 
 
 # Use a 1st Order Markov model to simulate flicker noise
-def make_bias_instability_series(coeff, corr_time, fs, sim_time):
+def make_bias_instability_series(coeff, corr_time, fs, sim_time, rng=None, out=None):
     """Alternative method for generating a flicker noise series.
     Generate flicker noise by calculating discrete time steps of a
     stochastic differential equation.
@@ -34,132 +81,257 @@ def make_bias_instability_series(coeff, corr_time, fs, sim_time):
         corr_time (int or float): Correlation time parameter
         fs (int or float): Sampling rate in Hz
         sim_time (int or float): Length of the simulation in seconds
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+        out (numpy.array, optional): Array the series is written into. Defaults to None which allocates one.
 
     Returns:
         numpy.array: Array of samples making a flicker noise time series
     """
     num_samples = int(sim_time*fs)
 
-    bi_series = np.zeros(shape=(num_samples,))
-
-    for i in range(1, num_samples):
-        eta = (1/corr_time)*coeff*np.random.randn(1)
-        bdot = (-1/corr_time)*bi_series[i-1] + eta
-        bi_series[i] = bi_series[i-1] + bdot
+    # Driving noise for every step after the first (the series starts at 0)
+    bi_series = output_buffer(out, num_samples)
+    if num_samples == 0:
+        return bi_series
+    bi_series[0] = 0.0
+    fill_standard_normal(random_state(rng), bi_series[1:])
+    bi_series[1:] *= (1/corr_time)*coeff
+
+    # b[i] = b[i-1] + bdot = (1 - 1/corr_time)*b[i-1] + eta[i]
+    # Solved in place one block at a time, so the scratch space is one block
+    previous = 0.0
+    for start, stop in _blocks(num_samples, 2**16):
+        bi_series[start:stop] = first_order_recursion(bi_series[start:stop], 1 - 1/corr_time, previous)
+        previous = bi_series[stop-1]
 
     return bi_series
 
 
+def first_order_recursion(x, phi, initial=0.0):
+    """Evaluate the recursion y[i] = phi*y[i-1] + x[i] without a per-sample loop.
+
+    The series is split into blocks short enough that `phi**-k` stays well inside
+    floating point range. Within every block the recursion is a scaled cumulative
+    sum. The state carried from one block to the next is itself a first order
+    recursion (with coefficient `phi**block`) over the block ends, which is solved
+    the same way.
+
+    Args:
+        x (numpy array): Input series
+        phi (float): Recursion coefficient
+        initial (float, optional): Value of y just before the first sample. Defaults to 0.0.
+
+    Returns:
+        numpy.array: Array holding y, the same length as `x`
+    """
+    x = np.asarray(x, dtype=float)
+    num_samples = len(x)
+
+    if num_samples == 0:
+        return np.zeros(0)
+    if phi == 0:
+        return x.copy()
+
+    # Longest block for which phi**-k is at most e**50
+    log_phi = abs(math.log(abs(phi)))
+    block = num_samples if log_phi == 0 else int(min(num_samples, max(1, 50/log_phi)))
+
+    if block == 1:
+        # Contracting so fast that vectorizing would not pay off
+        y = np.empty(num_samples)
+        previous = initial
+        for i in range(num_samples):
+            previous = phi*previous + x[i]
+            y[i] = previous
+        return y
+
+    # Pad to whole blocks, one block per row
+    num_blocks = -(-num_samples//block)
+    padded = np.zeros(num_blocks*block)
+    padded[:num_samples] = x
+    padded = padded.reshape(num_blocks, block)
+
+    # Response of each block to its own input, starting from zero
+    k = np.arange(block)
+    y = np.cumsum(padded*np.power(phi, -k), axis=1)
+    y *= np.power(phi, k)
+
+    # State at the end of each block including everything before it
+    ends = first_order_recursion(y[:, -1], phi**block, initial*phi**block)
+
+    # Add the decaying contribution of the preceding state to every block
+    carried = np.empty(num_blocks)
+    carried[0] = initial
+    carried[1:] = ends[:-1]
+    y += np.outer(carried, np.power(phi, k+1))
+
+    return y.reshape(-1,)[:num_samples]
+
+
 # Use a finite filter model to simulate flicker noise
-def simulate_flicker_noise(coeff, fs, sim_time, trunc_limit):
+def simulate_flicker_noise(coeff, fs, sim_time, trunc_limit, rng=None, out=None):
     """Generate flicker noise by shaping a white noise series.
     This is the preferred method for generating a flicker noise
     series.
 
+    The white noise is passed through the truncated IIR filter
+    1/(1 + a_1*z^-1 + ... + a_n*z^-n) whose coefficients come from the
+    expansion of (1 - z^-1)^(alpha/2). The filter is applied in the
+    frequency domain block by block (see `shape_white_noise`), in place on
+    the white noise.
 
     Args:
         coeff (float): Flicker noise coefficient found on a data sheet
         fs (int or float): Sampling rate in Hz
         sim_time (int or float): Length of the simulation in seconds
         trunc_limit (int): Number of IIR filter coefficients
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+        out (numpy.array, optional): Array the series is written into. Defaults to None which allocates one.
 
     Returns:
-        numpy.array: 1 by `numTerms+1` element array of samples making the flicker noise time series
+        numpy.array: Array of samples making the flicker noise time series
     """
 
     # Number of terms in the final flicker noise sequence
     num_terms = int(sim_time*fs)
 
     ### Step 0 - Calculating the white noise scale value B ###
-    # Supply flicker noise coefficient
-    # Calculate the PSD from coeff
-    # Supply sampling rate
-    # Calculate variance of flicker noise
     # Define the exponent of 1/f^a noise
         # Set a==1 for Flicker Noise by def'n
- 
     fn_psd = coeff**2
     sigma_fn = math.sqrt(fn_psd*fs)
     ALPHA = 1
 
-    
-    ### Step 1 - Initialize a white noise sequence ###
-    # Define size of white noise sequence
+    ### Step 1 - Initialize a scaled white noise sequence ###
+    scaled_white_noise = fill_standard_normal(random_state(rng), output_buffer(out, num_terms))
+    scaled_white_noise *= sigma_fn
+
+    ### Step 2 - Calculate IIR coeffs ###
+    iir_coeffs = flicker_filter_coefficients(trunc_limit, ALPHA)
+
+    ### Step 3 - Do white noise shaping ###
+    fn_series = shape_white_noise(scaled_white_noise, iir_coeffs, out=scaled_white_noise)
+
+    return fn_series
+
+
+def flicker_filter_coefficients(trunc_limit, alpha=1):
+    """Coefficients of the truncated IIR filter that shapes white noise into 1/f^alpha noise.
+
+    Args:
+        trunc_limit (int): Number of IIR filter coefficients
+        alpha (int or float, optional): Exponent of the 1/f^alpha power spectral density. Defaults to 1.
+
+    Returns:
+        numpy.array: The `trunc_limit`+1 filter coefficients, starting with a_0 = 1
+    """
+    # a_i = (i-1-alpha/2)*a_(i-1)/i
+    i = np.arange(1, trunc_limit+1)
+    a = np.ones(trunc_limit+1)
+    a[1:] = np.cumprod((i-1-alpha/2)/i)
+
+    return a
+
+
+def shape_white_noise(white_noise, iir_coeffs, history=None, block_size=None, out=None, impulse_response=None):
+    """Filter a series through 1/A(z) where A(z) holds the IIR coefficients.
+
+    The recursion y[n] = x[n] - a_1*y[n-1] - ... - a_n*y[n-n] is evaluated one
+    block at a time. Inside a block the output is the FFT convolution of the
+    filter's impulse response with the input, plus a forcing term that carries
+    the outputs preceding the block. The cost is O(N*log(block_size)) instead
+    of O(N*trunc_limit), and the memory is bounded by the block size.
+
+    Args:
+        white_noise (numpy.array): Input series
+        iir_coeffs (numpy.array): Filter coefficients, starting with a_0 = 1
+        history (numpy.array, optional): The last `len(iir_coeffs)-1` outputs preceding the series, oldest first. Defaults to zeros.
+        block_size (int, optional): Number of samples filtered per FFT. Defaults to a power of two of at least 2**16 and 4*`trunc_limit`.
+        out (numpy.array, optional): Array the filtered series is written into, may be `white_noise` itself. Defaults to None which allocates one.
+        impulse_response (numpy.array, optional): At least `block_size` leading terms of the filter's impulse response, for callers filtering many series with the same coefficients. Defaults to None which computes them.
+
+    Returns:
+        numpy.array: Array holding the filtered series, the same length as `white_noise`
+    """
+    white_noise = np.asarray(white_noise, dtype=float)
+    num_terms = len(white_noise)
+    trunc_limit = len(iir_coeffs) - 1
 
-    # White noise as a column vector
-    white_noise = np.random.randn(num_terms, 1)
+    if history is None:
+        history = np.zeros(trunc_limit)
+    if block_size is None:
+        block_size = _next_power_of_two(max(2**16, 4*trunc_limit))
+    block_size = max(1, min(block_size, num_terms))
 
+    # Impulse response of the filter, long enough to cover one block
+    if impulse_response is None:
+        impulse_response = _power_series_inverse(iir_coeffs, block_size)
+    impulse_response = impulse_response[:block_size]
+    conv_size = _next_power_of_two(2*block_size)
+    response_fft = np.fft.rfft(impulse_response, conv_size)
 
-    ### Step 2 - Initialize the arrays to return at the end ###
-    # Create containers for
-        # Shaped values
-        # flicker noise series
-        # (opt.) integral of flicker noise series
+    # Transform of the feedback coefficients for the forcing term
+    hist_size = _next_power_of_two(2*trunc_limit)
+    feedback_fft = np.fft.rfft(iir_coeffs[1:], hist_size)
 
-    # Null row vector - Container for the shaped white noise series
-    shape_values = np.zeros((1, num_terms+1))   
+    # Every block is copied out before it is overwritten, so filtering in place is safe
+    shaped = output_buffer(out, num_terms)
+    for start in range(0, num_terms, block_size):
+        stop = min(start+block_size, num_terms)
+        block = white_noise[start:stop].copy()
 
-    
-    ### Step 3 - Calculate IIR coeffs ###
-    # Calculate a growing list of IIR coefficients
-    #   There should be `trunc_limit`+1 total terms in the list 
-    #   The 0th element of the list is 1
+        # Outputs before the block feed into its first `trunc_limit` samples
+        if trunc_limit > 0:
+            past = history if start == 0 else _last_values(shaped[:start], history, trunc_limit)
+            forcing = np.fft.irfft(feedback_fft*np.fft.rfft(past, hist_size), hist_size)
+            num_forced = min(trunc_limit, stop-start)
+            block[:num_forced] -= forcing[trunc_limit-1:trunc_limit-1+num_forced]
 
-    a = [1]
-    for i in range(1, trunc_limit+1):
-        ith_iir_coeff = (i-1-ALPHA/2)*(a[i-1])/i
-        a.append(ith_iir_coeff)
-    assert (len(a)==trunc_limit+1), f"Wrong number of IIR Coefficients. Have {len(a)} Require {trunc_limit+1}"
+        block_fft = np.fft.rfft(block, conv_size)
+        shaped[start:stop] = np.fft.irfft(response_fft*block_fft, conv_size)[:stop-start]
 
-    iir_coeffs = np.asarray(a).reshape((1, -1))
-    # Require a row vector of IIR coefficients
-    assert (iir_coeffs.shape[0]==1 and iir_coeffs.shape[1]!=0), f"Require a row vector. Got shape {iir_coeffs.shape}"
+    return shaped
 
 
-    ### Step 4 - DO white noise shaping ###
-    # Set up accumulator pattern:
-    # scale white noise by B from Step 0
-    # loop 
-    #   calculate single element for `shape_values` from coefficents and scaled white noise
-    #       The matrix multiplication needs to be [1xN]*[Nx1]
-    
-    scaled_white_noise = sigma_fn*white_noise
-    for count in range(trunc_limit+1, num_terms):
+def _last_values(series, history, count):
+    """Last `count` values of `history` followed by `series`"""
+    if len(series) >= count:
+        return series[-count:]
+    return np.concatenate((history, series))[-count:]
 
-        iir_slice = -1*iir_coeffs[0][1:].reshape(1,-1)
-        # Condition that iir_slice is also a row vector
-        assert iir_slice.shape[0]==1 and iir_slice.shape[1]!=0, f"Require a row vector. Got shape {iir_slice.shape}"
 
-        white_noise_sample = scaled_white_noise[count]
+def _next_power_of_two(n):
+    """Smallest power of two that is no less than `n`"""
+    return 1 << max(int(n)-1, 0).bit_length()
 
-        shape_values_slice = shape_values[0][count-trunc_limit:count].reshape(1, -1)
-        values_col_vec = np.transpose(np.fliplr(shape_values_slice))
-        # Condition for a column vector
-        assert values_col_vec.shape[1]==1 and values_col_vec.shape[0]!=0, f"Require column vector. Got shape {values_col_vec.shape}"
-        # Condition for matrix multiplication
-        assert iir_slice.shape[1]==values_col_vec.shape[0], f"Incompatible inner dimensions A*B = {iir_slice.shape}*{values_col_vec.shape}"
-        
-        single_value = np.matmul(iir_slice, values_col_vec) + white_noise_sample
-        assert single_value!=0, f"Require non-zero value. Got {single_value}"
 
-        shape_values[0][count+1] = single_value
+def _power_series_inverse(coeffs, num_terms):
+    """First `num_terms` coefficients of 1/A(z) where A(z) = coeffs[0] + coeffs[1]*z + ...
 
-    # Resulting array should be non-null
-    assert np.any(shape_values), f"Array has no non-zero values"
-    
+    Uses Newton's iteration h <- h - h*(A*h - 1), doubling the number of
+    correct coefficients per step with FFT products.
+    """
+    coeffs = np.asarray(coeffs, dtype=float)
+    inverse = np.array([1/coeffs[0]])
 
-    ### Step 5 - Return values ###
-    # Do a circular shift of the `shape_values` array
+    while len(inverse) < num_terms:
+        n = min(2*len(inverse), num_terms)
+        size = _next_power_of_two(2*n)
 
-    # The number of unshaped values depends on the size of `trunc_limit`
-    fn_series = np.roll(shape_values, [0, -trunc_limit])
+        inverse_fft = np.fft.rfft(inverse, size)
+        error = np.fft.irfft(np.fft.rfft(coeffs[:n], size)*inverse_fft, size)[:n]
+        error[0] -= 1
+        correction = np.fft.irfft(inverse_fft*np.fft.rfft(error, size), size)[:n]
 
+        updated = -correction
+        updated[:len(inverse)] += inverse
+        inverse = updated
 
-    return fn_series[0][0:-1]
+    return inverse[:num_terms]
 
 
 # Simulate rate random walk noise from given parameters
-def make_rate_random_walk_series(coeff, fs, sim_time):
+def make_rate_random_walk_series(coeff, fs, sim_time, rng=None, out=None):
     """Generate rate random walk noise series by scaling
     a white noise time series.
 
@@ -167,6 +339,8 @@ def make_rate_random_walk_series(coeff, fs, sim_time):
         coeff (float): Rate random walk coefficient
         fs (int or float): Sampling rate in Hz
         sim_time (int or float): Length of simulation in seconds
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+        out (numpy.array, optional): Array the series is written into. Defaults to None which allocates one.
 
     Returns:
         numpy.array: Array of values comprising a rate random walk noise time series
@@ -175,58 +349,432 @@ def make_rate_random_walk_series(coeff, fs, sim_time):
 
     rrw_psd = coeff**2
     sigma_rrw = math.sqrt(rrw_psd*fs)
-    white_noise_series = sigma_rrw*np.random.randn(num_samples)
-    rrw_series = (1/fs)*np.cumsum(white_noise_series)
+    rrw_series = fill_standard_normal(random_state(rng), output_buffer(out, num_samples))
+    rrw_series *= sigma_rrw
+    np.cumsum(rrw_series, out=rrw_series)
+    rrw_series *= (1/fs)
 
-    return rrw_series 
+    return rrw_series
 
 
 # Simulate quantization noise from given parameters
-def simulate_quantization_noise(K, fs, sim_time, noise_amp=3.0, noise_freq=1.0):
+def simulate_quantization_noise(K, fs, sim_time, noise_amp=3.0, noise_freq=1.0, rng=None, out=None):
     """Generate a quantization noise time series by adding white noise to a
     pure tone sinewave.
 
+    The sinewave, its quantization error and the derivative of the error are
+    only ever formed one block at a time (see `iter_quantization_noise`), so
+    apart from the output no full-length array is allocated.
+
     Args:
         K (float):  Quantization Noise coefficient
         fs (int or float): Sampling rate in Hz
         sim_time (int or float): Length of the simulation in seconds
         noise_amp (float, optional): Amplitude of the pure tone sinewave. Also used to scale white noise series. Defaults to 3.0.
         noise_freq (float, optional): Frequency of the pure tone sinewave. Defaults to 1.0.
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+        out (numpy.array, optional): Array the series is written into. Defaults to None which allocates one.
 
     Returns:
         numpy.array: Array of values comprising a quantization noise time series
     """
     num_terms = int(sim_time*fs)
-    t = np.linspace(0, sim_time, num_terms+1)
+    qn = output_buffer(out, num_terms)
 
-    signal = noise_amp*np.sin((2*np.pi*noise_freq)*t)
-    signal = signal + 0.1*noise_amp*np.random.randn(1, num_terms+1)
+    return _fill_blocks(qn, iter_quantization_noise(K, fs, sim_time, noise_amp, noise_freq, rng=rng))
 
-    E = np.mean(fs*abs(np.diff(signal)))
-    
-    q = (K*E)/fs
 
-    xq = q*np.rint(np.divide(signal, q))
-    qe = signal - xq
+# Simulate rate random walk series from given parameters
+def simulate_rate_ramp(coeff, fs, sim_time, rng=None, out=None):
+    """Generate a rate ramp time series
 
-    qe_dot = np.divide(np.diff(qe), np.diff(t))
+    Args:
+        coeff (float): Rate ramp coefficient
+        sim_time (int or float): Length of the simulation in seconds
+        fs (int or float): Sampling rate in Hz
+        rng (numpy.random.Generator or int, optional): Unused, the rate ramp is deterministic. Accepted so every generator has the same interface.
+        out (numpy.array, optional): Array the series is written into. Defaults to None which allocates one.
 
-    qn = qe_dot.flatten()
+    Returns:
+        numpy.array: Array of values comprising a rate ramp time series
+    """
+    num_terms = int(sim_time*fs)
+    rr_series = output_buffer(out, num_terms)
 
-    return qn
+    return _fill_blocks(rr_series, iter_rate_ramp(coeff, fs, sim_time))
 
 
-# Simulate rate random walk series from given parameters
-def simulate_rate_ramp(coeff, fs, sim_time):
-    """Generate a rate ramp time series
+# Streaming versions of the generators
+#   Each yields the series in blocks of `block_size` samples and carries the
+#   generator state (random stream, running sums, filter history) between
+#   blocks, so memory use is bounded by the block size. With the same random
+#   generator, the concatenated blocks equal the one-shot series up to rounding.
+
+def iter_angle_random_walk_series(coeff, fs, sim_time, block_size=2**16, rng=None):
+    """Generate an angle random walk noise series block by block
+
+    Args:
+        coeff (float): Angle random walk coefficient found on a data sheet
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        block_size (int, optional): Number of samples per block. Defaults to 2**16.
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+
+    Yields:
+        numpy.array: Consecutive blocks of `make_angle_random_walk_series`
+    """
+    state = random_state(rng)
+    sigma_arw = math.sqrt(coeff**2*fs)
+
+    for start, stop in _blocks(int(sim_time*fs), block_size):
+        yield sigma_arw*state.standard_normal(stop-start)
+
+
+def iter_bias_instability_series(coeff, corr_time, fs, sim_time, block_size=2**16, rng=None):
+    """Generate a first order Markov bias instability series block by block
+
+    Args:
+        coeff (float): Flicker noise coefficient
+        corr_time (int or float): Correlation time parameter
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        block_size (int, optional): Number of samples per block. Defaults to 2**16.
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+
+    Yields:
+        numpy.array: Consecutive blocks of `make_bias_instability_series`
+    """
+    state = random_state(rng)
+
+    # Markov state carried between blocks
+    previous = 0.0
+
+    for start, stop in _blocks(int(sim_time*fs), block_size):
+        # The series starts at 0 without driving noise
+        first = 1 if start == 0 else 0
+        eta = np.zeros(stop-start)
+        eta[first:] = (1/corr_time)*coeff*state.standard_normal(stop-start-first)
+
+        block = first_order_recursion(eta, 1 - 1/corr_time, previous)
+        previous = block[-1]
+        yield block
+
+
+def iter_flicker_noise(coeff, fs, sim_time, trunc_limit, block_size=2**16, rng=None):
+    """Generate filter model flicker noise block by block
+
+    Args:
+        coeff (float): Flicker noise coefficient found on a data sheet
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        trunc_limit (int): Number of IIR filter coefficients
+        block_size (int, optional): Number of samples per block. Defaults to 2**16.
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+
+    Yields:
+        numpy.array: Consecutive blocks of `simulate_flicker_noise`
+    """
+    state = random_state(rng)
+    sigma_fn = math.sqrt(coeff**2*fs)
+    iir_coeffs = flicker_filter_coefficients(trunc_limit, 1)
+    num_samples = int(sim_time*fs)
+
+    # Impulse response shared by every block, computing it costs more than filtering one
+    impulse_response = _power_series_inverse(iir_coeffs, max(1, min(block_size, num_samples)))
+
+    # IIR filter history carried between blocks
+    history = np.zeros(trunc_limit)
+
+    for start, stop in _blocks(num_samples, block_size):
+        scaled_white_noise = sigma_fn*state.standard_normal(stop-start)
+        block = shape_white_noise(scaled_white_noise, iir_coeffs, history, block_size=stop-start, impulse_response=impulse_response)
+        history = _last_values(block, history, trunc_limit)
+        yield block
+
+
+def iter_rate_random_walk_series(coeff, fs, sim_time, block_size=2**16, rng=None):
+    """Generate a rate random walk noise series block by block
+
+    Args:
+        coeff (float): Rate random walk coefficient
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of simulation in seconds
+        block_size (int, optional): Number of samples per block. Defaults to 2**16.
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+
+    Yields:
+        numpy.array: Consecutive blocks of `make_rate_random_walk_series`
+    """
+    state = random_state(rng)
+    sigma_rrw = math.sqrt(coeff**2*fs)
+
+    # Cumulative sum carried between blocks
+    total = 0.0
+
+    for start, stop in _blocks(int(sim_time*fs), block_size):
+        running = np.cumsum(sigma_rrw*state.standard_normal(stop-start))
+        running += total
+        total = running[-1]
+        yield (1/fs)*running
+
+
+def iter_quantization_noise(K, fs, sim_time, noise_amp=3.0, noise_freq=1.0, block_size=2**16, rng=None):
+    """Generate a quantization noise series block by block
+
+    The quantization step depends on the mean slope of the whole signal, so
+    the random stream is played twice: once on a copy of the generator to
+    find the mean slope, then again to quantize.
+
+    Args:
+        K (float):  Quantization Noise coefficient
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        noise_amp (float, optional): Amplitude of the pure tone sinewave. Also used to scale white noise series. Defaults to 3.0.
+        noise_freq (float, optional): Frequency of the pure tone sinewave. Defaults to 1.0.
+        block_size (int, optional): Number of samples per block. Defaults to 2**16.
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+
+    Yields:
+        numpy.array: Consecutive blocks of `simulate_quantization_noise`
+    """
+    num_terms = int(sim_time*fs)
+    if num_terms == 0:
+        return
+    state = random_state(rng)
+
+    def signal_blocks(source):
+        # Time stamps and signal of the points behind each output block, starting with point 0
+        yield _quantization_signal(0, 1, num_terms, sim_time, noise_amp, noise_freq, source)
+        for start, stop in _blocks(num_terms, block_size):
+            yield _quantization_signal(start+1, stop+1, num_terms, sim_time, noise_amp, noise_freq, source)
+
+    # First pass, mean absolute slope of the signal
+    blocks = signal_blocks(_clone_random_state(state))
+    previous = next(blocks)[1][-1]
+    total_change = 0.0
+    for _, signal in blocks:
+        total_change += np.sum(np.abs(np.diff(signal, prepend=previous)))
+        previous = signal[-1]
+    E = fs*total_change/num_terms
+
+    q = (K*E)/fs
+
+    # Second pass, derivative of the quantization error
+    blocks = signal_blocks(state)
+    previous_t, previous_signal = next(blocks)
+    previous_qe = previous_signal - q*np.rint(np.divide(previous_signal, q))
+    for t, signal in blocks:
+        qe = signal - q*np.rint(np.divide(signal, q))
+        yield np.divide(np.diff(qe, prepend=previous_qe[-1]), np.diff(t, prepend=previous_t[-1]))
+        previous_t, previous_qe = t, qe
+
+
+def iter_rate_ramp(coeff, fs, sim_time, block_size=2**16, rng=None):
+    """Generate a rate ramp series block by block
 
     Args:
         coeff (float): Rate ramp coefficient
+        fs (int or float): Sampling rate in Hz
         sim_time (int or float): Length of the simulation in seconds
+        block_size (int, optional): Number of samples per block. Defaults to 2**16.
+        rng (numpy.random.Generator or int, optional): Unused, the rate ramp is deterministic. Accepted so every generator has the same interface.
+
+    Yields:
+        numpy.array: Consecutive blocks of `simulate_rate_ramp`
+    """
+    num_terms = int(sim_time*fs)
+    for start, stop in _blocks(num_terms, block_size):
+        yield coeff*_linspace_slice(0, sim_time, num_terms, start, stop)
+
+
+def _blocks(num_samples, block_size):
+    """(start, stop) of consecutive blocks covering `num_samples` samples"""
+    for start in range(0, num_samples, block_size):
+        yield (start, min(start+block_size, num_samples))
+
+
+def _fill_blocks(out, blocks, accumulate=False):
+    """Write (or add) consecutive blocks into `out`"""
+    start = 0
+    for block in blocks:
+        if accumulate:
+            out[start:start+len(block)] += block
+        else:
+            out[start:start+len(block)] = block
+        start += len(block)
+    return out
+
+
+def _linspace_slice(start, stop, num, first, last):
+    """Elements first..last-1 of np.linspace(start, stop, num), computed the same way"""
+    div = num - 1
+    step = (stop - start)/div if div > 0 else 0
+    values = np.arange(first, last)*step + start
+    if last == num and num > 1:
+        values[-1] = stop
+    return values
+
+
+def _quantization_signal(first, last, num_terms, sim_time, noise_amp, noise_freq, source):
+    """Time stamps and noisy sinewave at points first..last-1 of the quantization noise model"""
+    t = _linspace_slice(0, sim_time, num_terms+1, first, last)
+    signal = noise_amp*np.sin((2*np.pi*noise_freq)*t)
+    signal = signal + 0.1*noise_amp*source.standard_normal(last-first)
+    return (t, signal)
+
+
+def _clone_random_state(state):
+    """Independent copy of a random state that will produce the same numbers"""
+    if isinstance(state, np.random.Generator):
+        bit_generator = type(state.bit_generator)()
+        bit_generator.state = state.bit_generator.state
+        return np.random.Generator(bit_generator)
+    clone = np.random.RandomState()
+    clone.set_state(state.get_state())
+    return clone
+
+
+# Generators by name, so noise models can be described with plain data
+NOISE_SOURCES = {
+    "arw": make_angle_random_walk_series,
+    "markov_bi": make_bias_instability_series,
+    "filter_bi": simulate_flicker_noise,
+    "rrw": make_rate_random_walk_series,
+    "qn": simulate_quantization_noise,
+    "rr": simulate_rate_ramp,
+}
+
+
+# Streaming generators by name, with the same parameters as `NOISE_SOURCES`
+NOISE_SOURCE_ITERATORS = {
+    "arw": iter_angle_random_walk_series,
+    "markov_bi": iter_bias_instability_series,
+    "filter_bi": iter_flicker_noise,
+    "rrw": iter_rate_random_walk_series,
+    "qn": iter_quantization_noise,
+    "rr": iter_rate_ramp,
+}
+
+
+# Generators whose samples are proportional to one parameter, with the factor
+# a value of that parameter scales a unit realization by. Sources built from
+# sqrt(coeff**2) do not depend on the coefficient's sign.
+LINEAR_COEFFICIENTS = {
+    "arw": ("coeff", abs),
+    "markov_bi": ("coeff", float),
+    "filter_bi": ("coeff", abs),
+    "rrw": ("coeff", abs),
+    "rr": ("coeff", float),
+}
+
+
+def split_coefficient(name, params):
+    """Split the parameters of a noise source into those of a unit realization and a scale factor.
+
+    The series of `name` with `params` equals `scale` times the series with
+    `unit_params` from the same random stream, up to rounding. Sources that are
+    not linear in a coefficient (quantization noise) keep their parameters
+    with a scale of 1.
+
+    Args:
+        name (str): Key of the generator in `NOISE_SOURCES`
+        params (dict): Keyword arguments of the generator
+
+    Returns:
+        (unit_params, scale) (tuple): Parameters of the unit realization and the factor to scale it by
+    """
+    if name not in LINEAR_COEFFICIENTS:
+        return (params, 1.0)
+    parameter, scale = LINEAR_COEFFICIENTS[name]
+    unit_params = dict(params)
+    unit_params[parameter] = 1.0
+    return (unit_params, scale(params[parameter]))
+
+
+def simulate_noise_source(name, params, fs, sim_time, rng=None, dtype="float64", out=None, accumulate=False):
+    """Generate the series of one noise source given by name.
+
+    With a `dtype` other than float64 the series is filled block by block from
+    `iter_noise_source` into an array of that type, so no full-length float64
+    copy is ever held. The generator state still runs in float64.
+
+    With `accumulate`, the series is added to `out` block by block instead of
+    overwriting it, which is how several sources are summed into one buffer.
+
+    Args:
+        name (str): Key of the generator in `NOISE_SOURCES`
+        params (dict): Keyword arguments of the generator other than `fs`, `sim_time` and `rng`, e.g. {"coeff": 0.025}
         fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+        dtype (str or numpy.dtype, optional): Type of the returned samples, e.g. "float32". Ignored when `out` is given. Defaults to "float64".
+        out (numpy.array, optional): Array the series is written into. Defaults to None which allocates one.
+        accumulate (bool, optional): Add the series to `out` rather than overwrite it. Defaults to False.
 
     Returns:
-        numpy.array: Array of values comprising a rate ramp time series
+        numpy.array: Array of samples of the noise source, `out` if given
     """
-    num_terms = int(sim_time*fs)
-    return coeff*np.linspace(0, sim_time, num_terms)
\ No newline at end of file
+    num_samples = int(sim_time*fs)
+
+    if accumulate:
+        if out is None:
+            raise ValueError("accumulate needs an out array to add to")
+        return _fill_blocks(output_buffer(out, num_samples), iter_noise_source(name, params, fs, sim_time, rng=rng), accumulate=True)
+
+    if out is None and np.dtype(dtype) != np.float64:
+        out = np.empty(num_samples, dtype=dtype)
+    if out is not None and out.dtype != np.float64:
+        return _fill_blocks(output_buffer(out, num_samples), iter_noise_source(name, params, fs, sim_time, rng=rng))
+
+    return NOISE_SOURCES[name](fs=fs, sim_time=sim_time, rng=rng, out=out, **params)
+
+
+def simulate_noise_model(sources, fs, sim_time, rng=None, out=None):
+    """Sum of several noise sources, accumulated into one array.
+
+    Every source is generated block by block and added to the output in
+    place, so the memory used is the output plus a few blocks of scratch
+    space, however many sources there are.
+
+    Args:
+        sources (list): (name, params) of every noise source, see `simulate_noise_source`
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        rng (numpy.random.Generator, int or list, optional): Random number generator shared by the sources in order, or a list with one per source. Defaults to None which uses the global `np.random` state.
+        out (numpy.array, optional): Array the sum is written into, any dtype. Defaults to None which allocates a float64 one.
+
+    Returns:
+        numpy.array: Array holding the combined noise, `out` if given
+    """
+    combined = output_buffer(out, int(sim_time*fs))
+    combined[...] = 0
+
+    if isinstance(rng, (list, tuple)):
+        rngs = rng
+    else:
+        state = random_state(rng)
+        rngs = [state]*len(sources)
+
+    for (name, params), source_rng in zip(sources, rngs):
+        simulate_noise_source(name, params, fs, sim_time, source_rng, out=combined, accumulate=True)
+
+    return combined
+
+
+def iter_noise_source(name, params, fs, sim_time, block_size=2**16, rng=None):
+    """Generate the series of one noise source given by name, block by block.
+
+    The blocks can be fed straight to `allan_variance.OnlineAllanDeviation.update`.
+
+    Args:
+        name (str): Key of the generator in `NOISE_SOURCE_ITERATORS`
+        params (dict): Keyword arguments of the generator other than `fs`, `sim_time`, `block_size` and `rng`
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        block_size (int, optional): Number of samples per block. Defaults to 2**16.
+        rng (numpy.random.Generator or int, optional): Random number generator, or a seed for one. Defaults to None which uses the global `np.random` state.
+
+    Yields:
+        numpy.array: Consecutive blocks of the noise source
+    """
+    return NOISE_SOURCE_ITERATORS[name](fs=fs, sim_time=sim_time, block_size=block_size, rng=rng, **params)
@@ -1,51 +1,217 @@
-from coefficient_fitting import fit_rate_random_walk_line, fit_random_walk_line, fit_bias_instability_line, find_index_of_closest_slope
 from plotly import graph_objects as go
-import plotly.express as px
 import numpy as np
+from instrumentation import stage, timed
+
+# Figures are built from graph objects rather than plotly express, which
+# imports pandas and costs about a second on a cold start. The fitting code
+# is imported on first use.
 
 def get_x_axis(sim_time, fs):
     return np.linspace(0, int(sim_time), int(sim_time*fs))
 
-def plot_time_series(time, y):
+def decimate_min_max(x, y, max_points=4000):
+    """Reduce a series to at most `max_points` points for plotting.
+
+    The samples are split into about `max_points/2` buckets of consecutive
+    samples and only the smallest and largest value of each bucket are kept,
+    in their original order, together with the first and last sample. Spikes,
+    the envelope of the noise and the extent of the x-axis therefore look the
+    same as in the full series.
+
+    Args:
+        x (numpy.array): Sorted x-values
+        y (numpy.array): y-values
+        max_points (int, optional): Largest number of points to return. Defaults to 4000.
+
+    Returns:
+        (x, y) (tuple): The decimated x- and y-values
+    """
+    num_points = len(y)
+    # Two points per bucket, plus the two endpoints
+    num_buckets = max((max_points-2)//2, 1)
+    if num_points <= max_points:
+        return (x, y)
+
+    # Equal-sized buckets, the last one padded with its own final value
+    bucket_size = -(-num_points//num_buckets)
+    num_buckets = -(-num_points//bucket_size)
+    padded = np.empty(num_buckets*bucket_size)
+    padded[:num_points] = y
+    padded[num_points:] = y[-1]
+    buckets = padded.reshape(num_buckets, bucket_size)
+
+    # Index of the extremes of every bucket, kept in time order
+    offsets = np.arange(num_buckets)*bucket_size
+    lows = offsets + np.argmin(buckets, axis=1)
+    highs = offsets + np.argmax(buckets, axis=1)
+    keep = np.unique(np.minimum(np.concatenate(([0, num_points-1], lows, highs)), num_points-1))
+
+    return (x[keep], y[keep])
+
+
+def line_figure(x, y, x_label, y_label, log=False):
+    """Single line figure, laid out like `plotly.express.line` with the y-values as hover names.
+
+    Args:
+        x (numpy.array): x-values
+        y (numpy.array): y-values
+        x_label (str): Title of the x-axis
+        y_label (str): Title of the y-axis
+        log (bool, optional): Use log scales on both axes. Defaults to False.
+
+    Returns:
+        plotly.graph_objects.Figure: The figure
+    """
+    fig = go.Figure(go.Scatter(x=x, y=y, mode="lines", hovertext=y, showlegend=False,
+                               hovertemplate=f"<b>%{{hovertext}}</b><br><br>{x_label}=%{{x}}<br>{y_label}=%{{y}}<extra></extra>"))
+
+    fig.update_xaxes(title=x_label, type="log" if log else None)
+    fig.update_yaxes(title=y_label, type="log" if log else None)
+    fig.update_layout(margin=dict(t=60))
+
+    return fig
+
+
+@timed("figure.time_series")
+def plot_time_series(time, y, max_points=4000, x_range=None):
+    """Line plot of a time series, decimated to a fixed number of points.
+
+    Only the decimated points are sent to the browser. Passing the zoomed
+    `x_range` re-decimates just that part of the series, so zooming in shows
+    more detail at the same cost.
+
+    Args:
+        time (numpy.array): Sorted time stamps
+        y (numpy.array): Samples
+        max_points (int, optional): Largest number of points to plot. Defaults to 4000.
+        x_range (tuple, optional): (start, stop) time window to plot. Defaults to None which plots everything.
+
+    Returns:
+        plotly.graph_objects.Figure: The time series figure
+    """
+
+    if x_range is not None:
+        first, last = np.searchsorted(time, x_range[0], side="left"), np.searchsorted(time, x_range[1], side="right")
+        time, y = time[first:last], y[first:last]
+
+    time, y = decimate_min_max(time, y, max_points)
 
     time_series_labels = {"Time":"Time (sec)",
                         "Noise Amplitude": "Noise Amplitude (units)"}
 
-    fig = px.line(data_frame={"Time":time, "Noise Amplitude":y},
-                    x="Time",
-                    y="Noise Amplitude",
-                    hover_name="Noise Amplitude",
-                    labels=time_series_labels)
+    fig = line_figure(time, y, time_series_labels["Time"], time_series_labels["Noise Amplitude"])
 
     return fig
 
-def plot_allan_deviation(avg_time, allan_dev, noise_model, verbose):
+def log_spaced_indices(num_points, max_points=500):
+    """Indices of at most `max_points` points spread evenly on a log axis.
+
+    Args:
+        num_points (int): Number of points in the full series
+        max_points (int, optional): Largest number of indices to return. Defaults to 500.
+
+    Returns:
+        numpy.array: Sorted, unique indices always including the first and last point
+    """
+    if num_points <= max_points:
+        return np.arange(num_points)
+    return np.unique(np.rint(np.logspace(0, np.log10(num_points), max_points)).astype(int) - 1)
+
+
+def fit_lines(avg_time, allan_dev, noise_model):
+    """Fitted lines of the noise sources in the model, as drawn by `plot_allan_deviation`.
+
+    Args:
+        avg_time (numpy.array): Averaging times
+        allan_dev (numpy.array): Allan deviations
+        noise_model (list): Whether [ARW, 1st order BI, filter BI, RRW, QN, RR] are included
+
+    Returns:
+        dict: (line, coefficient) of "random walk", "rate random walk" and "bias instability", for the sources in the model
+    """
+    from coefficient_fitting import fit_random_walk_line, fit_rate_random_walk_line, fit_bias_instability_line
+
+    fits = {}
+    if noise_model[0]:
+        with stage("fitting", line="random walk"):
+            fits["random walk"] = fit_random_walk_line(avg_time, allan_dev)
+    if noise_model[3]:
+        with stage("fitting", line="rate random walk"):
+            fits["rate random walk"] = fit_rate_random_walk_line(avg_time, allan_dev)
+    if (noise_model[1] or noise_model[2]):
+        with stage("fitting", line="bias instability"):
+            fits["bias instability"] = fit_bias_instability_line(avg_time, allan_dev)
+    return fits
+
+
+@timed("figure.allan_deviation")
+def plot_allan_deviation(avg_time, allan_dev, noise_model, verbose, max_points=500, fits=None):
 
     allan_deviation_labels = {"Averaging Time":"\u03C4 (sec)",
                                 "Allan Deviation":"\u03C3(\u03C4)"}
-    
-    fig = px.line(data_frame={"Averaging Time":avg_time, "Allan Deviation":allan_dev},
-                    x="Averaging Time",
-                    y="Allan Deviation",
-                    hover_name="Allan Deviation",
-                    log_x=True,
-                    log_y=True,
-                    labels=allan_deviation_labels)
+
+    # Dense curves are thinned evenly on the log axis, the fits below still use every point
+    shown = log_spaced_indices(len(avg_time), max_points)
+
+    fig = line_figure(avg_time[shown], allan_dev[shown], allan_deviation_labels["Averaging Time"], allan_deviation_labels["Allan Deviation"], log=True)
     
     if verbose:
-        if noise_model[0]:
-            rw_line = fit_random_walk_line(avg_time, allan_dev)
-            fig.add_trace(go.Scatter(x=avg_time, y=rw_line[0], name=f"Random Walk", line=dict(dash="dash")))
+        # Precomputed fits (e.g. of the demo) save importing and running the fitting code
+        if fits is None:
+            fits = fit_lines(avg_time, allan_dev, noise_model)
+
+        if "random walk" in fits:
+            rw_line = fits["random walk"]
+            fig.add_trace(go.Scatter(x=avg_time[shown], y=rw_line[0][shown], name=f"Random Walk", line=dict(dash="dash")))
             fig.add_annotation(xref="paper", yref="paper", x=1, y=0.2, text=f"Calculated Random Walk Coefficient: {rw_line[1]:.3}...", showarrow=False)
 
-        if noise_model[3]:
-            rrw_line = fit_rate_random_walk_line(avg_time, allan_dev)
-            fig.add_trace(go.Scatter(x=avg_time, y=rrw_line[0], name="Rate Random Walk", line=dict(dash="dash")))
+        if "rate random walk" in fits:
+            rrw_line = fits["rate random walk"]
+            fig.add_trace(go.Scatter(x=avg_time[shown], y=rrw_line[0][shown], name="Rate Random Walk", line=dict(dash="dash")))
             fig.add_annotation(xref="paper", yref="paper", x=1, y=0.1, text=f"Calculated Rate Random Walk Coefficient: {rrw_line[1]:.3}...", showarrow=False)
 
-        if (noise_model[1] or noise_model[2]):
-            bi_line = fit_bias_instability_line(avg_time, allan_dev)
-            fig.add_trace(go.Scatter(x=avg_time, y=bi_line[0], name="Bias Instability", line=dict(dash="dash")))
+        if "bias instability" in fits:
+            bi_line = fits["bias instability"]
+            fig.add_trace(go.Scatter(x=avg_time[shown], y=bi_line[0][shown], name="Bias Instability", line=dict(dash="dash")))
             fig.add_annotation(xref="paper", yref="paper", x=1, y=0.0, text=f"Calculated Bias Instability Coefficient: {bi_line[1]:.3}...", showarrow=False)
 
-    return fig
\ No newline at end of file
+    return fig
+
+
+@timed("figure.allan_deviation_bands")
+def plot_allan_deviation_bands(avg_time, mean, lower, upper, band_label):
+
+    allan_deviation_labels = {"x":"\u03C4 (sec)", "y":"\u03C3(\u03C4)"}
+
+    fig = go.Figure()
+
+    # Shaded band between the lower and upper percentiles
+    fig.add_trace(go.Scatter(x=avg_time, y=upper, line=dict(width=0), showlegend=False, hoverinfo="skip"))
+    fig.add_trace(go.Scatter(x=avg_time, y=lower, line=dict(width=0), fill="tonexty", name=band_label))
+
+    fig.add_trace(go.Scatter(x=avg_time, y=mean, name="Mean Allan Deviation"))
+
+    fig.update_xaxes(type="log", title=allan_deviation_labels["x"])
+    fig.update_yaxes(type="log", title=allan_deviation_labels["y"])
+
+    return fig
+
+@timed("figure.dynamic_allan_deviation")
+def plot_dynamic_allan_deviation(window_times, avg_time, allan_dev, max_windows=1000):
+
+    dynamic_labels = {"x":"Window Center (sec)", "y":"\u03C4 (sec)", "z":"log\u2081\u2080 \u03C3(\u03C4)"}
+
+    # Long records are thinned to evenly spaced windows, every averaging time is kept
+    shown = np.unique(np.linspace(0, len(window_times)-1, min(len(window_times), max_windows)).astype(int))
+
+    # Log color scale, so drifts at every averaging time are visible at once
+    fig = go.Figure(go.Heatmap(x=window_times[shown],
+                                y=avg_time,
+                                z=np.log10(allan_dev[shown]).T,
+                                colorbar=dict(title=dynamic_labels["z"]),
+                                hovertemplate="t=%{x:.4g} s<br>\u03C4=%{y:.4g} s<br>log\u2081\u2080 \u03C3=%{z:.4g}<extra></extra>"))
+
+    fig.update_xaxes(title=dynamic_labels["x"])
+    fig.update_yaxes(type="log", title=dynamic_labels["y"])
+
+    return fig
@@ -0,0 +1,279 @@
+"""On-disk store of computed results, shared by every process on the machine.
+
+A result is a dict of NumPy arrays (e.g. "tau", "adev" and one array per
+fitted coefficient) filed under a key that hashes what it was computed from:
+the samples' content or the simulation spec, plus the estimator parameters.
+Each array is an .npy file, so results are memory-mapped on the way out.
+
+Writers build an entry in a temporary directory and rename it into place, so
+readers never see a partial entry and concurrent writers of the same key
+simply keep the first. `get_or_compute` also holds a file lock while
+computing, so processes asking for the same key wait for one computation
+instead of repeating it. Once the store outgrows its size bound, the least
+recently read entries are removed.
+
+    store = ResultStore("~/.cache/allan-online", max_bytes=2**30)
+    key = result_key("adev", data=array_digest(samples), Fs=100, maxNumM=100, variant="overlapping")
+    result = store.get_or_compute(key, lambda: {"tau": tau, "adev": adev})
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks (e.g. Windows): writes stay atomic, only duplicate work is no longer avoided
+    fcntl = None
+
+
+# Location and size of `shared_store`, the store disabled when the location is empty
+STORE_PATH = os.environ.get("ALLAN_ONLINE_STORE", os.path.join("~", ".cache", "allan-online"))
+STORE_BYTES = int(os.environ.get("ALLAN_ONLINE_STORE_BYTES", 2**30))
+
+# Temporary directories older than this are left over by killed writers
+STALE_SECONDS = 3600
+
+
+def result_key(kind, **identity):
+    """Key of a result, the same for the same inputs in every process.
+
+    Args:
+        kind (str): What was computed, e.g. "adev" or "simulation"
+        **identity: JSON-serializable description of the inputs and parameters
+
+    Returns:
+        str: Hex digest naming the result
+    """
+    description = json.dumps([kind, identity], sort_keys=True, default=_json_default)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def _json_default(value):
+    """JSON form of NumPy scalars in a result's identity"""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"cannot describe {type(value).__name__} in a result key")
+
+
+def array_digest(array, block_size=2**24):
+    """Hash of an array's type, shape and contents, read block by block.
+
+    Args:
+        array (numpy array): The array, e.g. memory-mapped samples
+        block_size (int, optional): Number of bytes hashed at a time. Defaults to 2**24.
+
+    Returns:
+        str: Hex digest of the array
+    """
+    array = np.asarray(array)
+    digest = hashlib.sha256(json.dumps([array.dtype.str, array.shape]).encode())
+    flat = array.reshape(-1) if array.flags.c_contiguous else np.ravel(array)
+    step = max(1, block_size//max(array.itemsize, 1))
+    for start in range(0, flat.size, step):
+        digest.update(np.ascontiguousarray(flat[start:start+step]).view(np.uint8))
+    return digest.hexdigest()
+
+
+class ResultStore:
+    """Content-addressed results on disk, bounded by their total size.
+
+    Args:
+        root (str): Directory of the store, created when missing
+        max_bytes (int, optional): Largest total size of the stored arrays. Defaults to 1 GiB.
+    """
+
+    def __init__(self, root, max_bytes=2**30):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.max_bytes = max_bytes
+        # Locks held by each thread, so a computation may use the store itself
+        self._held = threading.local()
+        os.makedirs(os.path.join(self.root, "locks"), exist_ok=True)
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key):
+        """Memory-mapped arrays of a stored result, or None when it is not stored.
+
+        Args:
+            key (str): Key of the result, see `result_key`
+
+        Returns:
+            dict: Read-only array of every name, or None
+        """
+        entry = self._entry(key)
+        try:
+            names = sorted(os.listdir(entry))
+            result = {name[:-4]: np.load(os.path.join(entry, name), mmap_mode="r") for name in names if name.endswith(".npy")}
+            # Reading marks the entry as recently used
+            os.utime(entry)
+        except (OSError, ValueError):
+            # Missing, or evicted while being read
+            return None
+        return result
+
+    def put(self, key, arrays):
+        """Store a result, unless another writer stored the same key first.
+
+        Args:
+            key (str): Key of the result, see `result_key`
+            arrays (dict): Array (or scalar) of every name
+
+        Returns:
+            dict: The stored result, memory-mapped
+        """
+        temporary = os.path.join(self.root, f"tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        os.makedirs(temporary)
+        try:
+            for name, value in arrays.items():
+                np.save(os.path.join(temporary, f"{name}.npy"), np.asarray(value))
+            os.makedirs(os.path.dirname(self._entry(key)), exist_ok=True)
+            os.replace(temporary, self._entry(key))
+        except OSError:
+            # A non-empty directory is already in place: the same result from another writer
+            if not os.path.isdir(self._entry(key)):
+                raise
+        finally:
+            shutil.rmtree(temporary, ignore_errors=True)
+
+        self.evict()
+        result = self.get(key)
+        return result if result is not None else {name: np.asarray(value) for name, value in arrays.items()}
+
+    def get_or_compute(self, key, compute):
+        """Return the stored result, computing and storing it on a miss.
+
+        Other processes asking for the same key meanwhile wait for this
+        computation rather than repeating it.
+
+        Args:
+            key (str): Key of the result, see `result_key`
+            compute (callable): Called without arguments to produce the dict of arrays on a miss
+
+        Returns:
+            dict: The result, memory-mapped
+        """
+        result = self.get(key)
+        if result is not None:
+            return result
+
+        with self._lock(f"{key[:2]}.lock"):
+            result = self.get(key)
+            if result is None:
+                result = self.put(key, compute())
+        return result
+
+    def evict(self):
+        """Remove the least recently read entries until the store fits `max_bytes`"""
+        with self._lock("store.lock"):
+            for item in os.scandir(self.root):
+                if item.name.startswith("tmp-"):
+                    self._remove_if_stale(item)
+
+            entries = []
+            for path in self._entries():
+                try:
+                    entries.append((os.stat(path).st_mtime, _directory_size(path), path))
+                except OSError:
+                    continue
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock("store.lock"):
+            for path in list(self._entries()):
+                self._remove(path)
+
+    @property
+    def nbytes(self):
+        """Total size of the stored arrays in bytes"""
+        return sum(_directory_size(path) for path in self._entries())
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+    def __contains__(self, key):
+        return os.path.isdir(self._entry(key))
+
+    def _entries(self):
+        """Paths of every stored entry, one directory per result inside a directory per first two key digits"""
+        for bucket in os.scandir(self.root):
+            if len(bucket.name) == 2 and bucket.is_dir():
+                for entry in os.scandir(bucket.path):
+                    yield entry.path
+
+    def _remove(self, path):
+        # Renamed away first, so readers see the entry either whole or gone
+        doomed = os.path.join(self.root, f"tmp-{os.getpid()}-{uuid.uuid4().hex}")
+        try:
+            os.replace(path, doomed)
+        except OSError:
+            return
+        shutil.rmtree(doomed, ignore_errors=True)
+
+    def _remove_if_stale(self, entry):
+        try:
+            if time.time() - entry.stat().st_mtime > STALE_SECONDS:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
+
+    @contextmanager
+    def _lock(self, name):
+        """Exclusive lock shared by every process and thread using the store, reentrant within a thread"""
+        held = self._held.__dict__.setdefault("names", set())
+        if fcntl is None or name in held:
+            yield
+            return
+        with open(os.path.join(self.root, "locks", name), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            held.add(name)
+            try:
+                yield
+            finally:
+                held.discard(name)
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _directory_size(path):
+    """Total size of the files in a directory"""
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(path))
+    except OSError:
+        return 0
+
+
+# The store of this machine, opened on first use
+_shared_store = None
+
+
+def shared_store():
+    """The store at ALLAN_ONLINE_STORE (default ~/.cache/allan-online), or None when that is set empty.
+
+    Returns:
+        ResultStore: The store shared by every process using the same location, or None
+    """
+    global _shared_store
+    if not STORE_PATH:
+        return None
+    if _shared_store is None:
+        try:
+            _shared_store = ResultStore(STORE_PATH, STORE_BYTES)
+        except OSError:
+            # Read-only home directory, run without a store
+            return None
+    return _shared_store
\ No newline at end of file
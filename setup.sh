@@ -6,4 +6,7 @@ port = $PORT\n\
 enableCORS = false\n\
 headless = true\n\
 \n\
-" > ~/.streamlit/config.toml
\ No newline at end of file
+" > ~/.streamlit/config.toml
+
+# Precompute the artifacts of the app's demo mode
+python demo.py build
\ No newline at end of file
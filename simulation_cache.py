@@ -0,0 +1,276 @@
+import numpy as np
+from collections import OrderedDict
+from threading import Lock
+from noise_synthesis import NOISE_SOURCES, simulate_noise_source, split_coefficient
+from allan_variance import overlapping_allan_deviation, overlapping_allan_gram, allan_deviation_from_gram
+from instrumentation import stage
+from result_store import result_key, shared_store
+
+
+class SimulationCache:
+    """Least recently used cache bounded by the total size of the arrays it holds.
+
+    Cached arrays are made read-only, since every caller gets the same object.
+
+    Args:
+        max_bytes (int, optional): Largest total size of the cached arrays. Defaults to 512 MiB.
+    """
+
+    def __init__(self, max_bytes=512*2**20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, compute):
+        """Return the value stored under `key`, computing and storing it on a miss.
+
+        Args:
+            key (hashable): Key of the value
+            compute (callable): Called without arguments to produce the value on a miss
+
+        Returns:
+            The cached value
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+
+        value = compute()
+        size = _freeze(value)
+
+        with self._lock:
+            if key not in self._entries and size <= self.max_bytes:
+                self._entries[key] = (value, size)
+                self.nbytes += size
+                # Evict the least recently used entries until the new one fits
+                while self.nbytes > self.max_bytes:
+                    _, (_, evicted) = self._entries.popitem(last=False)
+                    self.nbytes -= evicted
+
+        return value
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+def _freeze(value):
+    """Make every array in `value` read-only and return their total size in bytes"""
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return sum(_freeze(item) for item in value.values())
+    return 0
+
+
+# Shared caches, kept for the life of the process (e.g. across Streamlit reruns).
+# Allan deviations are small and kept apart so large series never evict them.
+SIMULATION_CACHE = SimulationCache(512*2**20)
+ALLAN_DEVIATION_CACHE = SimulationCache(32*2**20)
+
+
+def source_key(name, params, fs, sim_time, seed):
+    """Hashable description of one simulated noise source
+
+    Args:
+        name (str): Key of the generator in `NOISE_SOURCES`
+        params (dict): Keyword arguments of the generator
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        seed (int): Seed of the simulation
+
+    Returns:
+        tuple: The key
+    """
+    return (name, tuple(sorted(params.items())), float(fs), float(sim_time), int(seed))
+
+
+def source_rng(name, seed):
+    """Random number generator of one noise source in a seeded simulation.
+
+    Every source gets its own stream, so a source's samples do not depend
+    on which other sources are enabled.
+
+    Args:
+        name (str): Key of the generator in `NOISE_SOURCES`
+        seed (int): Seed of the simulation
+
+    Returns:
+        numpy.random.Generator: The generator
+    """
+    return np.random.default_rng([int(seed), list(NOISE_SOURCES).index(name)])
+
+
+def cached_unit_source(name, params, fs, sim_time, seed, cache=None):
+    """Unit coefficient realization of one noise source, and the factor to scale it by.
+
+    Sources linear in their coefficient (see `noise_synthesis.split_coefficient`)
+    are cached once per seed and shape parameters, so a new coefficient only
+    rescales the cached series instead of simulating it again.
+
+    Args:
+        name (str): Key of the generator in `NOISE_SOURCES`
+        params (dict): Keyword arguments of the generator
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        seed (int): Seed of the simulation
+        cache (SimulationCache, optional): Cache to use. Defaults to `SIMULATION_CACHE`.
+
+    Returns:
+        (series, scale) (tuple): Read-only unit realization and its scale factor
+    """
+    cache = SIMULATION_CACHE if cache is None else cache
+    unit_params, scale = split_coefficient(name, params)
+    key = source_key(name, unit_params, fs, sim_time, seed)
+
+    def simulate():
+        with stage("synthesis", source=name, num_samples=int(sim_time*fs)):
+            return simulate_noise_source(name, unit_params, fs, sim_time, source_rng(name, seed))
+
+    return (cache.get(key, simulate), scale)
+
+
+def cached_noise_source(name, params, fs, sim_time, seed, cache=None):
+    """Simulate one noise source, reusing an earlier simulation with the same random data.
+
+    Args:
+        name (str): Key of the generator in `NOISE_SOURCES`
+        params (dict): Keyword arguments of the generator
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        seed (int): Seed of the simulation
+        cache (SimulationCache, optional): Cache to use. Defaults to `SIMULATION_CACHE`.
+
+    Returns:
+        numpy.array: Array of samples of the noise source, read-only when it is the cached series itself
+    """
+    series, scale = cached_unit_source(name, params, fs, sim_time, seed, cache)
+    return series if scale == 1 else scale*series
+
+
+def cached_noise_model(sources, fs, sim_time, seed, cache=None):
+    """Sum of the enabled noise sources, simulating only what is not cached yet.
+
+    Args:
+        sources (list): (name, params) of every enabled noise source
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        seed (int): Seed of the simulation
+        cache (SimulationCache, optional): Cache to use. Defaults to `SIMULATION_CACHE`.
+
+    Returns:
+        numpy.array: Read-only array holding the combined noise
+    """
+    cache = SIMULATION_CACHE if cache is None else cache
+    key = ("model",) + tuple(source_key(name, params, fs, sim_time, seed) for name, params in sources)
+
+    def combine():
+        combined = np.zeros(int(sim_time*fs))
+        for name, params in sources:
+            series, scale = cached_unit_source(name, params, fs, sim_time, seed, cache)
+            with stage("combine", source=name):
+                _add_scaled(combined, series, scale)
+        return combined
+
+    return cache.get(key, combine)
+
+
+def _add_scaled(out, series, scale, block_size=2**16):
+    """out += scale*series, one block at a time so no full-length temporary is made"""
+    if scale == 1:
+        out += series
+        return
+    for start in range(0, len(out), block_size):
+        stop = start + block_size
+        out[start:stop] += scale*series[start:stop]
+
+
+def cached_allan_deviation(sources, fs, sim_time, seed, maxNumM=100, cache=None, simulation_cache=None, store=None):
+    """Overlapping Allan deviation of a noise model, cached apart from the series.
+
+    Once the coefficients of the same sources change, the Allan variance cross
+    terms of their unit realizations (see `allan_variance.overlapping_allan_gram`)
+    are computed and cached. Every later coefficient change only rescales the
+    cross terms, which takes milliseconds, instead of computing the deviation
+    of a new series. The first model is computed directly, since the cross
+    terms cost about one Allan deviation per source.
+
+    Deviations and cross terms are also kept in the on-disk result store, so
+    other processes and later sessions find them there.
+
+    Args:
+        sources (list): (name, params) of every enabled noise source
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        seed (int): Seed of the simulation
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        cache (SimulationCache, optional): Cache of Allan deviations. Defaults to `ALLAN_DEVIATION_CACHE`.
+        simulation_cache (SimulationCache, optional): Cache of series. Defaults to `SIMULATION_CACHE`.
+        store (result_store.ResultStore, optional): On-disk store, False for none. Defaults to `result_store.shared_store()`.
+
+    Returns:
+        (taus, oadev) (tuple): Read-only arrays of averaging times and overlapping Allan deviations
+    """
+    cache = ALLAN_DEVIATION_CACHE if cache is None else cache
+    store = shared_store() if store is None else (store or None)
+    key = ("oadev", maxNumM) + tuple(source_key(name, params, fs, sim_time, seed) for name, params in sources)
+
+    unit_params, scales = zip(*(split_coefficient(name, params) for name, params in sources)) if sources else ((), ())
+    gram_key = ("oadev_gram", maxNumM) + tuple(source_key(name, params, fs, sim_time, seed) for (name, _), params in zip(sources, unit_params))
+    # Marks the unit realizations whose deviation was computed for some coefficients already
+    seen_key = ("oadev_seen",) + gram_key[1:]
+
+    # Keys of the same results in the on-disk store
+    stored_key = _stored_key("simulation_oadev", sources, fs, sim_time, seed, maxNumM)
+    stored_gram_key = _stored_key("simulation_oadev_gram", list(zip((name for name, _ in sources), unit_params)), fs, sim_time, seed, maxNumM)
+
+    def direct():
+        combined = cached_noise_model(sources, fs, sim_time, seed, simulation_cache)
+        with stage("oadev", num_samples=len(combined), maxNumM=maxNumM):
+            return overlapping_allan_deviation(combined, fs, maxNumM)
+
+    def gram():
+        units = [cached_unit_source(name, params, fs, sim_time, seed, simulation_cache)[0] for name, params in sources]
+        with stage("oadev_gram", num_samples=int(sim_time*fs), maxNumM=maxNumM, num_sources=len(units)):
+            return overlapping_allan_gram(units, fs, maxNumM)
+
+    def compute():
+        if store is not None and stored_key in store:
+            return _stored(store, stored_key, ("tau", "adev"), direct)
+
+        gram_known = gram_key in cache or (store is not None and stored_gram_key in store)
+        if not sources or (seen_key not in cache and not gram_known):
+            cache.get(seen_key, lambda: None)
+            return _stored(store, stored_key, ("tau", "adev"), direct)
+
+        taus, cross_terms = cache.get(gram_key, lambda: _stored(store, stored_gram_key, ("tau", "gram"), gram))
+        return _stored(store, stored_key, ("tau", "adev"), lambda: (taus, allan_deviation_from_gram(cross_terms, scales)))
+
+    return cache.get(key, compute)
+
+
+def _stored_key(kind, sources, fs, sim_time, seed, maxNumM):
+    """Key of a simulation's result in the on-disk store"""
+    return result_key(kind, sources=[[name, params] for name, params in sources], fs=float(fs), sim_time=float(sim_time),
+                      seed=int(seed), maxNumM=int(maxNumM), variant="overlapping")
+
+
+def _stored(store, key, names, compute):
+    """Arrays returned by compute(), read from or saved to the on-disk store when there is one"""
+    if store is None:
+        return compute()
+    result = store.get_or_compute(key, lambda: dict(zip(names, compute())))
+    return tuple(result[name] for name in names)
\ No newline at end of file
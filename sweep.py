@@ -0,0 +1,246 @@
+"""Allan deviation surfaces over grids of noise coefficients.
+
+Every noise source is simulated once with a unit coefficient and the unit
+realizations are integrated together as the rows of one 2-D array. A single
+pass over the cluster sizes then gives the Allan variance cross terms of
+every pair of sources (see `allan_variance.overlapping_allan_gram`), from
+which the deviation of any combination of coefficients follows in O(M*S**2).
+A 20 x 20 x 10 grid of ARW, BI and RRW coefficients therefore costs one
+Allan deviation per source instead of 4000. Grid points share their random
+data, as with a fixed seed in the app, so differences between them come from
+the coefficients alone.
+
+Parameters that do not scale a source linearly (e.g. the correlation time,
+or the quantization coefficient) are swept by simulating the sources again
+for each of their values.
+
+The sources are generated block by block and integrated straight into their
+rows. When the rows do not fit in the memory budget they are written to a
+temporary file instead, which the cross terms are then summed from a few
+thousand samples at a time, so the length of the simulation is bounded by
+disk space rather than memory.
+
+    python sweep.py --fs 100 --sim-time 3600 --axis arw.coeff 0.001 0.1 20 \\
+        --axis markov_bi.coeff 0.0005 0.05 20 --axis rrw.coeff 1e-5 1e-3 10 \\
+        --source markov_bi corr_time=100 --output sweep.npz
+"""
+import argparse
+import contextlib
+import inspect
+import itertools
+import sys
+import tempfile
+
+import numpy as np
+
+from allan_variance import blockwise_cumsum, cluster_sizes, integrated_allan_gram, max_cluster_size
+from noise_synthesis import LINEAR_COEFFICIENTS, NOISE_SOURCES, iter_noise_source, split_coefficient
+from simulation_cache import source_rng
+
+
+def sweep_allan_deviation(sources, axes, fs, sim_time, seed=0, maxNumM=100, memory_budget=512*2**20, workers=1):
+    """Overlapping Allan deviation of every point of a grid of source parameters.
+
+    Args:
+        sources (list): (name, params) of every noise source of the base model. Swept sources that are missing are added with the parameters on their axes.
+        axes (dict): Values of every swept parameter, keyed by "<source>.<parameter>", e.g. {"arw.coeff": [...], "rrw.coeff": [...]}. The order of the keys is the order of the result's dimensions.
+        fs (int or float): Sampling rate in Hz
+        sim_time (int or float): Length of the simulation in seconds
+        seed (int, optional): Seed of the simulation, the same streams as the app. Defaults to 0.
+        maxNumM (int, optional): The number of discrete time clusters. Defaults to 100.
+        memory_budget (int, optional): Largest number of bytes of realizations and results held at once; larger realizations are kept in a temporary file. Defaults to 512 MiB.
+        workers (int, optional): Number of threads evaluating cluster sizes in parallel, 0 for one per CPU. Defaults to 1.
+
+    Returns:
+        dict: "tau" (M,), "adev" and "dominant" (one dimension per axis, then M), "dims", "axes" {label: values} and "terms", the source names "dominant" indexes into
+    """
+    axes = {label: np.asarray(values, dtype=float) for label, values in axes.items()}
+    sources = _swept_model(sources, axes)
+    names = [name for name, _ in sources]
+    num_samples = int(sim_time*fs)
+
+    # Integrated unit realizations, one row per source, in memory when they fit in half the budget
+    realization_bytes = len(sources)*num_samples*8
+    in_memory = realization_bytes <= memory_budget//2
+    held_bytes = realization_bytes if in_memory else 0
+
+    # Coefficient axes only rescale the unit realizations, the other axes need new ones
+    linear_axes = [label for label in axes if _is_linear(label)]
+    shape_axes = [label for label in axes if not _is_linear(label)]
+
+    m = cluster_sizes(max_cluster_size(num_samples), maxNumM)
+    num_taus = int(np.sum(num_samples - 2*m > 0))
+    adev = np.empty(tuple(len(axes[label]) for label in shape_axes + linear_axes) + (num_taus,))
+    dominant = np.empty(adev.shape, dtype=np.int8)
+
+    # Grid points evaluated per batch, so the weights, variances and per-source terms fit in what is left
+    point_bytes = 8*(len(sources) + num_taus*(len(sources) + 2))
+    batch = max(1, (memory_budget - held_bytes)//point_bytes)
+
+    for shape_index in itertools.product(*(range(len(axes[label])) for label in shape_axes)):
+        shape_values = {label: axes[label][i] for label, i in zip(shape_axes, shape_index)}
+        tau, gram, scales = _unit_cross_terms(sources, shape_values, fs, sim_time, seed, maxNumM, workers, in_memory)
+
+        # Weight of every source at every grid point of the coefficient axes, (P x S)
+        weights = np.tile(scales, (int(np.prod([len(axes[label]) for label in linear_axes])), 1))
+        grid = np.meshgrid(*(axes[label] for label in linear_axes), indexing="ij")
+        for label, values in zip(linear_axes, grid):
+            name = label.split(".")[0]
+            # Sources built from sqrt(coeff**2) ignore the sign, as in `split_coefficient`
+            values = values.reshape(-1)
+            weights[:, names.index(name)] = np.abs(values) if LINEAR_COEFFICIENTS[name][1] is abs else values
+
+        flat_adev = adev[shape_index].reshape(-1, num_taus)
+        flat_dominant = dominant[shape_index].reshape(-1, num_taus)
+        for start in range(0, len(weights), batch):
+            stop = min(start+batch, len(weights))
+            w = weights[start:stop]
+            variance = np.einsum("pi,mij,pj->pm", w, gram, w)
+            flat_adev[start:stop] = np.sqrt(np.maximum(variance, 0))
+            # Variance of every source on its own, the largest one dominates
+            terms = np.einsum("pi,mi->pmi", w*w, np.diagonal(gram, axis1=1, axis2=2))
+            flat_dominant[start:stop] = np.argmax(terms, axis=-1)
+
+    # Put the dimensions back in the order of `axes`
+    order = [(shape_axes + linear_axes).index(label) for label in axes] + [len(axes)]
+    return {
+        "tau": tau,
+        "adev": adev.transpose(order),
+        "dominant": dominant.transpose(order),
+        "dims": tuple(axes) + ("tau",),
+        "axes": axes,
+        "terms": names,
+    }
+
+
+def _is_linear(label):
+    """Whether the axis sweeps the parameter a source is proportional to"""
+    name, parameter = label.split(".", 1)
+    return name in LINEAR_COEFFICIENTS and LINEAR_COEFFICIENTS[name][0] == parameter
+
+
+def _swept_model(sources, axes):
+    """Sources of the base model plus any swept source it is missing, checking the axis labels"""
+    model = {name: dict(params) for name, params in sources}
+    for name in model:
+        if name not in NOISE_SOURCES:
+            raise ValueError(f"unknown source {name!r}, expected one of {sorted(NOISE_SOURCES)}")
+    for label, values in axes.items():
+        name, _, parameter = label.partition(".")
+        if name not in NOISE_SOURCES or not parameter:
+            raise ValueError(f"unknown axis {label!r}, expected '<source>.<parameter>' with a source of {sorted(NOISE_SOURCES)}")
+        if len(values) == 0:
+            raise ValueError(f"axis {label!r} has no values")
+        model.setdefault(name, {}).setdefault(parameter, _parameter_value(values[0]))
+
+    # Parameters without a default must come from the base model or an axis
+    for name, params in model.items():
+        missing = sorted(_required_parameters(name) - set(params))
+        if missing:
+            raise ValueError(f"source {name!r} needs {', '.join(missing)}, give them as base parameters or as axes")
+    return list(model.items())
+
+
+def _required_parameters(name):
+    """Parameters of a noise source's generator without a default"""
+    signature = inspect.signature(NOISE_SOURCES[name])
+    return {parameter.name for parameter in signature.parameters.values()
+            if parameter.default is inspect.Parameter.empty and parameter.name not in ("fs", "sim_time")}
+
+
+def _parameter_value(value):
+    """Whole numbers as int, so parameters like the filter length can be swept"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def _unit_cross_terms(sources, shape_values, fs, sim_time, seed, maxNumM, workers, in_memory=True):
+    """Allan variance cross terms of the unit realizations of the sources with some parameters replaced"""
+    num_samples = int(sim_time*fs)
+    scales = np.empty(len(sources))
+
+    # Rows too large for the budget go to a temporary file, removed when it is closed
+    with contextlib.nullcontext() if in_memory else tempfile.TemporaryFile() as scratch:
+        if scratch is None:
+            theta = np.empty((len(sources), num_samples))
+        else:
+            theta = np.memmap(scratch, dtype=float, mode="w+", shape=(len(sources), num_samples))
+
+        for i, (name, params) in enumerate(sources):
+            params = dict(params)
+            for label, value in shape_values.items():
+                source, parameter = label.split(".", 1)
+                if source == name:
+                    params[parameter] = _parameter_value(value)
+            unit_params, scales[i] = split_coefficient(name, params)
+            _integrate_into(theta[i], iter_noise_source(name, unit_params, fs, sim_time, rng=source_rng(name, seed)), 1/fs)
+
+        tau, gram = integrated_allan_gram(theta, fs, maxNumM, workers)
+        del theta
+    return (tau, gram, scales)
+
+
+def _integrate_into(row, blocks, t0):
+    """Write the running integral of consecutive sample blocks into `row`"""
+    start, total = 0, 0.0
+    for block in blocks:
+        integral = blockwise_cumsum(block)
+        integral *= t0
+        integral += total
+        row[start:start+len(block)] = integral
+        start += len(block)
+        total = integral[-1] if len(integral) else total
+
+
+def _parse_source(values):
+    """(name, params) of a --source NAME KEY=VALUE ... argument"""
+    name, params = values[0], {}
+    for item in values[1:]:
+        key, _, value = item.partition("=")
+        params[key] = int(value) if value.lstrip("-").isdigit() else float(value)
+    return (name, params)
+
+
+def _parse_axis(values, log):
+    """(label, values) of a --axis LABEL START STOP COUNT argument"""
+    label, start, stop, count = values[0], float(values[1]), float(values[2]), int(values[3])
+    if log and start > 0 and stop > 0:
+        return (label, np.logspace(np.log10(start), np.log10(stop), count))
+    return (label, np.linspace(start, stop, count))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=float, required=True, help="sampling rate in Hz")
+    parser.add_argument("--sim-time", type=float, required=True, help="length of the simulation in seconds")
+    parser.add_argument("--axis", nargs=4, action="append", required=True, metavar=("LABEL", "START", "STOP", "COUNT"),
+                        help="swept parameter <source>.<parameter> and its values, repeat for every axis")
+    parser.add_argument("--linear", action="store_true", help="space the axis values linearly instead of logarithmically")
+    parser.add_argument("--source", nargs="+", action="append", default=[], metavar="NAME KEY=VALUE",
+                        help="noise source of the base model and its parameters, repeat for every source")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulation")
+    parser.add_argument("--max-num-m", type=int, default=100, help="number of discrete time clusters")
+    parser.add_argument("--memory-budget", type=float, default=512, help="memory budget in MiB")
+    parser.add_argument("--workers", type=int, default=1, help="threads evaluating cluster sizes, 0 for one per CPU")
+    parser.add_argument("--output", default="sweep.npz", help="output .npz file")
+    args = parser.parse_args(argv)
+
+    axes = dict(_parse_axis(values, not args.linear) for values in args.axis)
+    sources = [_parse_source(values) for values in args.source]
+
+    try:
+        result = sweep_allan_deviation(sources, axes, args.fs, args.sim_time, args.seed, args.max_num_m,
+                                       int(args.memory_budget*2**20), args.workers)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    columns = {"tau": result["tau"], "adev": result["adev"], "dominant": result["dominant"],
+               "dims": np.array(result["dims"]), "terms": np.array(result["terms"])}
+    columns.update({f"axis_{label}": values for label, values in result["axes"].items()})
+    np.savez(args.output, **columns)
+    print(f"wrote {result['adev'].shape} Allan deviations to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+
+from allan_variance import (OnlineAllanDeviation, allan_deviation_from_gram, allan_deviations, chunked_overlapping_allan_deviation, dense_overlapping_allan_deviation,
+                            dynamic_allan_deviation, hadamard_deviation, max_cluster_size, modified_allan_deviation, overlapping_allan_deviation,
+                            overlapping_allan_gram)
+
+FS = 20
+
+
+def _series(num_samples, channels=(), seed=0):
+    """White noise plus a random walk, so the deviation bends over the cluster sizes"""
+    rng = np.random.default_rng(seed)
+    shape = (num_samples,) + channels
+    return 0.1*rng.standard_normal(shape) + 1e-3*np.cumsum(rng.standard_normal(shape), 0)
+
+
+def test_online_matches_batch():
+    omega = _series(20000)
+    tau, adev = overlapping_allan_deviation(omega, FS)
+
+    online = OnlineAllanDeviation(FS, max_cluster_size(len(omega)))
+    for chunk in np.array_split(omega, [1, 7, 4000, 4001, 12345]):
+        online.update(chunk)
+    online_tau, online_adev = online.allan_deviation()
+
+    np.testing.assert_allclose(online_tau, tau)
+    np.testing.assert_allclose(online_adev, adev, rtol=1e-10)
+
+
+@pytest.mark.parametrize("chunk_size", [2**10, 2**14, 2**20])
+@pytest.mark.parametrize("channels", [(), (3,)])
+@pytest.mark.parametrize("num_samples", [30000, 4097, 2**16])
+def test_chunked_matches_batch(chunk_size, channels, num_samples):
+    #raw counts and a scale, as read from a log
+    counts = np.round(_series(num_samples, channels)*1000).astype(np.int16)
+    tau, adev = overlapping_allan_deviation(counts*0.001, FS)
+    chunked_tau, chunked_adev = chunked_overlapping_allan_deviation(counts, FS, scale=0.001, chunk_size=chunk_size, workers=2)
+
+    #lengths where the largest cluster size rounds up to half the series must drop it too
+    np.testing.assert_array_equal(chunked_tau, tau)
+    assert np.all(np.isfinite(chunked_adev)) and np.all(chunked_adev > 0)
+    np.testing.assert_allclose(chunked_adev, adev, rtol=1e-10)
+
+
+def test_dense_matches_batch():
+    omega = _series(3000, (2,))
+    tau, adev = overlapping_allan_deviation(omega, FS)
+    dense_tau, dense_adev = dense_overlapping_allan_deviation(omega, FS)
+
+    assert len(dense_tau) == (len(omega)-1)//2
+    m = np.round(tau*FS).astype(int)
+    np.testing.assert_allclose(dense_tau[m-1], tau)
+    np.testing.assert_allclose(dense_adev[m-1], adev, rtol=1e-8)
+
+
+def test_variants_match_their_definitions():
+    omega = _series(300)
+    theta = np.cumsum(omega)/FS
+    L = len(theta)
+
+    tau, mdev = modified_allan_deviation(omega, FS)
+    for i, m in enumerate(np.round(tau*FS).astype(int)):
+        second = theta[2*m:] - 2*theta[m:L-m] + theta[:L-2*m]
+        averages = np.array([np.sum(second[j:j+m]) for j in range(L-3*m+1)])
+        np.testing.assert_allclose(mdev[i], np.sqrt(np.sum(averages**2)/(2*m**2*tau[i]**2*(L-3*m+1))), rtol=1e-9)
+
+    tau, hdev = hadamard_deviation(omega, FS)
+    for i, m in enumerate(np.round(tau*FS).astype(int)):
+        third = theta[3*m:] - 3*theta[2*m:L-m] + 3*theta[m:L-2*m] - theta[:L-3*m]
+        np.testing.assert_allclose(hdev[i], np.sqrt(np.sum(third**2)/(6*tau[i]**2*(L-3*m))), rtol=1e-9)
+
+
+def test_channels_match_single_series():
+    omega = _series(5000, (3,))
+    batch = allan_deviations(omega, FS)
+    for c in range(omega.shape[1]):
+        single = allan_deviations(np.ascontiguousarray(omega[:, c]), FS)
+        for variant, (tau, deviation) in batch.items():
+            np.testing.assert_allclose(single[variant][0], tau)
+            np.testing.assert_allclose(single[variant][1], deviation[:, c], rtol=1e-12)
+
+
+@pytest.mark.parametrize("num_samples", [50000, 2**16])
+def test_float32_only_rounds_the_samples(num_samples):
+    omega = _series(num_samples)
+    rounded = omega.astype(np.float32)
+    tau, adev = overlapping_allan_deviation(omega, FS)
+    float32_tau, float32_adev = overlapping_allan_deviation(omega, FS, precision="float32")
+
+    #a drop-in switch, with the same averaging times
+    assert np.array_equal(float32_tau, tau)
+    np.testing.assert_allclose(float32_adev, overlapping_allan_deviation(rounded.astype(float), FS)[1], rtol=1e-10)
+    bound = 2.0**-24*np.max(np.abs(omega))*np.sqrt(1/(3*FS*tau))
+    assert np.all(np.abs(float32_adev - adev) <= bound)
+
+    with pytest.raises(ValueError):
+        overlapping_allan_deviation(omega, FS, precision="float16")
+
+
+@pytest.mark.parametrize("window,step", [(2**12, 1000), (3001, 777), (20000, 1)])
+def test_dynamic_matches_per_window_deviation(window, step):
+    omega = _series(20000)
+    #small blocks, so windows straddle the block boundaries of the prefix sums
+    times, tau, adev = dynamic_allan_deviation(omega, FS, window, step, block_size=1000, workers=2)
+
+    starts = np.arange(0, len(omega) - window + 1, step)
+    np.testing.assert_allclose(times, (starts + window/2)/FS)
+    assert adev.shape == (len(starts), len(tau))
+    for start, row in zip(starts, adev):
+        window_tau, window_adev = allan_deviations(omega[start:start+window], FS, ("overlapping",))["overlapping"]
+        np.testing.assert_array_equal(tau, window_tau)
+        np.testing.assert_allclose(row, window_adev, rtol=1e-8)
+
+    with pytest.raises(ValueError):
+        dynamic_allan_deviation(omega, FS, len(omega)+1, 1)
+
+
+def test_gram_rescaling_matches_direct():
+    units = [_series(20000, seed=seed) for seed in range(3)]
+    tau, gram = overlapping_allan_gram(units, FS)
+    for weights in ([1.0, 0.0, 0.0], [0.5, -2.0, 3.0], [1e-3, 1.0, 1e2]):
+        direct_tau, direct = overlapping_allan_deviation(np.dot(weights, units), FS)
+        np.testing.assert_allclose(tau, direct_tau)
+        np.testing.assert_allclose(allan_deviation_from_gram(gram, weights), direct, rtol=1e-9)
\ No newline at end of file
@@ -0,0 +1,41 @@
+import numpy as np
+
+from allan_variance import overlapping_allan_deviation
+from characterize import main
+
+
+def test_rerun_skips_own_output(tmp_path, capsys):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    for i in range(2):
+        (np.random.default_rng(i).standard_normal(5000)*1000).astype("<i2").tofile(logs / f"log{i}.bin")
+    output = str(logs / "fleet.npz")
+
+    for _ in range(2):
+        assert main([str(logs), "--fs", "100", "--workers", "1", "--output", output]) == 0
+    # The second run found the same two logs, not the merged file of the first
+    assert capsys.readouterr().err.count("wrote 2 of 2 logs") == 2
+
+    with np.load(output) as merged:
+        assert sorted(merged["path"]) == sorted(str(path) for path in logs.glob("log*.bin"))
+        samples = np.fromfile(logs / "log0.bin", dtype="<i2").astype(float)
+        tau, adev = overlapping_allan_deviation(samples, 100, 100)
+        row = list(merged["path"]).index(str(logs / "log0.bin"))
+        np.testing.assert_allclose(merged["adev"][row, :len(adev)], adev, rtol=1e-9)
+
+
+def test_power_of_two_log_gives_finite_coefficients(tmp_path, capsys):
+    #the largest cluster size of 2**16 samples rounds up to half the series
+    rng = np.random.default_rng(0)
+    samples = 0.1*rng.standard_normal(2**16) + 1e-3*np.cumsum(rng.standard_normal(2**16))
+    np.save(tmp_path / "log.npy", samples)
+    output = str(tmp_path / "out" / "fleet.npz")
+
+    assert main([str(tmp_path / "log.npy"), "--fs", "100", "--workers", "1", "--model-fit", "--output", output]) == 0
+
+    with np.load(output) as merged:
+        tau, adev = overlapping_allan_deviation(samples, 100, 100)
+        assert np.all(np.isfinite(merged["adev"][0, :len(adev)]))
+        np.testing.assert_allclose(merged["adev"][0, :len(adev)], adev, rtol=1e-9)
+        for name in ("model_arw", "model_rrw"):
+            assert np.all(np.isfinite(merged[name])) and np.all(merged[name] > 0)
\ No newline at end of file
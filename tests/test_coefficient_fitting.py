@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from allan_variance import overlapping_allan_deviation
+from coefficient_fitting import (allan_variance_model_terms, fit_allan_variance_model, fit_bias_instability_line, fit_lines_batch,
+                                 fit_random_walk_line, fit_rate_random_walk_line)
+
+SINGLE_FITS = {"arw": fit_random_walk_line, "rrw": fit_rate_random_walk_line, "bi": fit_bias_instability_line}
+
+
+def _measured_curves(num_curves=4):
+    """Allan deviations of white noise plus a random walk, one column per curve"""
+    rng = np.random.default_rng(0)
+    columns = []
+    for i in range(num_curves):
+        omega = 0.02*(i+1)*rng.standard_normal(20000) + 1e-3*np.cumsum(rng.standard_normal(20000))/np.sqrt(20)
+        tau, adev = overlapping_allan_deviation(omega, 20)
+        columns.append(adev)
+    return (tau, np.stack(columns, axis=1))
+
+
+def test_batch_line_fits_match_single_fits():
+    tau, curves = _measured_curves()
+    batch = fit_lines_batch(tau, curves)
+
+    assert set(batch) == {"qn", "arw", "bi", "rrw", "rr"}
+    for noise_type, fit in SINGLE_FITS.items():
+        expected = [fit(tau, curves[:, c])[1] for c in range(curves.shape[1])]
+        np.testing.assert_allclose(batch[noise_type], expected, rtol=1e-12)
+
+    single = fit_lines_batch(tau, curves[:, 1], noise_types=("arw",))
+    assert list(single) == ["arw"] and np.ndim(single["arw"]) == 0
+    np.testing.assert_allclose(single["arw"], batch["arw"][1], rtol=1e-12)
+
+
+@pytest.mark.parametrize("duration", [None, 3000.0])
+def test_model_fit_recovers_known_coefficients(duration):
+    tau = np.logspace(-1.5, 3, 80)
+    known = np.array([[1e-4, 0.025, 0.005, 0.001, 1e-6],
+                      [0.0, 0.05, 0.0, 0.002, 0.0]])
+    adev = np.sqrt(allan_variance_model_terms(tau) @ (known**2).T)
+
+    fitted = fit_allan_variance_model(tau, adev, duration=duration)
+    for i, noise_type in enumerate(("qn", "arw", "bi", "rrw", "rr")):
+        np.testing.assert_allclose(fitted[noise_type], known[:, i], rtol=1e-5, atol=1e-9)
+    np.testing.assert_allclose(fitted["fit"], adev, rtol=1e-6)
+
+    #a reduced model fits a curve made of its own terms alone
+    fitted = fit_allan_variance_model(tau, adev[:, 1], noise_types=("arw", "rrw"))
+    np.testing.assert_allclose([fitted["arw"], fitted["rrw"]], [0.05, 0.002], rtol=1e-6)
\ No newline at end of file
@@ -0,0 +1,138 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from allan_variance import overlapping_allan_deviation
+from compute_service import ComputeService, HTTPError, parse_adev_upload, parse_simulation_spec
+
+
+@pytest.mark.parametrize("query", [
+    {"fs": "100", "channels": "0"},
+    {"fs": "100", "channels": "-2"},
+    {"fs": "100", "dtype": "O"},
+    {"fs": "100", "dtype": "U4"},
+    {"fs": "100", "dtype": "not-a-type"},
+    {"fs": "0"},
+    {"channels": "1"},
+])
+def test_malformed_binary_uploads_are_bad_requests(query):
+    with pytest.raises(HTTPError) as error:
+        parse_adev_upload(np.zeros(64, dtype="<f4").tobytes(), "application/octet-stream", query)
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b'{"fs": 10}', b'{"fs": "x", "samples": [1, 2, 3, 4]}', b"{", b'{"fs": 10, "samples": [[1], [2, 3]]}'])
+def test_malformed_json_uploads_are_bad_requests(body):
+    with pytest.raises(HTTPError) as error:
+        parse_adev_upload(body, "application/json", {})
+    assert error.value.status == 400
+
+
+@pytest.mark.parametrize("body", [b"[]", b'{"sources": [], "fs": 1, "sim_time": 1, "seed": "x"}', b'{"sources": [["nope", {}]], "fs": 1, "sim_time": 1}',
+                                  b'{"sources": [], "fs": -1, "sim_time": 1}'])
+def test_malformed_simulation_specs_are_bad_requests(body):
+    with pytest.raises(HTTPError) as error:
+        parse_simulation_spec(body)
+    assert error.value.status == 400
+
+
+def test_binary_upload_is_scaled_per_channel():
+    raw = np.arange(24, dtype="<i2")
+    spec, samples = parse_adev_upload(raw.tobytes(), "application/octet-stream", {"fs": "10", "dtype": "<i2", "channels": "3", "scale": "0.5"})
+    assert spec["fs"] == 10.0
+    np.testing.assert_array_equal(samples, raw.reshape(8, 3)*0.5)
+
+
+async def _exchange(raw_request, service=None):
+    """Status line and body the service answers to raw request bytes"""
+    service = service or ComputeService(workers=1)
+    server = await asyncio.start_server(service.serve_connection, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw_request)
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
+    return response
+
+
+def test_malformed_content_length_is_answered():
+    response = asyncio.run(_exchange(b"POST /jobs/adev HTTP/1.1\r\nContent-Length: abc\r\n\r\n"))
+    assert response.startswith(b"HTTP/1.1 400")
+
+
+def test_handler_errors_are_answered_500():
+    class Broken(ComputeService):
+        async def handle(self, *args):
+            raise RuntimeError("boom")
+
+    response = asyncio.run(_exchange(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n", Broken(workers=1)))
+    assert response.startswith(b"HTTP/1.1 500")
+
+def test_oversized_requests_are_rejected():
+    with pytest.raises(HTTPError) as error:
+        parse_simulation_spec(b'{"sources": [["arw", {"coeff": 1}]], "fs": 1e6, "sim_time": 1e6}')
+    assert error.value.status == 413
+    with pytest.raises(HTTPError) as error:
+        parse_simulation_spec(b'{"sources": [["arw", {"coeff": 1}]], "fs": 1000, "sim_time": 1e4, "include_series": true}')
+    assert error.value.status == 413
+
+
+async def _poll(service, key):
+    while service.jobs[key]["status"] in ("queued", "running"):
+        await asyncio.sleep(0.01)
+    return await service.handle("GET", f"/jobs/{key}", {}, {}, b"")
+
+
+def test_jobs_holding_series_are_bounded(monkeypatch):
+    monkeypatch.setattr("result_store.STORE_PATH", "")
+
+    async def run():
+        # Room for the series of one job only
+        service = ComputeService(workers=1, max_series_bytes=1500*8)
+        service.start()
+        try:
+            keys = []
+            for seed in range(2):
+                body = ('{"sources": [["arw", {"coeff": 0.1}]], "fs": 10, "sim_time": 100, "seed": %d, "include_series": true}' % seed).encode()
+                status, response = await service.handle("POST", "/jobs/simulate", {}, {}, body)
+                assert status == 202
+                keys.append(response["job_id"])
+                status, encoded = await _poll(service, keys[-1])
+            return service, keys, encoded
+        finally:
+            service.shutdown()
+
+    service, keys, encoded = asyncio.run(run())
+    # The older job was forgotten, the newer one answers its series
+    assert keys[0] not in service.jobs
+    assert len(json.loads(encoded)["result"]["series"]) == 1000
+
+
+def test_adev_upload_job_matches_direct_computation(monkeypatch):
+    monkeypatch.setattr("result_store.STORE_PATH", "")
+    samples = np.random.default_rng(0).standard_normal(4096).astype("<f4")
+
+    async def run():
+        service = ComputeService(workers=1)
+        service.start()
+        try:
+            status, response = await service.handle("POST", "/jobs/adev", {"fs": "10"}, {"content-type": "application/octet-stream"}, samples.tobytes())
+            assert status == 202
+            # The same upload is the same job
+            status, again = await service.handle("POST", "/jobs/adev", {"fs": "10"}, {"content-type": "application/octet-stream"}, samples.tobytes())
+            assert again["job_id"] == response["job_id"]
+            return await _poll(service, response["job_id"])
+        finally:
+            service.shutdown()
+
+    status, job = asyncio.run(run())
+    tau, adev = overlapping_allan_deviation(samples.astype(float), 10, 100)
+    assert job["status"] == "done"
+    np.testing.assert_allclose(job["result"]["adev"], adev)
\ No newline at end of file
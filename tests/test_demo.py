@@ -0,0 +1,29 @@
+import numpy as np
+
+import defaults
+from demo import DEMO_SETTINGS, build_demo, load_demo
+from simulation_cache import cached_allan_deviation, cached_noise_model
+
+
+def test_demo_is_the_default_simulation():
+    assert DEMO_SETTINGS["noise_model"] == defaults.noise_model()
+    assert [tuple(source) for source in DEMO_SETTINGS["sources"]] == defaults.enabled_sources()
+    assert all(DEMO_SETTINGS[key] == value for key, value in defaults.SIMULATION.items())
+
+
+def test_demo_matches_a_live_simulation(tmp_path):
+    # A shorter run of the default model, otherwise the same settings
+    settings = dict(DEMO_SETTINGS, sim_time=200.0)
+    build_demo(str(tmp_path / "demo"), settings)
+    demo = load_demo(str(tmp_path / "demo"))
+
+    sources = [(name, params) for name, params in settings["sources"]]
+    series = cached_noise_model(sources, settings["fs"], settings["sim_time"], settings["seed"])
+    tau, adev = cached_allan_deviation(sources, settings["fs"], settings["sim_time"], settings["seed"], store=False)
+    np.testing.assert_allclose(demo["series"], series, rtol=1e-12, atol=1e-15)
+    np.testing.assert_allclose(demo["adev"], adev, rtol=1e-10)
+    assert set(demo["fits"]) == {"random walk", "bias instability", "rate random walk"}
+
+
+def test_missing_demo_loads_as_none(tmp_path):
+    assert load_demo(str(tmp_path / "missing")) is None
\ No newline at end of file
@@ -0,0 +1,20 @@
+import numpy as np
+
+from ensemble import run_ensemble
+
+SOURCES = [("arw", {"coeff": 0.025}), ("markov_bi", {"coeff": 0.005, "corr_time": 10.0})]
+
+
+def test_ensemble_does_not_depend_on_the_workers():
+    single = run_ensemble(SOURCES, 20, 200, 5, seed=4, workers=1)
+    pooled = run_ensemble(SOURCES, 20, 200, 5, seed=4, workers=2)
+
+    assert single["num_realizations"] == pooled["num_realizations"] == 5
+    np.testing.assert_array_equal(single["tau"], pooled["tau"])
+    for statistic in ("mean", "std"):
+        np.testing.assert_array_equal(single[statistic], pooled[statistic])
+    for p in single["percentiles"]:
+        np.testing.assert_array_equal(single["percentiles"][p], pooled["percentiles"][p])
+
+    other_seed = run_ensemble(SOURCES, 20, 200, 5, seed=5, workers=1)
+    assert not np.allclose(other_seed["mean"], single["mean"])
\ No newline at end of file
@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+
+from allan_variance import OnlineAllanDeviation, max_cluster_size
+from ingestion import FrameDecoder, LiveAllanDeviation, RingBuffer
+
+
+def test_read_since_is_contiguous_under_concurrent_writes():
+    ring = RingBuffer(256)
+    total = 200000
+    stop = threading.Event()
+
+    def writer():
+        for start in range(0, total, 7):
+            ring.write(np.arange(start, min(start+7, total), dtype=float))
+        stop.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    received, position, lost = [], 0, 0
+    while not stop.is_set() or position < ring.written:
+        samples, position, skipped = ring.read_since(position)
+        lost += skipped
+        received.append(samples[:, 0])
+    thread.join()
+
+    received = np.concatenate(received)
+    assert position == total
+    assert len(received) + lost == total
+    # Every read continues where the previous one stopped, apart from samples reported lost
+    steps = np.diff(received)
+    assert np.all(steps >= 1)
+    assert received[-1] == total - 1
+    assert np.sum(steps - 1) + received[0] == lost
+
+
+def test_read_since_reports_overwritten_samples():
+    ring = RingBuffer(10)
+    ring.write(np.arange(25.0))
+    samples, position, lost = ring.read_since(0)
+    assert position == 25
+    assert lost == 15
+    np.testing.assert_array_equal(samples[:, 0], np.arange(15.0, 25.0))
+
+
+def test_decoder_counts_dropped_frames():
+    decoder = FrameDecoder("<f4", 2)
+    frames = np.zeros(6, dtype=decoder.dtype)
+    frames["sequence"] = [0, 1, 2, 4, 5, 7]
+    decoded, leftover = decoder.decode(frames.tobytes() + b"\x00")
+    assert leftover == 1
+    assert len(decoded) == 6
+    assert decoder.dropped == 2
+
+
+def test_snapshot_positions_match_samples_under_concurrent_writes():
+    ring = RingBuffer(256)
+    total = 200000
+    thread = threading.Thread(target=lambda: [ring.write(np.arange(start, min(start+7, total), dtype=float)) for start in range(0, total, 7)])
+    thread.start()
+    while thread.is_alive():
+        samples, position = ring.snapshot(100)
+        # Sample values are their own positions, so the derived time axis must reproduce them
+        np.testing.assert_array_equal(samples[:, 0], position - len(samples) + np.arange(len(samples)))
+    thread.join()
+
+
+def test_live_estimate_covers_more_than_the_ring_buffer():
+    ring = RingBuffer(1000, num_channels=2)
+    estimate = LiveAllanDeviation(ring, 20)
+    omega = np.random.default_rng(0).standard_normal((5000, 2))
+    for start in range(0, len(omega), 300):
+        ring.write(omega[start:start+300])
+        tau, adev = estimate.update()
+
+    # Fed every sample once, as if the whole stream had been kept
+    reference = OnlineAllanDeviation(20, max_cluster_size(1000))
+    reference.update(omega[:, 0])
+    expected_tau, expected_adev = reference.allan_deviation()
+    assert estimate.lost == 0 and estimate.estimator.L == len(omega)
+    np.testing.assert_array_equal(tau, expected_tau)
+    np.testing.assert_allclose(adev, expected_adev, rtol=1e-12)
+
+    # A slow update misses what was overwritten in between
+    ring.write(np.zeros((2500, 2)))
+    estimate.update()
+    assert estimate.lost == 1500 and estimate.estimator.L == len(omega) + 1000
\ No newline at end of file
@@ -0,0 +1,49 @@
+import tracemalloc
+
+import pytest
+
+import instrumentation
+
+
+def test_recording_stops_when_the_block_raises():
+    collector = instrumentation.RecordCollector()
+
+    class Rerun(Exception):
+        pass
+
+    with pytest.raises(Rerun):
+        with instrumentation.recording(collector, memory=True):
+            assert instrumentation.is_enabled() and tracemalloc.is_tracing()
+            with instrumentation.stage("work"):
+                bytearray(2**20)
+            raise Rerun()
+
+    assert not instrumentation.is_enabled()
+    assert not tracemalloc.is_tracing()
+    assert [row["stage"] for row in collector.summary()] == ["work"]
+    assert collector.records[0]["peak_bytes"] >= 2**20
+
+    # The sink was removed with the block
+    with instrumentation.recording(instrumentation.RecordCollector()):
+        with instrumentation.stage("later"):
+            pass
+    assert len(collector.records) == 1
+
+
+def test_recording_stays_on_until_the_last_block_exits():
+    outer, inner = instrumentation.RecordCollector(), instrumentation.RecordCollector()
+    with instrumentation.recording(outer):
+        with instrumentation.recording(inner):
+            pass
+        assert instrumentation.is_enabled()
+        with instrumentation.stage("after inner"):
+            pass
+    assert not instrumentation.is_enabled()
+    assert [record["stage"] for record in outer.records] == ["after inner"]
+    assert inner.records == []
+
+
+def test_recording_without_a_sink_records_nothing():
+    with instrumentation.recording(None, memory=True):
+        assert not instrumentation.is_enabled()
+        assert instrumentation.stage("ignored") is instrumentation.stage("also ignored")
\ No newline at end of file
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+import defaults
+from noise_synthesis import (NOISE_SOURCES, first_order_recursion, flicker_filter_coefficients, iter_noise_source, make_bias_instability_series,
+                             shape_white_noise, simulate_flicker_noise, simulate_noise_model, simulate_noise_source)
+
+FS = 20
+SIM_TIME = 1000
+
+
+@pytest.mark.parametrize("phi", [0.0, 0.5, -0.9, 0.9, 1 - 1/3e5, 1.0])
+def test_first_order_recursion_matches_loop(phi):
+    x = np.random.default_rng(0).standard_normal(100003)
+    expected = np.empty(len(x))
+    previous = 0.7
+    for i, value in enumerate(x):
+        previous = phi*previous + value
+        expected[i] = previous
+
+    np.testing.assert_allclose(first_order_recursion(x, phi, initial=0.7), expected, rtol=1e-9, atol=1e-9*np.max(np.abs(expected)))
+
+
+def test_bias_instability_matches_reference_loop():
+    coeff, corr_time, fs, sim_time = 0.005, 10.0, 20, 5000
+    series = make_bias_instability_series(coeff, corr_time, fs, sim_time, rng=3)
+
+    #b[i] = b[i-1] + (-b[i-1] + coeff*w[i])/corr_time, starting from zero
+    noise = np.random.default_rng(3).standard_normal(int(sim_time*fs) - 1)
+    expected = np.zeros(int(sim_time*fs))
+    for i in range(1, len(expected)):
+        expected[i] = expected[i-1] + (-expected[i-1] + coeff*noise[i-1])/corr_time
+
+    np.testing.assert_allclose(series, expected, rtol=1e-9, atol=1e-12)
+
+
+def _direct_iir(x, iir_coeffs, history):
+    """y[n] = x[n] - a_1*y[n-1] - ... - a_n*y[n-n], one sample at a time"""
+    trunc_limit = len(iir_coeffs) - 1
+    y = np.concatenate((history, np.zeros(len(x))))
+    for n in range(len(x)):
+        y[trunc_limit+n] = x[n] - np.dot(iir_coeffs[1:], y[trunc_limit+n-1::-1][:trunc_limit])
+    return y[trunc_limit:]
+
+
+@pytest.mark.parametrize("block_size", [1, 7, 64, 1000, None])
+def test_fft_flicker_filter_matches_direct_recursion(block_size):
+    rng = np.random.default_rng(4)
+    iir_coeffs = flicker_filter_coefficients(50)
+    x = rng.standard_normal(3000)
+    history = rng.standard_normal(50)
+
+    expected = _direct_iir(x, iir_coeffs, history)
+    np.testing.assert_allclose(shape_white_noise(x, iir_coeffs, history, block_size=block_size), expected, rtol=1e-9, atol=1e-10)
+
+
+def test_flicker_noise_matches_direct_recursion():
+    coeff, fs, sim_time, trunc_limit = 0.005, 20, 200, 100
+    series = simulate_flicker_noise(coeff, fs, sim_time, trunc_limit, rng=5)
+
+    white_noise = np.sqrt(coeff**2*fs)*np.random.default_rng(5).standard_normal(int(sim_time*fs))
+    expected = _direct_iir(white_noise, flicker_filter_coefficients(trunc_limit), np.zeros(trunc_limit))
+    np.testing.assert_allclose(series, expected, rtol=1e-9, atol=1e-12)
+
+
+@pytest.mark.parametrize("name", sorted(NOISE_SOURCES))
+def test_streaming_matches_one_shot(name):
+    params = defaults.SOURCES[name]
+    series = simulate_noise_source(name, params, FS, SIM_TIME, rng=np.random.default_rng(1))
+    #a block size that does not divide the series, and is shorter than the flicker filter
+    blocks = list(iter_noise_source(name, params, FS, SIM_TIME, block_size=333, rng=np.random.default_rng(1)))
+
+    assert len(blocks) == -(-len(series)//333)
+    np.testing.assert_allclose(np.concatenate(blocks), series, rtol=1e-9, atol=1e-12*np.max(np.abs(series)))
+
+
+@pytest.mark.parametrize("name", sorted(NOISE_SOURCES))
+def test_float32_and_in_place_match_one_shot(name):
+    params = defaults.SOURCES[name]
+    series = simulate_noise_source(name, params, FS, SIM_TIME, rng=np.random.default_rng(2))
+    single = simulate_noise_source(name, params, FS, SIM_TIME, rng=np.random.default_rng(2), dtype="float32")
+    out = np.empty(len(series))
+    in_place = simulate_noise_source(name, params, FS, SIM_TIME, rng=np.random.default_rng(2), out=out)
+
+    assert single.dtype == np.float32
+    np.testing.assert_allclose(single, series, rtol=1e-6, atol=1e-6*np.max(np.abs(series)))
+    assert in_place is out
+    np.testing.assert_allclose(in_place, series, rtol=1e-12)
+
+
+def test_model_accumulates_its_sources():
+    sources = list(defaults.SOURCES.items())
+    rngs = [np.random.default_rng(seed) for seed in range(len(sources))]
+    out = np.full(int(SIM_TIME*FS), np.nan)
+    combined = simulate_noise_model(sources, FS, SIM_TIME, rng=rngs, out=out)
+
+    expected = sum(simulate_noise_source(name, params, FS, SIM_TIME, rng=np.random.default_rng(seed))
+                   for seed, (name, params) in enumerate(sources))
+    assert combined is out
+    np.testing.assert_allclose(combined, expected, rtol=1e-9, atol=1e-12*np.max(np.abs(expected)))
+
+    with pytest.raises(ValueError):
+        simulate_noise_source("arw", {"coeff": 1.0}, FS, SIM_TIME, accumulate=True)
\ No newline at end of file
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from plotting import decimate_min_max
+
+
+@pytest.mark.parametrize("num_points", [4001, 10007, 100000])
+def test_decimation_keeps_extremes_and_endpoints(num_points):
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 100, num_points)
+    y = rng.standard_normal(num_points)
+    #an isolated spike either way
+    y[1234] = 40
+    y[num_points//2] = -40
+
+    x_kept, y_kept = decimate_min_max(x, y, 4000)
+
+    assert len(y_kept) <= 4000
+    assert np.all(np.diff(x_kept) > 0)
+    assert (x_kept[0], y_kept[0]) == (x[0], y[0])
+    assert (x_kept[-1], y_kept[-1]) == (x[-1], y[-1])
+    assert 40 in y_kept and -40 in y_kept
+
+    #every bucket's extremes survive, so the envelope over any span of the kept points is unchanged
+    bucket = -(-num_points//1999)
+    for start in range(0, num_points, bucket):
+        inside = (x_kept >= x[start]) & (x_kept <= x[min(start+bucket, num_points)-1])
+        assert np.max(y_kept[inside]) == np.max(y[start:start+bucket])
+        assert np.min(y_kept[inside]) == np.min(y[start:start+bucket])
+
+
+def test_short_series_are_unchanged():
+    x, y = np.arange(10.0), np.arange(10.0)**2
+    x_kept, y_kept = decimate_min_max(x, y, 4000)
+    assert x_kept is x and y_kept is y
\ No newline at end of file
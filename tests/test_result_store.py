@@ -0,0 +1,75 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from result_store import ResultStore, result_key
+
+
+def _entry_bytes(store, key):
+    return sum(entry.stat().st_size for entry in os.scandir(store._entry(key)))
+
+
+def test_eviction_removes_least_recently_read_entries(tmp_path):
+    store = ResultStore(str(tmp_path), max_bytes=2**30)
+    keys = [result_key("test", index=i) for i in range(3)]
+    store.put(keys[0], {"adev": np.zeros(100)})
+    size = _entry_bytes(store, keys[0])
+    store.max_bytes = 2*size
+
+    # Entries age explicitly, file times are too coarse to order quick writes
+    store.put(keys[1], {"adev": np.ones(100)})
+    now = time.time()
+    os.utime(store._entry(keys[0]), (now-20, now-20))
+    os.utime(store._entry(keys[1]), (now-10, now-10))
+    # Reading the older entry makes the other one the least recently used
+    assert store.get(keys[0]) is not None
+
+    store.put(keys[2], {"adev": np.full(100, 2.0)})
+    assert keys[1] not in store
+    assert keys[0] in store and keys[2] in store
+    assert len(store) == 2 and store.nbytes <= store.max_bytes
+    np.testing.assert_array_equal(store.get(keys[2])["adev"], np.full(100, 2.0))
+
+    store.clear()
+    assert len(store) == 0
+
+
+def _compute_once(root, key, log):
+    """get_or_compute from another process, logging every computation"""
+    def compute():
+        with open(log, "a") as f:
+            f.write(f"{os.getpid()}\n")
+        time.sleep(0.2)
+        return {"tau": np.arange(5.0), "adev": np.full(5, 0.5)}
+    result = ResultStore(root).get_or_compute(key, compute)
+    return (np.array(result["tau"]), np.array(result["adev"]))
+
+
+def test_concurrent_writers_compute_once(tmp_path):
+    root, log = str(tmp_path / "store"), str(tmp_path / "computed.log")
+    key = result_key("test", data="shared")
+    with ProcessPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(_compute_once, [root]*4, [key]*4, [log]*4))
+
+    with open(log) as f:
+        assert len(f.readlines()) == 1
+    for tau, adev in results:
+        np.testing.assert_array_equal(tau, np.arange(5.0))
+        np.testing.assert_array_equal(adev, np.full(5, 0.5))
+
+
+def test_racing_puts_keep_one_complete_entry(tmp_path):
+    store = ResultStore(str(tmp_path))
+    key = result_key("test", data="raced")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda i: store.put(key, {"adev": np.full(1000, float(i))}), range(8)))
+
+    # Every writer gets the entry that won, whole
+    stored = store.get(key)["adev"]
+    assert len(np.unique(stored)) == 1
+    for result in results:
+        np.testing.assert_array_equal(result["adev"], stored)
+    assert len(store) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("tmp-")]
\ No newline at end of file
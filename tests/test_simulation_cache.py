@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from allan_variance import overlapping_allan_deviation
+from noise_synthesis import simulate_noise_model
+from simulation_cache import SimulationCache, cached_allan_deviation, cached_noise_model, source_rng
+
+
+def _array(value):
+    #100 float64 values, 800 bytes
+    return lambda: np.full(100, float(value))
+
+
+def test_cache_evicts_least_recently_used_beyond_its_size():
+    cache = SimulationCache(max_bytes=3*800)
+    for key in "abc":
+        cache.get(key, _array(ord(key)))
+    assert len(cache) == 3 and cache.nbytes == 2400
+
+    #reading "a" makes "b" the least recently used entry
+    cache.get("a", pytest.fail)
+    cache.get("d", _array(4))
+    assert "b" not in cache
+    assert all(key in cache for key in "acd")
+    assert cache.nbytes == 2400
+
+    #two more entries push out "c" and then "a"
+    cache.get("e", _array(5))
+    cache.get("f", _array(6))
+    assert sorted(cache._entries) == ["d", "e", "f"]
+
+
+def test_cache_returns_read_only_values_and_skips_oversized_ones():
+    cache = SimulationCache(max_bytes=1000)
+    value = cache.get("small", _array(1))
+    assert not value.flags.writeable
+    assert cache.get("small", pytest.fail) is value
+
+    large = cache.get("large", lambda: np.zeros(1000))
+    assert large.shape == (1000,)
+    assert "large" not in cache and cache.nbytes == 800
+
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+def test_cached_model_matches_direct_simulation():
+    sources = [("arw", {"coeff": 0.025}), ("rrw", {"coeff": 0.001})]
+    cache = SimulationCache()
+    combined = cached_noise_model(sources, 20, 500, 7, cache)
+
+    expected = simulate_noise_model(sources, 20, 500, rng=[source_rng(name, 7) for name, _ in sources])
+    #unit realizations are rescaled, so the sums only agree to rounding
+    np.testing.assert_allclose(combined, expected, rtol=1e-12, atol=1e-15*np.max(np.abs(expected)))
+    assert cached_noise_model(sources, 20, 500, 7, cache) is combined
+
+
+def test_coefficient_changes_rescale_the_cached_cross_terms():
+    cache, simulation_cache = SimulationCache(), SimulationCache()
+    for arw, rrw in [(0.025, 0.001), (0.05, 0.001), (0.01, 0.004)]:
+        sources = [("arw", {"coeff": arw}), ("markov_bi", {"coeff": 0.005, "corr_time": 10.0}), ("rrw", {"coeff": rrw})]
+        tau, adev = cached_allan_deviation(sources, 20, 500, 3, cache=cache, simulation_cache=simulation_cache, store=False)
+
+        series = simulate_noise_model(sources, 20, 500, rng=[source_rng(name, 3) for name, _ in sources])
+        expected_tau, expected = overlapping_allan_deviation(series, 20)
+        np.testing.assert_allclose(tau, expected_tau)
+        np.testing.assert_allclose(adev, expected, rtol=1e-9)
+
+    #the later models came from the cross terms, not from new series
+    assert sum(key[0] == "oadev_gram" for key in cache._entries) == 1
+    assert sum(key[0] == "model" for key in simulation_cache._entries) == 1
\ No newline at end of file
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from simulation_cache import cached_allan_deviation
+from sweep import main, sweep_allan_deviation
+
+AXES = {"arw.coeff": np.logspace(-3, -1, 4), "markov_bi.coeff": np.logspace(-4, -2, 3), "markov_bi.corr_time": [5.0, 50.0]}
+SOURCES = [("rrw", {"coeff": 1e-3})]
+
+
+def test_sweep_matches_direct_computation():
+    result = sweep_allan_deviation(SOURCES, AXES, 20, 500, seed=3)
+    assert result["dims"] == ("arw.coeff", "markov_bi.coeff", "markov_bi.corr_time", "tau")
+    assert result["adev"].shape[:3] == (4, 3, 2)
+
+    for i, j, k in [(0, 0, 0), (3, 1, 1), (2, 2, 0)]:
+        sources = [("rrw", {"coeff": 1e-3}),
+                   ("arw", {"coeff": AXES["arw.coeff"][i]}),
+                   ("markov_bi", {"coeff": AXES["markov_bi.coeff"][j], "corr_time": AXES["markov_bi.corr_time"][k]})]
+        tau, adev = cached_allan_deviation(sources, 20, 500, 3, store=False)
+        np.testing.assert_allclose(result["tau"], tau)
+        np.testing.assert_allclose(result["adev"][i, j, k], adev, rtol=1e-10)
+
+
+def test_realizations_over_budget_are_spilled_to_disk():
+    in_memory = sweep_allan_deviation(SOURCES, AXES, 20, 500)
+    spilled = sweep_allan_deviation(SOURCES, AXES, 20, 500, memory_budget=2**12)
+    np.testing.assert_allclose(spilled["adev"], in_memory["adev"], rtol=1e-12)
+    np.testing.assert_array_equal(spilled["dominant"], in_memory["dominant"])
+
+
+def test_missing_base_parameters_are_reported():
+    with pytest.raises(ValueError, match="coeff"):
+        sweep_allan_deviation([], {"markov_bi.corr_time": [1.0, 10.0]}, 20, 100)
+    with pytest.raises(SystemExit) as exit:
+        main(["--fs", "20", "--sim-time", "100", "--axis", "markov_bi.corr_time", "1", "10", "3"])
+    assert exit.value.code == 2
\ No newline at end of file